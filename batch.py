@@ -0,0 +1,122 @@
+# Makes poems without any prompts: names are read one per line from a file (or stdin) and one JSON record per person
+# is written out as soon as their poem is done, e.g: batch.py names.txt --no-ai-fill --output poems.jsonl
+# Names are read and records written as the pipeline goes, so lists of any length run in the same amount of memory
+import argparse
+import contextlib
+import json
+import sys
+
+from functions import DEFAULT_POEM_SETTINGS, order_poem
+from pipeline import run_pipeline
+from wiki_cache import get_wiki_cache
+
+DATA_FIELDS = ['birth_date', 'age', 'alive_or_dead', 'career', 'gender', 'subscience', 'first_name', 'last_name', 'url']  # Order of get_data's tuple
+
+
+def rhyme_scheme(text):
+    # Same rule as the rhyming scheme setting of main.py
+    scheme = text.lower()
+    if len(scheme) != 8 or scheme.count("a") != 4 or scheme.count("b") != 2 or scheme.count("c") != 2:
+        raise argparse.ArgumentTypeError(f"{text} must have 8 characters, with 4 a's, 2 b's, and 2 c's (e.g aaaabbcc)")
+    return scheme
+
+
+def read_names(f):
+    # One name per line, blank lines and lines starting with # are skipped
+    for line in f:
+        name = line.strip()
+        if name and not name.startswith('#'):
+            yield name
+
+
+def add_settings_arguments(parser):
+    parser.add_argument('--config', help="JSON file of poem settings, with the same keys as main.py's poem_settings")
+    parser.add_argument('--order', choices=['normal', 'random'], help="Poem order")
+    parser.add_argument('--set-order', type=rhyme_scheme, help="Rhyming scheme, e.g aaaabbcc")
+    parser.add_argument('--ai-fill', action=argparse.BooleanOptionalAction, help="Whether the AI adds a second paragraph")
+    parser.add_argument('--number-of-words', type=int, help="Number of rhyming words used for each line")
+    parser.add_argument('--words-to-generate', type=int, help="Number of rhyming words looked up for each line")
+    parser.add_argument('--syllables', type=int, help="Rhyming words have more syllables than this")
+
+
+def check_settings(poem_settings, source):
+    # Raises ValueError for keys that are not poem settings, values of the wrong type or a rhyming scheme that is not allowed
+    unknown = set(poem_settings) - set(DEFAULT_POEM_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown poem settings in {source}: {', '.join(sorted(unknown))}")
+    for key, value in poem_settings.items():
+        if type(value) is not type(DEFAULT_POEM_SETTINGS[key]):
+            raise ValueError(f"{key} in {source} must be a {type(DEFAULT_POEM_SETTINGS[key]).__name__}")
+    if poem_settings.get("Poem order", "normal") not in ("normal", "random"):
+        raise ValueError(f"Poem order in {source} must be normal or random")
+    if "Set poem order" in poem_settings:
+        try:
+            rhyme_scheme(str(poem_settings["Set poem order"]))
+        except argparse.ArgumentTypeError as e:
+            raise ValueError(str(e)) from None
+
+
+def load_settings(args):
+    # The defaults, then the config file, then any flags given
+    poem_settings = dict(DEFAULT_POEM_SETTINGS)
+    if args.config is not None:
+        with open(args.config) as f:
+            config = json.load(f)
+        check_settings(config, args.config)
+        poem_settings.update(config)
+    flags = {
+        "Poem order": args.order, "AI fill": args.ai_fill, "Set poem order": args.set_order,
+        "Number of words": args.number_of_words, "Words to generate": args.words_to_generate, "Number of syllables": args.syllables,
+    }
+    poem_settings.update({key: value for key, value in flags.items() if value is not None})
+    poem_settings["Set poem order"] = poem_settings["Set poem order"].lower()
+    return poem_settings
+
+
+def make_record(full_name, all_data, printed, poem, timings, poem_settings):
+    record = {'name': full_name, 'found': all_data is not None}
+    if all_data is not None:
+        record.update(zip(DATA_FIELDS, all_data))
+        list_of_lines, no_of_words, AI_output = poem
+        record['poem'] = order_poem(list_of_lines, poem_settings)
+        record['ai_fill'] = AI_output
+        record['no_of_words'] = no_of_words
+    record['messages'] = printed.splitlines()  # What get_data printed, e.g. why nobody was found
+    record['timings'] = {stage: round(seconds, 4) for stage, seconds in timings.items()}
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Makes a poem for every name in a file, one JSON record per line")
+    parser.add_argument('names', nargs='?', default='-', help="File with one name per line, - (the default) reads stdin")
+    parser.add_argument('--output', '-o', default='-', help="File the records are written to, - (the default) writes stdout")
+    add_settings_arguments(parser)
+    parser.add_argument('--workers', type=int, default=4, help="Number of names fetched at the same time")
+    parser.add_argument('--queue-size', type=int, default=16, help="Most names fetched ahead of the AI")
+    parser.add_argument('--batch-size', type=int, default=8, help="Most poems filled by the AI together")
+    parser.add_argument('--refresh', action='store_true', help="Fetch every Wikipedia article again instead of using the cache")
+    args = parser.parse_args()
+    try:
+        poem_settings = load_settings(args)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    with contextlib.ExitStack() as stack:
+        names = sys.stdin if args.names == '-' else stack.enter_context(open(args.names, encoding='utf-8'))
+        output = sys.stdout if args.output == '-' else stack.enter_context(open(args.output, 'w', encoding='utf-8'))
+        stack.enter_context(contextlib.redirect_stdout(sys.stderr))  # Anything else printed (e.g. loading the model) stays out of the records
+        results = run_pipeline(
+            read_names(names), poem_settings,
+            workers=args.workers, queue_size=args.queue_size, batch_size=args.batch_size, refresh=args.refresh
+        )
+        for result in results:
+            output.write(json.dumps(make_record(*result, poem_settings), default=str) + '\n')
+            output.flush()
+
+    stats = get_wiki_cache().stats()
+    if stats['hits'] + stats['misses']:  # Not when everyone came from a Wikipedia dump index
+        print(f"Wikipedia cache: {stats['hits'] + stats['renewed']} of {stats['hits'] + stats['misses']} people found without fetching their article", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# Times careers.classify_career against the ten regex searches get_data used to run, over thousands of infoboxes made by
+# mixing the rows of fixtures/infoboxes.json, e.g: benchmark_careers.py 5000 (test_careers.py checks the careers)
+import json
+import os
+import random
+import sys
+import time
+import regex
+
+from careers import classify_career
+
+FIXTURES = os.path.join('fixtures', 'infoboxes.json')
+records = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+
+def old_classify_career(table_data_cleaned):
+    # The searches get_data used to run, one over the whole text for each career
+    science = regex.search(r'scientific career', table_data_cleaned, flags=regex.IGNORECASE)
+    politics = regex.search(r'(in|assumed) office', table_data_cleaned, flags=regex.IGNORECASE)
+    musician = regex.search(r'musician|instrument|musical', table_data_cleaned, flags=regex.IGNORECASE)
+    actor = regex.search(r'actor', table_data_cleaned, flags=regex.IGNORECASE)
+    comedian = regex.search(r'comedian|comedy', table_data_cleaned, flags=regex.IGNORECASE)
+    journalist = regex.search(r'journalist|journal|radio', table_data_cleaned, flags=regex.IGNORECASE)
+    sports = regex.search(r'sport|coach|pro(?![a-z])|(?<![a-z])team(?![a-z])|champion|player|trophy', table_data_cleaned, flags=regex.IGNORECASE)
+    author = regex.search(r'author|writer|poet|novelist|playwright', table_data_cleaned, flags=regex.IGNORECASE)
+    military = regex.search(r'rank|commands|years of service|allegiance', table_data_cleaned, flags=regex.IGNORECASE)
+    artist = regex.search(r'movement|notable work', table_data_cleaned, flags=regex.IGNORECASE)
+    if science is not None:
+        subscience = regex.search(r'(?<=Fields ).+?(?=,)', table_data_cleaned, flags=regex.IGNORECASE)
+        return "scientist", None if subscience is None else subscience.group(0).split(" ")[0].lower()
+    for career, found in [("politician", politics), ("sports person", sports), ("actor", actor), ("musician", musician), ("comedian", comedian),
+                          ("journalist", journalist), ("author", author), ("military personnel", military), ("artist", artist)]:
+        if found is not None:
+            return career, None
+    return "unknown", None
+
+
+with open(FIXTURES, encoding='utf-8') as f:
+    fixtures = json.load(f)
+
+# Infoboxes made of the rows of random fixtures, so every career and many mixes of them come up
+rows = [row for fixture in fixtures for row in fixture['infobox'].strip('[] ').split(' , ')]
+rng = random.Random(0)
+texts = ['[ ' + ' , '.join(rng.sample(rows, rng.randint(5, 25))) + ' ]' for _ in range(records)]
+
+results = {}
+start = time.perf_counter()
+for text in texts:
+    old_classify_career(text)
+results['ten searches (old)'] = (time.perf_counter() - start) / records * 1e6
+start = time.perf_counter()
+for text in texts:
+    classify_career(text)
+results['classify_career'] = (time.perf_counter() - start) / records * 1e6
+
+print(f"{records} infoboxes of {sum(map(len, texts)) // records} characters on average")
+for name, us in results.items():
+    print(f"{name:<20}{us:9.1f} us/infobox")
@@ -0,0 +1,42 @@
+# Times get_data_many with one process against a pool of them, over names whose articles are all in a local cache made
+# from fixtures/infoboxes.json (so no network is needed), and checks both give the same results in the same order,
+# e.g: benchmark_data_many.py 5000 4 (the number of names, made by repeating the fixtures, and of processes)
+import json
+import os
+import sys
+import tempfile
+import time
+
+FIXTURES = os.path.join('fixtures', 'infoboxes.json')
+names = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+
+if __name__ == '__main__':
+    directory = tempfile.mkdtemp()
+    os.environ['WIKI_CACHE_PATH'] = os.path.join(directory, 'wikipedia.sqlite')
+    os.environ['WIKI_DUMP_INDEX'] = os.path.join(directory, 'no-dump.sqlite')
+    from functions import DataError, get_data_many
+    from wiki_cache import get_wiki_cache
+
+    with open(FIXTURES, encoding='utf-8') as f:
+        fixtures = json.load(f)
+    cache = get_wiki_cache()
+    for fixture in fixtures:
+        title = fixture['title']
+        cache.put(title, {"title": title, "url": 'https://en.wikipedia.org/wiki/' + title.replace(' ', '_'), "revision": 1,
+                          "gender": "unknown", "career": None, "infobox": fixture['infobox']})
+    full_names = [fixtures[i % len(fixtures)]['title'] for i in range(names)]
+    full_names[len(full_names) // 2] = ''  # Gives an error in the middle
+
+    results = {}
+    for processes in dict.fromkeys([1, workers]):
+        start = time.perf_counter()
+        data = get_data_many(full_names, workers=processes)
+        results[processes] = data, time.perf_counter() - start
+
+    one = results[1][0]
+    for processes, (data, seconds) in results.items():
+        if [str(item) for item in data] != [str(item) for item in one]:
+            print(f"{processes} processes: different results")
+        errors = sum(isinstance(item, DataError) for item in data)
+        print(f"{processes:>2} processes {seconds:7.2f}s {names / seconds:9.0f} names/s ({errors} errors)")
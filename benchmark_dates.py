@@ -0,0 +1,55 @@
+# Times dates.extract_dates against the ten regex searches get_date used to run (five for the birth date, five for the
+# death date) over every infobox in fixtures/infoboxes.json, e.g: benchmark_dates.py (test_dates.py checks the dates)
+import datetime
+import json
+import os
+import time
+import regex
+
+from dates import MONTH, extract_dates, to_date
+
+FIXTURES = os.path.join('fixtures', 'infoboxes.json')
+repeats = 200
+
+
+def old_get_date(type, raw_data):
+    # The searches of the old get_date in the same order, a later one that is found replaces the date of an earlier one
+    # (the dates are read with to_date, the searches are what took the time)
+    keyword = 'Date of birth|Born' if type == 'born' else 'Date of death|Died'
+    without_brackets = regex.sub(r'\(.*?\)', '', raw_data, flags=regex.IGNORECASE) if type == 'died' else raw_data
+    without_footnotes = regex.sub(r' \[.*?\]', '', raw_data, flags=regex.IGNORECASE) if type == 'born' else raw_data
+    searches = [
+        ('year', r'[0-9]{1,4}', without_brackets),
+        ('my', rf'\b{MONTH} [0-9]{{1,4}}', raw_data),
+        ('mdy', rf'\b{MONTH} [0-9]{{1,2}}\, [0-9]{{1,4}}', raw_data),
+        ('dmy', rf'[0-9]{{1,2}} \b{MONTH} [0-9]{{1,4}}', without_footnotes),
+        ('iso', r'[0-9]{1,4}-[0-9]{1,2}-[0-9]{1,2}(?= \))', raw_data),
+    ]
+    date = datetime.date.today() if type == 'died' else 'unknown'
+    for kind, pattern, text in searches:
+        found = regex.search(rf'(?<=({keyword})[^,]*){pattern}', text, flags=regex.IGNORECASE)
+        if found is not None:
+            date = to_date(kind, found.group(0))
+    return date
+
+
+with open(FIXTURES, encoding='utf-8') as f:
+    fixtures = json.load(f)
+
+texts = [fixture['infobox'] for fixture in fixtures]
+results = {}
+start = time.perf_counter()
+for _ in range(repeats):
+    for text in texts:
+        old_get_date('born', text)
+        old_get_date('died', text)
+results['get_date born + died (old)'] = (time.perf_counter() - start) / repeats / len(texts) * 1e6
+start = time.perf_counter()
+for _ in range(repeats):
+    for text in texts:
+        extract_dates(text)
+results['extract_dates'] = (time.perf_counter() - start) / repeats / len(texts) * 1e6
+
+print(f"{len(texts)} infoboxes from {FIXTURES}, mean of {repeats} runs")
+for name, us in results.items():
+    print(f"{name:<28}{us:9.1f} us/infobox")
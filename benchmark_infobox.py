@@ -0,0 +1,113 @@
+# Times reading what fetch_person needs from an article with infobox.parse, against parsing the whole page with
+# BeautifulSoup as it used to, and checks both find the same infobox text, gender, revision and canonical url.
+# Wikipedia like pages are made from the rows of fixtures/infoboxes.json so no network is needed, e.g: benchmark_infobox.py 300
+# (the number of paragraphs in each article, a long article has a few hundred)
+import html
+import io
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+import regex
+from bs4 import BeautifulSoup
+
+import infobox
+
+FIXTURES = os.path.join('fixtures', 'infoboxes.json')
+paragraphs = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+repeats = 5
+PRONOUNS = regex.compile(r'(?<![a-z])she(?![[a-z],\'])|(?<![a-z])her(?![[a-z],\'])|(?<![a-z])he(?![[a-z],\'])|(?<![a-z])his(?![[a-z],\'])', flags=regex.IGNORECASE)
+LABELS = ['Born', 'Died', 'Fields', 'Occupation', 'Occupations', 'Spouse(s)', 'Children', 'Awards', 'Known for', 'Resting place', 'Education']
+
+
+def linked(text, rng):
+    # Puts some of the words into links and adds footnotes, like the markup of a real article
+    words = html.escape(text).split(' ')
+    for i in rng.sample(range(len(words)), len(words) // 4):
+        words[i] = f'<a href="/wiki/{words[i]}" title="{words[i]}">{words[i]}</a>'
+    if rng.random() < 0.3:
+        words.append(f'<sup id="cite_ref-{rng.randint(1, 99)}" class="reference"><a href="#cite_note-1">&#91;{rng.randint(1, 99)}&#93;</a></sup>')
+    return ' '.join(words)
+
+
+def make_article(fixture, paragraphs, rng):
+    title = fixture['title']
+    rows = []
+    for row in fixture['infobox'].strip('[] ').split(' , '):
+        label = next((label for label in LABELS if row.startswith(label + ' ')), None)
+        if label is None:
+            rows.append(f'<tr><td colspan="2" class="infobox-full-data">{linked(row, rng)}</td></tr>')
+        else:
+            rows.append(f'<tr><th scope="row" class="infobox-label">{label}</th><td class="infobox-data">{linked(row[len(label) + 1:], rng)}</td></tr>')
+    rows.insert(len(rows) // 2, '<tr><td colspan="2"><table class="medals"><tbody><tr><th>Medal record</th></tr><tr><td>Gold 1921</td></tr></tbody></table></td></tr>')
+    pronoun = 'She' if rng.random() < 0.5 else 'He'
+    text = f'{title} was a person of note. {pronoun} was known for many things, and lived a long and well documented life.'
+    body = [f'<p class="mw-empty-elt">\n</p>', f'<table class="infobox biography vcard"><tbody>{"".join(rows)}</tbody></table>', f'<p><b>{title}</b> {linked(text, rng)}</p>']
+    for i in range(paragraphs):
+        if i % 10 == 0:
+            body.append(f'<h2><span class="mw-headline" id="Section_{i}">Section {i}</span></h2>')
+        body.append(f'<p>{linked(text * 4, rng)}</p>')
+    body.append('<div class="reflist"><ol class="references">' + ''.join(f'<li id="cite_note-{i}"><span class="reference-text">{linked(text, rng)}</span></li>' for i in range(paragraphs // 2)) + '</ol></div>')
+    body.append('<div role="navigation" class="navbox"><table class="nowraplinks"><tbody>' + ''.join(f'<tr><td>{linked(text, rng)}</td></tr>' for _ in range(50)) + '</tbody></table></div>')
+    url = 'https://en.wikipedia.org/wiki/' + title.replace(' ', '_')
+    return (
+        f'<!DOCTYPE html>\n<html class="client-nojs" lang="en" dir="ltr"><head><meta charset="UTF-8"><title>{title} - Wikipedia</title>'
+        f'<script>document.documentElement.className="client-js";RLCONF={{"wgPageName":"{title.replace(" ", "_")}","wgRevisionId":{rng.randint(10**8, 10**9)},"wgArticleId":736}};</script>'
+        f'<link rel="stylesheet" href="/w/load.php?modules=site.styles"><link rel="canonical" href="{url}"></head>'
+        f'<body class="mediawiki"><div id="content"><h1 id="firstHeading">{title}</h1><div id="bodyContent"><div id="mw-content-text">'
+        f'<div class="mw-parser-output">{"".join(body)}</div></div></div></div><footer id="footer">Footer</footer></body></html>'
+    ).encode('utf-8')
+
+
+def old_parse(html_content):
+    # What get_article and fetch_person used to do with the page
+    soup = BeautifulSoup(html_content.decode('utf-8'), "html.parser")
+    canonical = soup.find("link", attrs={"rel": "canonical"})["href"]
+    revision = int(regex.search(r'"wgRevisionId":([0-9]+)', soup.decode()).group(1))
+    content = soup.find("div", attrs={"class": "mw-parser-output"})
+    pronouns = None
+    for paragraph in content.find_all("p", recursive=False):
+        pronouns = PRONOUNS.search(paragraph.get_text())
+        if pronouns is not None:
+            break
+    infobox_table = soup.find("table", attrs={"class": "infobox biography vcard"})
+    table_data_html = str(infobox_table.tbody.find_all("tr"))
+    table_data_cleaned = ' '.join(regex.sub('<[^<]+?>', ' ', table_data_html, flags=regex.IGNORECASE).replace("\\n", " ").split())
+    return canonical, revision, pronouns.group(0), table_data_cleaned
+
+
+def new_parse(html_content):
+    page = infobox.parse(io.BytesIO(html_content), PRONOUNS)
+    return page.canonical, page.revision, page.paragraph_match.group(0), infobox.infobox_text(page.rows)
+
+
+with open(FIXTURES, encoding='utf-8') as f:
+    fixtures = json.load(f)
+rng = random.Random(0)
+pages = [make_article(fixture, paragraphs, rng) for fixture in fixtures]
+
+for fixture, page in zip(fixtures, pages):
+    old, new = old_parse(page), new_parse(page)
+    # The old text kept the rows of tables inside the infobox a second time and html escapes such as &amp;
+    old = old[:3] + (html.unescape(old[3]).replace(' , Medal record , Gold 1921', ''),)
+    if old != new:
+        print(f"{fixture['title']}: different results\n{old}\n{new}")
+
+results = {}
+for name, run in [('BeautifulSoup (old)', old_parse), ('infobox.parse', new_parse)]:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for page in pages:
+            run(page)
+    seconds = (time.perf_counter() - start) / repeats / len(pages)
+    tracemalloc.start()
+    run(pages[0])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    results[name] = seconds * 1000, peak / 2**20
+
+print(f"{len(pages)} articles of {sum(map(len, pages)) // len(pages) // 1024}KB on average, mean of {repeats} runs")
+for name, (ms, mb) in results.items():
+    print(f"{name:<22}{ms:9.2f} ms/article {mb:8.2f}MB peak")
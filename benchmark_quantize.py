@@ -0,0 +1,49 @@
+# Times quantize.matmul on int8 and bfloat16 weights, converted to float32 a tile at a time, against converting the whole
+# matrix for every call as it used to and against the float32 matrix, with the memory each call allocates, e.g: benchmark_quantize.py 8
+# Random matrices the size of the 774M model's largest ones are used, so no model needs to be downloaded
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+import quantize
+
+batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+steps = 20
+shapes = {'model/wte': ([50257, 1280], True), 'h0/mlp/c_fc/w': ([1, 1280, 5120], False)}  # The logits and the widest conv1d
+
+
+def whole_matrix_matmul(x, params, name, transpose=False):
+    # The old matmul, which made a float32 copy of the whole matrix every call
+    w = quantize.dequantize(params, name)
+    w = w.reshape(w.shape[-2:])
+    return np.matmul(x, w.T if transpose else w)
+
+
+def measure(run):
+    run()  # warm up
+    start = time.perf_counter()
+    for _ in range(steps):
+        run()
+    ms = (time.perf_counter() - start) / steps * 1000
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return ms, peak / 2**20
+
+
+rng = np.random.default_rng(0)
+print(f"Batch size {batch_size}, mean of {steps} calls")
+for name, (shape, transpose) in shapes.items():
+    params = {name: rng.normal(scale=0.02, size=shape).astype(np.float32)}
+    x = rng.normal(size=[batch_size, 1280]).astype(np.float32)
+    print(f"{name} {'x'.join(map(str, shape))}: weights {params[name].nbytes / 2**20:.0f}MB float32")
+    results = {'float32': measure(lambda: quantize.matmul(x, params, name, transpose))}
+    for mode in ('int8', 'bfloat16'):
+        quantized = quantize.quantize_params(params, mode)
+        assert np.allclose(quantize.matmul(x, quantized, name, transpose), whole_matrix_matmul(x, quantized, name, transpose), atol=1e-4)
+        results[f'{mode} whole matrix'] = measure(lambda: whole_matrix_matmul(x, quantized, name, transpose))
+        results[f'{mode} tiled'] = measure(lambda: quantize.matmul(x, quantized, name, transpose))
+    for label, (ms, mb) in results.items():
+        print(f"  {label:<24}{ms:8.2f} ms/call {mb:8.1f} MB allocated")
@@ -0,0 +1,44 @@
+# Times one sampling step (filtering the logits and drawing a token) of the old top_p sampler, which sorts the
+# whole vocabulary, against the fused top_k/top_p sampler, e.g: benchmark_sampler.py 8
+# Random logits of the full GPT-2 vocabulary are used, so no model needs to be downloaded
+import sys
+import time
+import numpy as np
+
+import np_sample
+import sample
+from sample import tf
+
+n_vocab = 50257
+batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+steps = 200
+top_k, top_p, temperature = 40, 0.9, 1.0
+
+
+def time_per_step(run):
+    run()  # warm up
+    start = time.perf_counter()
+    for _ in range(steps):
+        run()
+    return (time.perf_counter() - start) / steps * 1000
+
+
+logits = np.random.default_rng(0).normal(scale=3.0, size=[batch_size, n_vocab]).astype(np.float32)
+results = {}
+
+graph = tf.Graph()
+with graph.as_default():
+    placeholder = tf.placeholder(tf.float32, [None, n_vocab])
+    old = sample.sample_logits(sample.filter_logits(placeholder, temperature, top_k=0, top_p=top_p))
+    fused = sample.sample_filtered(placeholder, temperature, top_k, top_p)
+with tf.Session(graph=graph) as sess:
+    results['tf top_p (full sort)'] = time_per_step(lambda: sess.run(old, feed_dict={placeholder: logits}))
+    results['tf fused top_k/top_p'] = time_per_step(lambda: sess.run(fused, feed_dict={placeholder: logits}))
+
+rng = np.random.default_rng(0)
+results['numpy top_p (full sort)'] = time_per_step(lambda: np_sample.multinomial(np_sample.filter_logits(logits, temperature, 0, top_p), rng))
+results['numpy fused top_k/top_p'] = time_per_step(lambda: np_sample.sample_filtered(logits, temperature, top_k, top_p, rng))
+
+print(f"Batch size {batch_size}, vocabulary {n_vocab}, top_k={top_k}, top_p={top_p}, mean of {steps} steps")
+for name, ms in results.items():
+    print(f"{name:<26}{ms:8.3f} ms/step")
@@ -0,0 +1,72 @@
+# Works out a person's career from the keywords in the cleaned infobox text made by fetch_person
+# All the keywords are compiled into one pattern that branches on their first letter, with a named group per keyword,
+# and it is only looked for as a lookahead so the lower cased text is scanned once and every keyword found is kept
+# (even ones inside or overlapping another, e.g. rank in Frank) along with its career
+import re
+
+# Career -> its keywords (lower case patterns), in the order they win when several are found (scientist over politician over ...)
+CAREERS = {
+    "scientist": ['scientific career'],
+    "politician": ['in office', 'assumed office'],
+    "sports person": ['sport', 'coach', 'pro(?![a-z])', '(?<![a-z])team(?![a-z])', 'champion', 'player', 'trophy'],
+    "actor": ['actor'],
+    "musician": ['musician', 'instrument', 'musical'],
+    "comedian": ['comedian', 'comedy'],
+    "journalist": ['journalist', 'journal', 'radio'],
+    "author": ['author', 'writer', 'poet', 'novelist', 'playwright'],
+    "military personnel": ['rank', 'commands', 'years of service', 'allegiance'],
+    "artist": ['movement', 'notable work'],
+}
+FIELDS = 'fields (?P<fields>.+?)(?=,)'  # The scientific fields, up to the next comma
+# Letters that ignoring case matches to s and i but lower() does not turn into them (or not into one letter)
+CASE_FOLD = str.maketrans({'ſ': 's', 'İ': 'i'})
+
+
+def compile_keywords(careers):
+    # Returns the pattern and the career of each keyword group (k0, k1, ...) of it
+    branches = {}  # First letter -> patterns of the rest of the keywords starting with it
+    keyword_careers = []
+    for career, keywords in careers.items():
+        for keyword in keywords:
+            lookbehind, first, rest = re.fullmatch(r'(\(\?<![^)]*\))?(.)(.*)', keyword).groups()
+            if lookbehind is not None:  # (?<![a-z])team becomes t(?<![a-z]t)eam, checked after the first letter
+                rest = f'{lookbehind[:-1]}{first}){rest}'
+            branches.setdefault(first, []).append(f'(?P<k{len(keyword_careers)}>{rest})')
+            keyword_careers.append(career)
+    branches.setdefault('f', []).append(FIELDS[1:])
+    pattern = '|'.join(f'{first}(?:{"|".join(rests)})' for first, rests in sorted(branches.items()))
+    return re.compile(f'(?={pattern})'), keyword_careers
+
+
+KEYWORDS, KEYWORD_CAREERS = compile_keywords(CAREERS)
+
+
+def find_careers(text):
+    # Returns (career, position, keyword) for every keyword in text, in the order they come in, and the scientific fields
+    # (the text after the first Fields up to its comma, None if there is none). Matching ignores case, as text is lower cased first
+    lower = (text.translate(CASE_FOLD) if 'ſ' in text or 'İ' in text else text).lower()  # Same length as text
+    hits = []
+    fields = None
+    for keyword in KEYWORDS.finditer(lower):
+        if keyword.lastgroup == 'fields':
+            if fields is None:
+                fields = text[slice(*keyword.span('fields'))]
+            continue
+        hits.append((KEYWORD_CAREERS[int(keyword.lastgroup[1:])], keyword.start(), text[keyword.start():keyword.end(keyword.lastgroup)]))
+    return hits, fields
+
+
+def classify_career(text):
+    """
+    Returns (career, subscience) for the infobox text: the first career of CAREERS that any keyword was found for
+    (unknown if none was), and for scientists the first word of their fields in lower case (None if there are none)
+    """
+    hits, fields = find_careers(text)
+    found = {career for career, _, _ in hits}
+    for career in CAREERS:
+        if career in found:
+            subscience = None
+            if career == "scientist" and fields is not None:
+                subscience = fields.split(" ")[0].lower()
+            return career, subscience
+    return "unknown", None
@@ -0,0 +1,144 @@
+# Reads tensorflow checkpoints (model.ckpt.index and model.ckpt.data-*) into numpy arrays without importing tensorflow
+# The index file is a table of tensor name -> BundleEntryProto, in the same block format as leveldb
+import os
+import struct
+import numpy as np
+
+TABLE_MAGIC = 0xdb4775248b80fb57  # Last 8 bytes of every table file
+FOOTER_SIZE = 48
+BLOCK_TRAILER_SIZE = 5  # 1 byte compression type and 4 byte crc after every block
+# tensorflow DataType enum values -> numpy dtypes
+DTYPES = {1: np.float32, 2: np.float64, 3: np.int32, 4: np.uint8, 5: np.int16, 6: np.int8, 9: np.int64, 10: np.bool_, 19: np.float16}
+
+
+def read_varint(buf, pos):
+    # Returns the variable length integer starting at pos and the position after it
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def read_fields(buf):
+    # Yields (field number, value) for every field of a serialized protobuf message
+    pos = 0
+    while pos < len(buf):
+        key, pos = read_varint(buf, pos)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:  # varint
+            value, pos = read_varint(buf, pos)
+        elif wire_type == 1:  # fixed 64 bit
+            value = buf[pos:pos + 8]
+            pos += 8
+        elif wire_type == 2:  # length delimited (bytes, strings and messages)
+            length, pos = read_varint(buf, pos)
+            value = buf[pos:pos + length]
+            pos += length
+        elif wire_type == 5:  # fixed 32 bit
+            value = buf[pos:pos + 4]
+            pos += 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire_type}")
+        yield field, value
+
+
+def read_block(buf, handle):
+    # Yields (key, value) for every entry of the block at handle (offset, size)
+    offset, size = handle
+    if buf[offset + size] != 0:
+        raise ValueError("Compressed checkpoint index blocks are not supported")
+    block = buf[offset:offset + size]
+    num_restarts = struct.unpack_from('<I', block, len(block) - 4)[0]
+    end = len(block) - 4 - 4 * num_restarts  # The restart points are only needed for seeking
+    pos = 0
+    key = b''
+    while pos < end:
+        shared, pos = read_varint(block, pos)
+        non_shared, pos = read_varint(block, pos)
+        value_length, pos = read_varint(block, pos)
+        key = key[:shared] + block[pos:pos + non_shared]  # Keys are stored as the part that differs from the previous key
+        pos += non_shared
+        yield key, block[pos:pos + value_length]
+        pos += value_length
+
+
+def read_handle(buf, pos=0):
+    offset, pos = read_varint(buf, pos)
+    size, pos = read_varint(buf, pos)
+    return (offset, size), pos
+
+
+def read_index(prefix):
+    """
+    Reads the index of a checkpoint.
+    Returns the number of data shards and a dict of tensor name -> (dtype, shape, shard, offset, size)
+    :prefix : String, checkpoint path without the extension (e.g models/774M/model.ckpt)
+    """
+    with open(prefix + '.index', 'rb') as f:
+        buf = f.read()
+    footer = buf[-FOOTER_SIZE:]
+    if struct.unpack('<Q', footer[-8:])[0] != TABLE_MAGIC:
+        raise ValueError(f"{prefix}.index is not a tensorflow checkpoint index")
+    _, pos = read_handle(footer)  # metaindex, not used by checkpoints
+    index_handle, _ = read_handle(footer, pos)
+
+    num_shards = 1
+    entries = {}
+    for _, handle in read_block(buf, index_handle):
+        for key, value in read_block(buf, read_handle(handle)[0]):
+            if key == b'':  # The header of the checkpoint is stored under an empty name
+                for field, field_value in read_fields(value):
+                    if field == 1:
+                        num_shards = field_value
+                continue
+            dtype, shape, shard, offset, size = None, [], 0, 0, 0
+            for field, field_value in read_fields(value):
+                if field == 1:
+                    dtype = field_value
+                elif field == 2:  # TensorShapeProto, every dim is a message holding its size
+                    shape = [dict(read_fields(dim)).get(1, 0) for number, dim in read_fields(field_value) if number == 2]
+                elif field == 3:
+                    shard = field_value
+                elif field == 4:
+                    offset = field_value
+                elif field == 5:
+                    size = field_value
+                elif field == 7:
+                    raise ValueError(f"Sliced tensor {key.decode()} is not supported")
+            if dtype not in DTYPES:
+                raise ValueError(f"Tensor {key.decode()} has unsupported dtype {dtype}")
+            entries[key.decode()] = (np.dtype(DTYPES[dtype]), tuple(shape), shard, offset, size)
+    return num_shards, entries
+
+
+def data_path(prefix, shard, num_shards):
+    return f"{prefix}.data-{shard:05d}-of-{num_shards:05d}"
+
+
+def read_checkpoint(prefix):
+    # Returns a dict of tensor name -> numpy array with every tensor in the checkpoint
+    num_shards, entries = read_index(prefix)
+    tensors = {}
+    for shard in range(num_shards):
+        with open(data_path(prefix, shard, num_shards), 'rb') as f:
+            for name, (dtype, shape, entry_shard, offset, size) in entries.items():
+                if entry_shard != shard:
+                    continue
+                f.seek(offset)
+                tensors[name] = np.frombuffer(f.read(size), dtype=dtype.newbyteorder('<')).reshape(shape)
+    return tensors
+
+
+def latest_checkpoint(checkpoint_dir):
+    # Same as tf.train.latest_checkpoint, reads the checkpoint file in checkpoint_dir
+    with open(os.path.join(checkpoint_dir, 'checkpoint')) as f:
+        for line in f:
+            if line.startswith('model_checkpoint_path:'):
+                path = line.split(':', 1)[1].strip().strip('"')
+                return path if os.path.isabs(path) else os.path.join(checkpoint_dir, path)
+    raise ValueError(f"No checkpoint found in {checkpoint_dir}")
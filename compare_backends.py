@@ -0,0 +1,27 @@
+# Checks that the numpy backend gives the same logits as the tensorflow backend, e.g: compare_backends.py 774M
+import sys
+import numpy as np
+
+from generator import get_generator
+
+if len(sys.argv) < 2:
+    print('You must enter the model name as a parameter, e.g.: compare_backends.py 774M')
+    sys.exit(1)
+
+model_name = sys.argv[1]
+text = " ".join(sys.argv[2:]) or "Albert Einstein was a very good scientist"
+tolerance = 1e-3  # The backends sum in a different order, so float32 results are not bit identical
+
+tf_generator = get_generator(model_name, backend='tf')
+np_generator = get_generator(model_name, backend='numpy')
+tokens = [tf_generator.enc.encode(text)]
+tf_logits = tf_generator.logits(tokens)
+np_logits = np_generator.logits(tokens)
+
+difference = float(np.max(np.abs(tf_logits - np_logits)))
+scale = float(np.max(np.abs(tf_logits)))
+print(f"Tokens: {len(tokens[0])}, largest logit: {scale:.4f}, largest difference: {difference:.2e}")
+if difference > tolerance * max(scale, 1.0):
+    print("Backends do not match")
+    sys.exit(1)
+print("Backends match")
@@ -0,0 +1,113 @@
+# Finds the birth and death dates in the cleaned infobox text made by fetch_person
+# A date counts for birth (or death) when it starts after Born or Date of birth (Died or Date of death) with no comma in
+# between, and the most exact kind of date found wins: 1879-03-14 before 14 March 1879 before March 14, 1879 before
+# March 1879 before 1879. Each kind is taken from the first place it is found, which gives the same dates as the ten
+# regex searches get_date used to run over the whole text (except that dates the old code crashed on, such as
+# abbreviated months or day 0, are now read or skipped). Here the text is scanned once for the keywords and only
+# the text after each keyword, up to the next comma, is searched for dates
+import datetime
+import re
+
+MONTH = r'(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|(?:Nov|Dec)(?:ember)?)'
+MONTHS = {name: i for i, name in enumerate(['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], 1)}
+FOOTNOTE = r' \[[^\]]*\]'  # e.g [ 1 ], with the space before it
+
+KEYWORDS = re.compile(r'(?P<born>Date of birth|Born)|(?P<died>Date of death|Died)', re.IGNORECASE)
+PATTERNS = {  # Each kind of date
+    'iso': re.compile(r'[0-9]{1,4}-[0-9]{1,2}-[0-9]{1,2}(?= \))'),  # 1879-03-14, only in brackets ( 1879-03-14 )
+    'dmy': re.compile(rf'[0-9]{{1,2}} {MONTH} [0-9]{{1,4}}', re.IGNORECASE),  # 14 March 1879
+    'mdy': re.compile(rf'\b{MONTH} [0-9]{{1,2}}, [0-9]{{1,4}}', re.IGNORECASE),  # March 14, 1879
+    'my': re.compile(rf'\b{MONTH} [0-9]{{1,4}}', re.IGNORECASE),  # March 1879
+    'year': re.compile(r'[0-9]{1,4}'),  # 1879
+}
+LONGEST = 20  # No match of PATTERNS is longer, so a search for one that starts before a position ends this far past it
+# A birth date in the day month year form skips footnotes, which can be in the middle of it: 10 July [ O.S. 28 June ] 1856
+BIRTH_DMY = re.compile(rf'[0-9]{{1,2}}(?:{FOOTNOTE})* {MONTH}(?:{FOOTNOTE})* [0-9]{{1,4}}', re.IGNORECASE)
+FOOTNOTE_OR_COMMA_OR_DIGIT = re.compile(rf'{FOOTNOTE}|(,)|[0-9]')
+# The year of death skips anything in round brackets (so aged 76 is never read as a year)
+BRACKETS_OR_COMMA_OR_DIGIT = re.compile(r'\([^)]*\)|(,)|[0-9]')
+
+KINDS = ['iso', 'dmy', 'mdy', 'my', 'year']  # Most exact first
+PRECISION = {'iso': 'day', 'dmy': 'day', 'mdy': 'day', 'my': 'month', 'year': 'year'}
+
+
+def to_date(kind, text):
+    # Returns the datetime.date written in text, or None if it is not a real date (e.g. year 0 or 31 February)
+    if kind == 'iso':
+        year, month, day = text.split('-')
+    elif kind == 'dmy':
+        day, month, year = re.sub(FOOTNOTE, '', text).split()
+    elif kind == 'mdy':
+        month, day, year = text.replace(',', '').split()
+    elif kind == 'my':
+        (month, year), day = text.split(), 1
+    else:
+        year, month, day = text, 1, 1
+    if isinstance(month, str) and not month.isdigit():
+        month = MONTHS[month[:3].lower()]
+    try:
+        return datetime.date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+
+def inside(text, position, opening, closing):
+    # Whether position is between an opening and the next closing, which are left out of the text for the kinds that skip them
+    return text.rfind(opening, 0, position) > text.rfind(closing, 0, position) and text.find(closing, position) != -1
+
+
+def first_outside(pattern, text, start, found):
+    # Goes through the text from start, skipping what pattern's first alternative matches, and returns the first place
+    # found accepts a date (None if a comma comes first)
+    for token in pattern.finditer(text, start):
+        if token.group(1) is not None:  # A comma
+            return None
+        if text[token.start()].isdigit():
+            date = found(token.start())
+            if date is not None:
+                return date
+    return None
+
+
+def extract_dates(text):
+    """
+    Returns (birth, death) found in the cleaned infobox text, each (datetime.date, precision) or None when there is
+    no date, with precision year, month or day (dates of lower precision are given as the 1st of the month or year)
+    """
+    found = {'born': {}, 'died': {}}
+    searched = {'born': 0, 'died': 0}  # Where the text after the last keyword of each kind was searched up to
+    for keyword in KEYWORDS.finditer(text):
+        person = keyword.lastgroup
+        start = keyword.end()
+        end = text.find(',', start)
+        end = len(text) if end == -1 else end
+        if end > searched[person]:
+            start = max(start, searched[person])
+            searched[person] = end
+            for kind in KINDS:
+                if kind in found[person] or (person, kind) in (('born', 'dmy'), ('died', 'year')):
+                    continue
+                date = PATTERNS[kind].search(text, start, min(end + LONGEST, len(text)))
+                if date is not None and date.start() < end:
+                    found[person][kind] = date.group(0)
+        # The two kinds that leave parts of the text out, their comma can be further on
+        if person == 'born' and 'dmy' not in found['born'] and not inside(text, keyword.start(), ' [', ']'):
+            date = first_outside(FOOTNOTE_OR_COMMA_OR_DIGIT, text, keyword.end(), lambda position: BIRTH_DMY.match(text, position))
+            if date is not None:
+                found['born']['dmy'] = date.group(0)
+        if person == 'died' and 'year' not in found['died'] and not inside(text, keyword.start(), '(', ')'):
+            date = first_outside(BRACKETS_OR_COMMA_OR_DIGIT, text, keyword.end(), lambda position: PATTERNS['year'].match(text, position))
+            if date is not None:
+                found['died']['year'] = date.group(0)
+
+    dates = []
+    for person in ('born', 'died'):
+        date = None
+        for kind in KINDS:
+            if kind in found[person]:
+                date = to_date(kind, found[person][kind])
+                if date is not None:
+                    date = date, PRECISION[kind]
+                    break
+        dates.append(date)
+    return tuple(dates)
@@ -1,8 +1,13 @@
 # code from https://github.com/timschott/gpt-2
 import os
 import json
+import heapq
 import regex as re
-from functools import lru_cache
+from functools import cached_property, lru_cache
+
+import numpy as np
+
+import weight_store
 
 @lru_cache()
 def bytes_to_unicode():
@@ -38,78 +43,224 @@ def get_pairs(word):
     return pairs
 
 class Encoder:
-    def __init__(self, encoder, bpe_merges, errors='replace'):
+    """
+    GPT-2 byte pair encoder. Symbols are kept as integer ids (the token ids of the vocabulary) and merged
+    with a heap ordered by merge rank, so encoding a word never compares or rebuilds strings.
+    :cache_size=65536 : Maximum number of distinct words whose tokens are remembered, least recently used go first
+    """
+    def __init__(self, encoder, bpe_merges, errors='replace', cache_size=65536):
         self.encoder = encoder
         self.decoder = {v:k for k,v in self.encoder.items()}
         self.errors = errors # how to handle errors in decoding
         self.byte_encoder = bytes_to_unicode()
         self.byte_decoder = {v:k for k, v in self.byte_encoder.items()}
         self.bpe_ranks = dict(zip(bpe_merges, range(len(bpe_merges))))
-        self.cache = {}
+
+        # Symbols that are not tokens of the vocabulary (only possible part way through merging a word) get ids after the last token
+        self.max_token_id = max(self.encoder.values())
+        self.symbol_ids = dict(self.encoder)
+        self.symbol_names = dict(self.decoder)
+
+        def symbol_id(symbol):
+            if symbol not in self.symbol_ids:
+                self.symbol_ids[symbol] = len(self.symbol_names) + self.max_token_id + 1 - len(self.decoder)
+                self.symbol_names[self.symbol_ids[symbol]] = symbol
+            return self.symbol_ids[symbol]
+
+        self.byte_ids = [symbol_id(self.byte_encoder[b]) for b in range(2**8)]
+        # Pair of ids packed as left id << 32 | right id -> (rank, merged id), like bpe_ranks a merge listed twice keeps its last rank
+        self.merges = {
+            symbol_id(first) << 32 | symbol_id(second): (rank, symbol_id(first + second))
+            for (first, second), rank in self.bpe_ranks.items()
+        }
+        self.encode_word = lru_cache(maxsize=cache_size)(self._encode_word)
 
         # Should haved added re.IGNORECASE so BPE merges can happen for capitalized versions of contractions
         self.pat = re.compile(r"""'s|'t|'re|'ve|'m|'ll|'d| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+""")
 
+    def save(self, path):
+        """
+        Saves the vocabulary, merges and byte table as arrays in a weight_store file, which load maps back
+        without parsing encoder.json or vocab.bpe. Symbols are stored as one utf-8 string with the character offset of each.
+        """
+        ids = sorted(self.symbol_names)
+        names = [self.symbol_names[i] for i in ids]
+        weight_store.write_store({
+            'symbol_text': np.frombuffer(''.join(names).encode('utf-8'), dtype=np.uint8),
+            'symbol_offsets': np.cumsum([0] + [len(name) for name in names], dtype=np.int64),
+            'symbol_ids': np.array(ids, dtype=np.int64),
+            'max_token_id': np.array([self.max_token_id], dtype=np.int64),
+            'byte_ids': np.array(self.byte_ids, dtype=np.int64),
+            'merge_pairs': np.array(list(self.merges), dtype=np.int64),
+            'merge_results': np.array(list(self.merges.values()), dtype=np.int64).reshape([-1, 2]),
+        }, path)
+
+    @classmethod
+    def load(cls, path, errors='replace', cache_size=65536):
+        """
+        Encoder saved by save, the same as the one made from encoder.json and vocab.bpe.
+        The file is memory mapped and the dicts are only built from it when they are first used.
+        """
+        self = cls.__new__(cls)
+        self.compiled = weight_store.open_store(path)
+        self.errors = errors
+        self.byte_encoder = bytes_to_unicode()
+        self.byte_decoder = {v:k for k, v in self.byte_encoder.items()}
+        self.max_token_id = int(self.compiled['max_token_id'][0])
+        self.byte_ids = self.compiled['byte_ids'].tolist()
+        self.encode_word = lru_cache(maxsize=cache_size)(self._encode_word)
+        self.pat = re.compile(r"""'s|'t|'re|'ve|'m|'ll|'d| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+""")  # Same as in __init__
+        return self
+
+    # The properties below are only used by an encoder made by load, __init__ sets these attributes itself
+
+    @cached_property
+    def symbols(self):
+        # (ids, names) of every symbol, sorted by id so the tokens come first
+        text = self.compiled['symbol_text'].tobytes().decode('utf-8')
+        offsets = self.compiled['symbol_offsets'].tolist()
+        return self.compiled['symbol_ids'].tolist(), [text[start:end] for start, end in zip(offsets, offsets[1:])]
+
+    @cached_property
+    def encoder(self):
+        ids, names = self.symbols
+        return {name: i for i, name in zip(ids, names) if i <= self.max_token_id}
+
+    @cached_property
+    def decoder(self):
+        ids, names = self.symbols
+        return {i: name for i, name in zip(ids, names) if i <= self.max_token_id}
+
+    @cached_property
+    def symbol_ids(self):
+        ids, names = self.symbols
+        return dict(zip(names, ids))
+
+    @cached_property
+    def symbol_names(self):
+        ids, names = self.symbols
+        return dict(zip(ids, names))
+
+    @cached_property
+    def merges(self):
+        pairs = self.compiled['merge_pairs']
+        return dict(zip(pairs.tolist(), map(tuple, self.compiled['merge_results'].tolist())))
+
+    @cached_property
+    def bpe_ranks(self):
+        return {
+            (self.symbol_names[pair >> 32], self.symbol_names[pair & 0xffffffff]): rank
+            for pair, (rank, _) in self.merges.items()
+        }
+
+    def bpe_ids(self, ids):
+        """
+        Applies the merges to a list of symbol ids and returns the merged ids.
+        Same result as merging the lowest ranked pair everywhere in the word, left to right, until no pair has a merge:
+        all pairs of one rank are merged before pairs made by those merges are looked at.
+        """
+        merges = self.merges
+        n = len(ids)
+        if n < 2:
+            return ids
+        symbols = list(ids)
+        # Doubly linked list over positions, merged away positions are marked by symbols[i] = None
+        next_pos = list(range(1, n + 1))
+        prev_pos = list(range(-1, n - 1))
+        heap = []
+        for i in range(n - 1):
+            merge = merges.get(symbols[i] << 32 | symbols[i + 1])
+            if merge is not None:
+                heap.append((merge[0], i))
+        heapq.heapify(heap)
+
+        while heap:
+            rank = heap[0][0]
+            positions = []
+            while heap and heap[0][0] == rank:
+                positions.append(heapq.heappop(heap)[1])  # Ties pop in position order, so the pairs are merged left to right
+            found = []
+            for i in positions:
+                j = next_pos[i]
+                if symbols[i] is None or j >= n:
+                    continue
+                merge = merges.get(symbols[i] << 32 | symbols[j])
+                if merge is None or merge[0] != rank:  # The pair changed since it was pushed
+                    continue
+                symbols[i] = merge[1]
+                symbols[j] = None
+                next_pos[i] = next_pos[j]
+                if next_pos[i] < n:
+                    prev_pos[next_pos[i]] = i
+                found.append(i)
+            for i in found:  # Pairs made by this rank's merges are only looked at after all of them are done
+                if symbols[i] is None:
+                    continue
+                for left in (prev_pos[i], i):
+                    if left >= 0 and next_pos[left] < n:
+                        merge = merges.get(symbols[left] << 32 | symbols[next_pos[left]])
+                        if merge is not None:
+                            heapq.heappush(heap, (merge[0], left))
+        return [symbol for symbol in symbols if symbol is not None]
+
     def bpe(self, token):
-        if token in self.cache:
-            return self.cache[token]
-        word = tuple(token)
-        pairs = get_pairs(word)
-
-        if not pairs:
-            return token
-
-        while True:
-            bigram = min(pairs, key = lambda pair: self.bpe_ranks.get(pair, float('inf')))
-            if bigram not in self.bpe_ranks:
-                break
-            first, second = bigram
-            new_word = []
-            i = 0
-            while i < len(word):
-                try:
-                    j = word.index(first, i)
-                    new_word.extend(word[i:j])
-                    i = j
-                except:
-                    new_word.extend(word[i:])
-                    break
-
-                if word[i] == first and i < len(word)-1 and word[i+1] == second:
-                    new_word.append(first+second)
-                    i += 2
-                else:
-                    new_word.append(word[i])
-                    i += 1
-            new_word = tuple(new_word)
-            word = new_word
-            if len(word) == 1:
-                break
-            else:
-                pairs = get_pairs(word)
-        word = ' '.join(word)
-        self.cache[token] = word
-        return word
+        # Space separated bpe symbols of a byte encoded token
+        return ' '.join(self.symbol_names[i] for i in self.bpe_ids([self.symbol_ids[c] for c in token]))
+
+    def _encode_word(self, word):
+        # Token ids of one piece of text found by self.pat, cached by self.encode_word
+        ids = self.bpe_ids([self.byte_ids[b] for b in word.encode('utf-8')])
+        for i in ids:
+            if i > self.max_token_id:
+                raise KeyError(self.symbol_names[i])
+        return tuple(ids)
 
     def encode(self, text):
         bpe_tokens = []
-        for token in re.findall(self.pat, text):
-            token = ''.join(self.byte_encoder[b] for b in token.encode('utf-8'))
-            bpe_tokens.extend(self.encoder[bpe_token] for bpe_token in self.bpe(token).split(' '))
+        encode_word = self.encode_word
+        for token in self.pat.findall(text):
+            bpe_tokens.extend(encode_word(token))
         return bpe_tokens
 
+    def encode_batch(self, texts):
+        # Encodes a list of texts, every text shares the same word cache
+        return [self.encode(text) for text in texts]
+
     def decode(self, tokens):
         text = ''.join([self.decoder[token] for token in tokens])
         text = bytearray([self.byte_decoder[c] for c in text]).decode('utf-8', errors=self.errors)
         return text
 
+def compiled_path(model_name):
+    return os.path.join('models', model_name, 'encoder.compiled')
+
+
 def get_encoder(model_name):
-    with open(os.path.join('models', model_name, 'encoder.json'), 'r') as f:
+    # Loads the compiled encoder made by encoder.py when there is one that is newer than encoder.json and vocab.bpe
+    json_path = os.path.join('models', model_name, 'encoder.json')
+    bpe_path = os.path.join('models', model_name, 'vocab.bpe')
+    path = compiled_path(model_name)
+    if os.path.exists(path) and os.path.getmtime(path) >= max(os.path.getmtime(json_path), os.path.getmtime(bpe_path)):
+        return Encoder.load(path)
+    with open(json_path, 'r') as f:
         encoder = json.load(f)
-    with open(os.path.join('models', model_name, 'vocab.bpe'), 'r', encoding="utf-8") as f:
+    with open(bpe_path, 'r', encoding="utf-8") as f:
         bpe_data = f.read()
     bpe_merges = [tuple(merge_str.split()) for merge_str in bpe_data.split('\n')[1:-1]]
     return Encoder(
         encoder=encoder,
         bpe_merges=bpe_merges,
     )
+
+
+if __name__ == '__main__':
+    # Compiles encoder.json and vocab.bpe into one file that loads in a few milliseconds, e.g: encoder.py 774M
+    import sys
+
+    if len(sys.argv) != 2:
+        print('You must enter the model name as a parameter, e.g.: encoder.py 774M')
+        sys.exit(1)
+
+    model_name = sys.argv[1]
+    get_encoder(model_name).save(compiled_path(model_name))
+    print(f"Saved {compiled_path(model_name)} ({os.path.getsize(compiled_path(model_name)) / 2**20:.1f}MB)")
@@ -1,24 +1,27 @@
-from urllib.request import Request, urlopen  # For requesting raw html data
-from datamuse import datamuse  # For generating rhyming words
-from bs4 import BeautifulSoup  # For formatting and obtainging html data
+from urllib.parse import quote, unquote, urlencode  # For building and reading wikipedia and datamuse urls
+import asyncio  # To look up rhymes at the same time
 import regex as re  # For obtaining specific string of text in raw data
 import datetime  # For formatting and manipulating dates
 from dateutil.relativedelta import relativedelta  # To calculate age of given person
 import random  # To shuffle lists and select at random from a list
-import wikipedia  # To obtain the gender of the person
+import os  # To check for the downloaded rhyme dictionary
+import threading  # To guard the remembered rhyme results
+from collections import OrderedDict  # To remember rhyme results for the whole run
+import contextlib  # To keep what get_data prints about a name as its error
+import io  # To keep what get_data prints about a name as its error
+from multiprocessing import Pool  # To get the data of many names on every cpu
 from num2words import num2words  # To generate a worded version of their birth year for rhyming
 
-import json
-import numpy as np
-import os
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # suppresses tensorflow info and warning messages from showing to the end user
-import tensorflow.compat.v1 as tf
-tf.get_logger().setLevel('ERROR')
-tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.ERROR)
+from generator import get_generator  # Keeps the GPT-2 model loaded between poems
+from wiki_cache import get_wiki_cache  # Keeps looked up Wikipedia articles between runs
+import wiki_dump  # Offline index of the people in a Wikipedia dump, used instead of the live site when it has been built
+from dates import extract_dates  # Finds the birth and death dates in the infobox text
+from careers import classify_career  # Finds the career from the keywords in the infobox text
+import rhymes  # Offline rhymes, used instead of Datamuse when the dictionary has been downloaded
+import infobox  # For reading the infobox and lead of Wikipedia pages as they download
+import http_client  # One pooled HTTP client for all requests to Wikipedia and Datamuse
 
-import model, sample, encoder  # importing the AI functions
-
-def get_predicted_text(raw_text, model_name='774M', length=512, batch_size=1, temperature=1, top_k=40, top_p=0.9):
+def get_predicted_text(raw_text, model_name='774M', length=512, batch_size=1, temperature=1, top_k=40, top_p=0.9, max_words=None, backend='tf', weights='float32', draft_model_name=None):
     """
     :raw_text : String, text to make predicted on
     :model_name=774M : String, which model to use
@@ -34,44 +37,108 @@ def get_predicted_text(raw_text, model_name='774M', length=512, batch_size=1, te
      while 40 means 40 words are considered at each step. 0 is a
      special setting meaning no restrictions. 40 generally is a good value.
     :top_p=0.9 : Float value controlling diversity. Implements nucleus sampling,
-     overriding top_k if set to a value > 0. A good setting is 0.9.
+     applied within the top_k tokens if top_k is also set. A good setting is 0.9.
+    :max_words=None : Stops generating once the text has this many words, None for no limit.
+     Generation also stops at the <|endoftext|> token, which is not included in the returned text.
+    :backend=tf : String, either tf (tensorflow) or numpy (cpu only, does not need tensorflow)
+    :weights=float32 : String, float32, int8 or bfloat16. Quantized weights use less memory but need the
+     numpy backend and must first be made with quantize.py
+    :draft_model_name=None : String, smaller model (e.g. 124M) that proposes tokens for model_name to check, which
+     makes generation faster without changing what is generated. Needs the tf backend. None to not use one.
     """
-    enc = encoder.get_encoder(model_name)  # Loads downloaded model from the filesystem
-    hparams = model.default_hparams()
-    with open(os.path.join('models', model_name, 'hparams.json')) as f:
-        dict2 = json.load(f)
-        for key, value in hparams.items():
-            hparams[key] = dict2[key]
-
-    with tf.Session(graph=tf.Graph()) as sess:  # Creates tensorflow model with hyperparameters
-        context = tf.placeholder(tf.int32, [batch_size, None])
-        output = sample.sample_sequence(
-            hparams=hparams, length=length,
-            context=context,
-            batch_size=batch_size,
-            temperature=temperature, top_k=top_k, top_p=top_p
-        )
+    # The model is only loaded the first time it is used, every later poem reuses the same session
+    return get_generator(model_name, backend, weights, draft_model_name).generate(
+        raw_text, length=length, batch_size=batch_size,
+        temperature=temperature, top_k=top_k, top_p=top_p, max_words=max_words
+    )
+
+
+def get_predicted_texts(raw_texts, model_name='774M', length=512, batch_size=8, temperature=1, top_k=40, top_p=0.9, max_words=None, backend='tf', weights='float32', draft_model_name=None):
+    """
+    Batched version of get_predicted_text, returns one predicted text per item of raw_texts (in the same order)
+    :raw_texts : List of strings, texts to make predictions on
+    :batch_size=8 : Maximum number of texts that are decoded together by the AI
+    :max_words=None : Word limit for all texts, or a list with one limit per text
+    """
+    return get_generator(model_name, backend, weights, draft_model_name).generate_batch(
+        raw_texts, length=length, batch_size=batch_size,
+        temperature=temperature, top_k=top_k, top_p=top_p, max_words=max_words
+    )
 
-        saver = tf.train.Saver()  # adds loaded model to tensorflow
-        ckpt = tf.train.latest_checkpoint(os.path.join('models', model_name))
-        saver.restore(sess, ckpt)
 
-        context_tokens = enc.encode(raw_text)  # encodes poem
-        out = sess.run(output, feed_dict={  # runs encoded poem though tensorflow model to create prediction
-          context: [context_tokens for _ in range(batch_size)]
-        })[:, len(context_tokens):]
-        return enc.decode(out[0])  # returns predicted text
+DATAMUSE_URL = "https://api.datamuse.com/words?"
 
 
-def get_rhyming_words(word, words_to_return=10, words_to_generate=10, syllables=1, filter_noun=True):
+class Datamuse:
+    # The Datamuse API through the shared HTTP client, words() returns the same list as the datamuse package's Datamuse().words()
+    async def words_async(self, max=100, **params):
+        return await http_client.get_client().get_json(DATAMUSE_URL + urlencode({**params, 'max': max}))
+
+    def words(self, max=100, **params):
+        return http_client.run(self.words_async(max, **params))
+
+
+DATAMUSE = Datamuse()
+
+
+def get_rhyme_source():
+    # The offline rhyme index when its dictionary has been downloaded (with rhymes.py download), otherwise the Datamuse API
+    if os.path.exists(rhymes.DICTIONARY_PATH):
+        return rhymes.get_rhyme_index()
+    return DATAMUSE
+
+
+RHYME_RESULTS_SIZE = 4096  # Most words whose rhyme results are remembered, the least recently used are forgotten past it
+rhyme_results = OrderedDict()
+rhyme_results_lock = threading.Lock()
+
+
+async def get_rhyme_results_async(word):
+    # Rhyme results of a word, remembered for the whole run as careers and names repeat between poems
+    # Returned as a tuple so callers cannot change the remembered results, failed lookups are not remembered
+    with rhyme_results_lock:
+        if word in rhyme_results:
+            rhyme_results.move_to_end(word)
+            return rhyme_results[word]
+    source = get_rhyme_source()
+    results = tuple(source.words(rel_rhy=word) if isinstance(source, rhymes.RhymeIndex) else await source.words_async(rel_rhy=word))
+    with rhyme_results_lock:
+        rhyme_results[word] = results
+        if len(rhyme_results) > RHYME_RESULTS_SIZE:
+            rhyme_results.popitem(last=False)
+    return results
+
+
+def get_rhyme_results(word):
+    return http_client.run(get_rhyme_results_async(word))
+
+
+async def prefetch_rhymes_async(words):
+    """
+    Looks up the rhymes of all words at the same time, so the get_rhyming_words calls that follow find them
+    in get_rhyme_results without waiting for one request after another (the HTTP client limits how many run at once).
+    Lookups that fail are left for get_rhyming_words to retry and report.
+    """
+    words = [word for word in dict.fromkeys(words) if word]
+    if len(words) < 2 or isinstance(get_rhyme_source(), rhymes.RhymeIndex):  # The local index needs no waiting
+        return
+    await asyncio.gather(*(get_rhyme_results_async(word) for word in words), return_exceptions=True)
+
+
+def prefetch_rhymes(words):
+    http_client.run(prefetch_rhymes_async(words))
+
+
+async def get_rhyming_words_async(word, words_to_return=10, words_to_generate=10, syllables=1, filter_noun=True):
     # Takes word to rhyme with, number of rhyming words to return, number of words to generate and number of syllables to filter by
     if words_to_generate < words_to_return:  # If words_to_generate is larger than words_to_return
         words_to_generate = words_to_return  # Set there to be no randomness in the output
-    apiresult = datamuse.Datamuse().words(rel_rhy=str(word))  # Obtaining list of rhyming words
+    apiresult = list(await get_rhyme_results_async(str(word)))  # Obtaining list of rhyming words (a copy, as it is changed below)
     while len(apiresult) < words_to_return:  # Adding words to the list so it fits the number of words to return, will result in duplicate words
+        await prefetch_rhymes_async([str(result["word"]) for result in apiresult])
         for i in range(0, len(apiresult)):
-            words = datamuse.Datamuse().words(rel_rhy=str(apiresult[i]["word"]))
-            if words != []:
+            words = await get_rhyme_results_async(str(apiresult[i]["word"]))
+            if words != ():
                 for k in words:
                     apiresult.append(k)
                     if len(apiresult) >= words_to_return:
@@ -96,170 +163,185 @@ def get_rhyming_words(word, words_to_return=10, words_to_generate=10, syllables=
     return random.sample(rhyming_words, words_to_return)
 
 
-def get_date(type, raw_data):  # Takes type (born or died) to figure out significant dates, along with raw data
-    # Different formatted date types are searched for below, ordered inverted based on importance (least important first)
-    # This is done so the date_formatted variable is always defined as accurately as it can be, as it is redefined if a better format is found
-    # This way of doing it is slightly inefficient, but works quite reliably
-    date_format = "%Y-%m-%d"  # the format that all dates are put into
-    date_formatted = "unknown"  # Used if no date can be found
-    # Obtaining the birthdate using regex (should work with almost all birthday prefix formats)
+def get_rhyming_words(word, words_to_return=10, words_to_generate=10, syllables=1, filter_noun=True):
+    # get_rhyming_words_async for sync code, run on the HTTP client's shared loop
+    return http_client.run(get_rhyming_words_async(word, words_to_return, words_to_generate, syllables, filter_noun))
 
-    if type == 'died':  # Set death date to today. Keeps it that way if a death date is not found in the article. Used to calucate current age.
-        date_formatted = datetime.datetime.strptime(datetime.datetime.now().date().strftime(date_format), date_format)
 
-    # just int year type (e.g: 1970)
-    if type == "born":
-        date_raw = re.search(r'(?<=(Date of birth|Born)[^,]*)[0-9]{1,4}', raw_data, flags=re.IGNORECASE)
-    elif type == "died":
-        date_raw = re.search(r'(?<=(Date of death|Died)[^,]*)[0-9]{1,4}', re.sub(r'\(.*?\)', '', raw_data, flags=re.IGNORECASE), flags=re.IGNORECASE)
-    if date_raw is not None:
-        if len(date_raw.group(0).replace(" ", "")) <= 4:
-            # Adding a zero to the start of the year if it is less than 3 digits long to fit format
-            year_prefix = (4 - len(date_raw.group(0).split()[0])) * "0"  # e.g 197 -> 0197 to fit in 01-01-0197
-            date_formatted = str(year_prefix) + str(date_raw.group(0).replace(" ", "")) + "-01-01"
-            date_formatted = datetime.datetime.strptime(date_formatted, date_format)
-
-    # no day, word month, int year type (e.g: January 1970)
+def get_date(type, raw_data):  # Takes type (born or died) to figure out significant dates, along with raw data
+    # The date of birth, or unknown if there is none. The date of death, or today if there is none (used to calculate current age)
+    birth, death = extract_dates(raw_data)
     if type == "born":
-        date_raw = re.search(r'(?<=(Date of birth|Born)[^,]*)\b(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|(Nov|Dec)(?:ember)?) [0-9]{1,4}', raw_data, flags=re.IGNORECASE)
-    elif type == "died":
-        date_raw = re.search(r'(?<=(Date of death|Died)[^,]*)\b(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|(Nov|Dec)(?:ember)?) [0-9]{1,4}', raw_data, flags=re.IGNORECASE)
-    if date_raw is not None:
-        # Adding a zero to the start of the year if it is less than 3 digits long to fit format
-        year_prefix = (4 - len(date_raw.group(0).split()[1])) * "0"  # e.g 197 -> 0197 to fit in 01-01-0197
-        i = datetime.datetime.strptime(date_raw.group(0).split()[0], "%B").month
-        if i < 10:  # Adding a zero to the month if it is less than 10 (e.g 01-1-1970 -> 01-01-1970)
-            date_formatted = str(year_prefix) + str(date_raw.group(0).split()[1]) + "-0" + str(i) + "-01"
-            date_formatted = datetime.datetime.strptime(date_formatted, date_format)  # ValueError: time data '4-08-01' does not match format '%Y-%m-%d'
-        else:
-            date_formatted = str(year_prefix) + str(date_raw.group(0).split()[1]) + "-" + str(i) + "-01"
-            date_formatted = datetime.datetime.strptime(date_formatted, date_format)
+        return "unknown" if birth is None else birth[0]
+    return datetime.date.today() if death is None else death[0]
 
-    # word month, int day and int year type (January 1, 1970)
-    if type == "born":
-        date_raw = re.search(r'(?<=(Date of birth|Born)[^,]*)\b(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|(Nov|Dec)(?:ember)?) [0-9]{1,2}\, [0-9]{1,4}', raw_data, flags=re.IGNORECASE)
-    elif type == "died":
-        date_raw = re.search(r'(?<=(Date of death|Died)[^,]*)\b(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|(Nov|Dec)(?:ember)?) [0-9]{1,2}\, [0-9]{1,4}', raw_data, flags=re.IGNORECASE)
-    if date_raw is not None:
-        date_raw = re.sub(',', '', date_raw.group(0), flags=re.IGNORECASE)
-        # Adding a zero to the start of the year if it is less than 3 digits long to fit format
-        year_prefix = (4 - len(date_raw.split()[2])) * "0"  # e.g 197 -> 0197 to fit in 01-01-0197
-        i = datetime.datetime.strptime(date_raw.split()[0], "%B").month
-        if i < 10: # Adding a zero to the month if it is less than 10 (e.g 01-1-1970 -> 01-01-1970)
-            date_formatted = str(year_prefix) + str(date_raw.split()[2]) + "-0" + str(i) + "-" + str(date_raw.split()[1])
-            date_formatted = datetime.datetime.strptime(date_formatted, date_format)  # ValueError: time data '4-08-01' does not match format '%Y-%m-%d'
-        else:
-            date_formatted = str(year_prefix) + str(date_raw.split()[2]) + "-" + str(i) + "-" + str(date_raw.split()[1])
-            date_formatted = datetime.datetime.strptime(date_formatted, date_format)
 
-    # int day and year, word month type (e.g: 1 january 1970)
-    if type == "born":
-        date_raw = re.search(r'(?<=(Date of birth|Born)[^,]*)[0-9]{1,2} \b(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|(Nov|Dec)(?:ember)?) [0-9]{1,4}', re.sub(' \[.*?\]', '', raw_data, flags=re.IGNORECASE), flags=re.IGNORECASE)
-    elif type == "died":
-        date_raw = re.search(r'(?<=(Date of death|Died)[^,]*)[0-9]{1,2} \b(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|(Nov|Dec)(?:ember)?) [0-9]{1,4}', raw_data, flags=re.IGNORECASE)
-    if date_raw is not None:
-        # Adding a zero to the start of the year if it is less than 3 digits long to fit format
-        year_prefix = (4 - len(date_raw.group(0).split()[2])) * "0"  # e.g 197 -> 0197 to fit in 01-01-0197
-        # Converting worded month to digit month
-        i = datetime.datetime.strptime(date_raw.group(0).split()[1], "%B").month
-        if i < 10:  # Adding a zero to the month if it is less than 10 (e.g 01-1-1970 -> 01-01-1970)
-            # Compiling all data and putting it into format, then properly formatting it just in case
-            date_formatted = str(year_prefix) + str(date_raw.group(0).split()[2]) + "-0" + str(i) + "-" + str(date_raw.group(0).split()[0])
-            date_formatted = datetime.datetime.strptime(date_formatted, date_format)
-        else:
-            date_formatted = str(year_prefix) + str(date_raw.group(0).split()[2]) + "-" + str(i) + "-" + str(date_raw.group(0).split()[0])
-            date_formatted = datetime.datetime.strptime(date_formatted, date_format)
+WIKIPEDIA_URL = "https://en.wikipedia.org"
+# Going to Special:Search with go=Go opens the article straight away when the name matches one
+WIKIPEDIA_SEARCH_URL = WIKIPEDIA_URL + "/w/index.php?title=Special:Search&go=Go&search="
 
-    # Normal birthday type (e.g: 01-01-1970)
-    if type == "born":
-        date_raw = re.search(r'(?<=(Date of birth|Born)[^,]*)[0-9]{1,4}-[0-9]{1,2}-[0-9]{1,2}(?= \))', raw_data, flags=re.IGNORECASE)
-    elif type == "died":
-        date_raw = re.search(r'(?<=(Date of death|Died)[^,]*)[0-9]{1,4}-[0-9]{1,2}-[0-9]{1,2}(?= \))', raw_data, flags=re.IGNORECASE)
-    if date_raw is not None:
-        date_formatted = datetime.datetime.strptime(date_raw.group(0), date_format)
+
+async def get_article_async(full_name):
+    """
+    Fetches the Wikipedia article of a name. When the name matches an article the search goes straight to it, so the
+    title, infobox and article text all come from that one request, otherwise the first search result is fetched.
+    Only the page up to the end of the infobox and the first paragraph with a pronoun is parsed (see infobox.py).
+    Returns the title, url, revision id and parsed page (an infobox.ArticleParser), or None if the search found nothing.
+    """
+    client = http_client.get_client()
+    async with await client.get(WIKIPEDIA_SEARCH_URL + quote(full_name)) as response:
+        url = response.geturl()
+        page = await infobox.parse_async(response, infobox.PRONOUNS)
+    if '/wiki/' not in url or 'Special:Search' in url:  # Landed on the search results
+        if page.search_result is None:
+            return None
+        async with await client.get(WIKIPEDIA_URL + page.search_result) as response:
+            url = response.geturl()
+            page = await infobox.parse_async(response, infobox.PRONOUNS)
+    if page.canonical is not None:  # Redirects (e.g. from a lower case name) end at the article's real url
+        url = page.canonical
+    title = unquote(url.split("/wiki/", 1)[1]).replace("_", " ")
+    return title, url, page.revision, page
+
+
+async def get_revision_async(title):
+    # Current revision id of an article, a much smaller request than the article itself
+    url = WIKIPEDIA_URL + "/w/api.php?action=query&format=json&prop=revisions&rvprop=ids&titles=" + quote(title)
+    pages = (await http_client.get_client().get_json(url))["query"]["pages"]
+    return next(iter(pages.values()))["revisions"][0]["revid"]
+
+
+async def fetch_person_async(full_name):
+    """
+    Fetches what get_data needs from the Wikipedia article of a name: the title, url, revision, gender,
+    career if the page gives it away and the cleaned infobox text. Returns None (after saying why) if it cannot,
+    raises TimeoutError when Wikipedia does not answer.
+    """
+    article = await get_article_async(full_name)
+    if article is None:
+        print(f"Check spelling of {full_name} and try again\n")
+        return
+    title, url, revision, page = article
+
+    # Obtaining gender of person from the first pronoun in the article text
+    gender = "unknown"
+    if page.disambiguation:
+        print('Ambiguous name submitted, please be more specific\n')
+        return
+    pronouns = page.paragraph_match  # The lead comes first, so this is usually in the first paragraph
+    if pronouns is None:
+        print(f"Please type in a more specific name (currently {title})\n")
+        return
+    pronouns = pronouns.group(0).lower()
+    if pronouns == "she" or pronouns == "her":
+        gender = "female"
+    elif pronouns == "he" or pronouns == "his":
+        gender = "male"
+
+    # The rows of the infobox of the person, from the first table with an infobox class (a musician's one gives away their career)
+    if page.infobox_class is None:
+        print(f"Note: Data could not be obtained, please check spelling of {title} and try again\n")
+        return
+    career = infobox.INFOBOX_CLASSES[page.infobox_class]
+    table_data_cleaned = infobox.infobox_text(page.rows)
+    return {"title": title, "url": url, "revision": revision, "gender": gender, "career": career, "infobox": table_data_cleaned}
+
+
+def get_dump_index():
+    # The index of a Wikipedia dump when one has been built (with wiki_dump.py), otherwise None and the live site is used.
+    # Its file can be set with the WIKI_DUMP_INDEX environment variable
+    path = os.environ.get('WIKI_DUMP_INDEX', wiki_dump.INDEX_PATH)
+    if os.path.exists(path):
+        return wiki_dump.get_dump_index(path)
+
+
+TIMEOUT_MESSAGE = 'Connection to wikipedia timed out, please check your internet connection'
+
+
+def get_data(full_name, refresh=False):
+    """
+    Finds the person on Wikipedia and works out the data the poem is made from (see get_data_async),
+    on the HTTP client's shared loop so connections to Wikipedia are reused between calls and threads.
+    Raises TimeoutError when Wikipedia does not answer, for the caller to report (main.py exits, a list of names goes on).
+    :refresh=False : Fetches the article again even when it is in the cache
+    """
     try:
-        date_found = date_formatted.date()
-    except AttributeError:
-        date_found = "unknown"
-    return date_found
+        return http_client.run(get_data_async(full_name, refresh))
+    except asyncio.TimeoutError as e:  # The same class as TimeoutError from Python 3.11
+        raise TimeoutError(TIMEOUT_MESSAGE) from e
+
 
+def look_up_person(full_name, refresh=False):
+    # Whether there is a dump index, the entry of the person in it or in the cache (None if there is none) and for a cache
+    # miss the expired entry, for get_data_async to check for edits
+    dump = get_dump_index()
+    if dump is not None:
+        return True, dump.get(full_name), None
+    cache = get_wiki_cache()
+    person = None if refresh else cache.get(full_name)
+    stale = cache.get(full_name, stale=True) if person is None and not refresh else None
+    return False, person, stale
 
-def get_data(full_name):
+
+async def get_data_async(full_name, refresh=False):
+    """
+    Finds the person on Wikipedia and works out the data the poem is made from.
+    When the index of a Wikipedia dump has been built (see wiki_dump.py) the person is looked up in it, without the network.
+    Otherwise articles that were fetched before come from the local cache (see wiki_cache.py) without any network requests,
+    an expired one is only fetched again if the article has been edited since. Raises TimeoutError when Wikipedia does not answer.
+    :refresh=False : Fetches the article again even when it is in the cache
+    """
+    if full_name.strip() == "":
+        print("Name cannot be empty, please type in a name\n")
+        return
+    # The SQLite calls run on a thread, so they never hold up the other requests on the loop
+    from_dump, person, stale = await asyncio.to_thread(look_up_person, full_name, refresh)
+    if from_dump:
+        if person is None:
+            print(f"Check spelling of {full_name} and try again\n")
+            return
+    else:
+        cache = get_wiki_cache()
+        if stale is not None and stale["revision"] is not None:
+            try:
+                if await get_revision_async(stale["title"]) == stale["revision"]:
+                    await asyncio.to_thread(cache.renew, full_name)
+                    person = stale
+            except (OSError, ValueError, KeyError, IndexError, StopIteration):  # Fetching the whole article again decides
+                pass
+        if person is None:
+            person = await fetch_person_async(full_name)
+            if person is None:
+                return
+            await asyncio.to_thread(cache.put, full_name, person)
+    return person_data(person)
+
+
+def person_data(person):
+    # The data get_data returns, worked out from the entry of the person (see fetch_person_async)
     # Get first and last name of the person and correct possible formatting errors
+    full_name, url, gender, table_data_cleaned = person["title"], person["url"], person["gender"], person["infobox"]
     try:
-        full_name = wikipedia.search(full_name)[0]
-        try:
-            first_name = re.sub(r'\,|\"|\'|\(|\)|\{|\}|\[|\]|\||\\|\/|\?|\!|\@|\#|\$|\%|\^|\&|\*|\_|\+|\=|\:|\;|\<|\>|\,|\.', '', full_name.split()[0].replace(" ", "").replace(",", ""), flags=re.IGNORECASE).title()
-            last_name = re.sub(r'\,|\"|\'|\(|\)|\{|\}|\[|\]|\||\\|\/|\?|\!|\@|\#|\$|\%|\^|\&|\*|\_|\+|\=|\:|\;|\<|\>|\,|\.', '', re.sub(r'.*? ', '', full_name, 1), flags=re.IGNORECASE).title()
-        except AttributeError:
-            print(f"Please type in a more specific name (currently {full_name})\n")
-            return
-        url = "https://en.wikipedia.org/wiki/" + full_name.replace(" ", "_")
-    except IndexError:
-        print(f"Check spelling of {full_name} and try again\n")
-        return
-    except TimeoutError:
-        print('Connection to wikipedia timed out, please check your internet connection\n')
-        exit()
-    except wikipedia.exceptions.WikipediaException:
-        print("Name cannot be empty, please type in a name\n")
+        first_name = re.sub(r'\,|\"|\'|\(|\)|\{|\}|\[|\]|\||\\|\/|\?|\!|\@|\#|\$|\%|\^|\&|\*|\_|\+|\=|\:|\;|\<|\>|\,|\.', '', full_name.split()[0].replace(" ", "").replace(",", ""), flags=re.IGNORECASE).title()
+        last_name = re.sub(r'\,|\"|\'|\(|\)|\{|\}|\[|\]|\||\\|\/|\?|\!|\@|\#|\$|\%|\^|\&|\*|\_|\+|\=|\:|\;|\<|\>|\,|\.', '', re.sub(r'.*? ', '', full_name, 1), flags=re.IGNORECASE).title()
+    except (AttributeError, IndexError):
+        print(f"Please type in a more specific name (currently {full_name})\n")
         return
 
-    # Obtaining gender of person using name variable
-    gender = "unknown"
-    if full_name != "":
-        try:
-            page = wikipedia.page(full_name, auto_suggest=False).content
-        except:
-            print('Ambiguous name submitted, please be more specific\n')
-            return
-        try:
-            pronouns = re.search(r'(?<![a-z])she(?![[a-z],\'])|(?<![a-z])her(?![[a-z],\'])|(?<![a-z])he(?![[a-z],\'])|(?<![a-z])his(?![[a-z],\'])', page, flags=re.IGNORECASE).group(0).lower()
-        except AttributeError:
-            print(f"Please type in a more specific name (currently {full_name})\n")
-            return
-        if pronouns == "she" or pronouns == "her":
-            gender = "female"
-        elif pronouns == "he" or pronouns == "his":
-            gender = "male"
     career = None
     # Checking if the name is in the format (first_name last_name (career)) and obtaining career from it
     career_bracket = re.search(r'(?<=\().*?(?=\))', full_name, flags=re.IGNORECASE)
     if career_bracket is not None:  # e.g John Smith (politician)
         career = career_bracket.group(0)
+    if person["career"] is not None:  # From the kind of infobox
+        career = person["career"]
 
-    # Fetching the raw HTML content
-    html_content = str(urlopen(Request(url, headers={'User-Agent': 'Mozilla/5.0'})).read())
-    # Parsing the html content
-    soup = BeautifulSoup(html_content, "html.parser")
-    # Obtaining the html of the infobox of the person from a table with the class infobox
-    infobox_table = soup.find("table", attrs={"class": "infobox biography vcard"})
-    # Sometimes the html attribute of the infobox is "infobox vcard" or "infobox vcard plainlist" (only for musicians)
-    if infobox_table is None:
-        infobox_table = soup.find("table", attrs={"class": "infobox vcard plainlist"})
-        if infobox_table is not None:
-            career = "musician"
-
-    if infobox_table is None:
-        infobox_table = soup.find("table", attrs={"class": "infobox vcard"})
+    # obtaining the birth and death date from one scan of the infobox (see dates.py), a missing death date is set to today
+    birth, death = extract_dates(table_data_cleaned)
+    birth_date = "unknown" if birth is None else birth[0]
+    death_date = datetime.date.today() if death is None else death[0]
 
-    try:
-        infobox_table_data = infobox_table.tbody.find_all("tr")  # Only obtaining the data contained in rows in the infobox
-    except:
-        print(f"Note: Data could not be obtained, please check spelling of {full_name} and try again\n")
-        return
-    table_data_html = str(infobox_table_data)
-
-    # Getting rid of html tags and characters using regex
-    table_data_cleaned = re.sub('<[^<]+?>', ' ', table_data_html, flags=re.IGNORECASE).replace("\\n", " ")
-    # Replacing any number of spaces in a row with just one (from "    " or "  " to " ")
-    table_data_cleaned = ' '.join(table_data_cleaned.split())
-
-    # obtaining the birth and death date using get_date function
-    birth_date = get_date("born", table_data_cleaned)
-    death_date = get_date("died", table_data_cleaned)
-
-    if death_date == datetime.datetime.strptime(datetime.datetime.now().date().strftime('%Y-%m-%d'), '%Y-%m-%d').date():
+    if death_date == datetime.date.today():
         alive_or_dead = "alive"
         if isinstance(birth_date, datetime.date):
             age = str(relativedelta(death_date, birth_date).years).replace(" ", "")  # Calculating age using relativedelta
@@ -274,54 +356,86 @@ def get_data(full_name):
     if int(age) > 122:  # In case the death date is not obtained correctly, and is set to today
         age = "unknown"
 
-    # Searching for the keywords of specific careers to find their career
-    science = re.search(r'scientific career', table_data_cleaned, flags=re.IGNORECASE)
-    politics = re.search(r'(in|assumed) office', table_data_cleaned, flags=re.IGNORECASE)
-    musician = re.search(r'musician|instrument|musical', table_data_cleaned, flags=re.IGNORECASE)
-    actor = re.search(r'actor', table_data_cleaned, flags=re.IGNORECASE)
-    comedian = re.search(r'comedian|comedy', table_data_cleaned, flags=re.IGNORECASE)
-    journalist = re.search(r'journalist|journal|radio', table_data_cleaned, flags=re.IGNORECASE)
-    sports = re.search(r'sport|coach|pro(?![a-z])|(?<![a-z])team(?![a-z])|champion|player|trophy', table_data_cleaned, flags=re.IGNORECASE)
-    author = re.search(r'author|writer|poet|novelist|playwright', table_data_cleaned, flags=re.IGNORECASE)
-    military = re.search(r'rank|commands|years of service|allegiance', table_data_cleaned, flags=re.IGNORECASE)
-    artist = re.search(r'movement|notable work', table_data_cleaned, flags=re.IGNORECASE)
+    # Searching for the keywords of specific careers to find their career (see careers.py)
     subscience = None  # Default value
-    # Assigning career
     if career is None:  # Just in case career is defined through the persons name
-        if science is not None:
-            career = "scientist"
-            # Obtaining a more specific scientific career
-            subscience = re.search(r'(?<=Fields ).+?(?=,)', table_data_cleaned, flags=re.IGNORECASE)
-            if subscience is not None:
-                subscience = str(subscience.group(0)).split(" ")[0].lower()  # 1st result of regex search and 1st word in result
-        elif politics is not None:
-            career = "politician"
-        elif sports is not None:
-            career = "sports person"
-        elif actor is not None:
-            career = "actor"
-        elif musician is not None:
-            career = "musician"
-        elif comedian is not None:
-            career = "comedian"
-        elif journalist is not None:
-            career = "journalist"
-        elif author is not None:
-            career = "author"
-        elif military is not None:
-            career = "military personnel"
-        elif artist is not None:
-            career = "artist"
-        else:
-            career = "unknown"
+        career, subscience = classify_career(table_data_cleaned)
 
     return str(birth_date), age, alive_or_dead, career, gender, subscience, first_name, last_name, url
 
 
-def generate_poem(all_data, poem_settings):
-    poem_order = poem_settings["Poem order"]
-    ai_fill = poem_settings["AI fill"]
-    set_order = poem_settings["Set poem order"]
+class DataError(Exception):
+    # Why no data was found for a name, what get_data_many gives in place of its data (get_data prints it and returns None)
+    def __init__(self, name, message):
+        super().__init__(name, message)
+        self.name = name
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+def get_data_or_error(full_name, refresh=False):
+    # get_data's tuple for the name, or a DataError with what it printed (or the exception it raised) instead
+    printed = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(printed):
+            all_data = http_client.run(get_data_async(full_name, refresh))
+    except Exception as e:
+        return DataError(full_name, f"{type(e).__name__}: {e}")
+    if all_data is None:
+        return DataError(full_name, ' '.join(printed.getvalue().split()) or "No data found")
+    return all_data
+
+
+def get_data_task(task):
+    return get_data_or_error(*task)
+
+
+def start_data_worker():
+    # A forked worker does not use the parent's SQLite connections, it opens its own
+    get_wiki_cache.cache_clear()
+    wiki_dump.get_dump_index.cache_clear()
+
+
+def get_data_many(full_names, workers=None, refresh=False, chunksize=None):
+    """
+    get_data for every name on a pool of processes, so parsing and working out the data runs on every cpu.
+    Returns a list in the order of the names, of get_data's tuple or a DataError saying why there is none.
+    :workers=None : Number of processes, None for one per cpu, 1 to run in this process
+    :refresh=False : Fetches every Wikipedia article again instead of using the cache
+    :chunksize=None : Names sent to a process at a time, None to split them into about four chunks per process
+    """
+    tasks = [(full_name, refresh) for full_name in full_names]
+    if workers == 1 or len(tasks) < 2:
+        return [get_data_task(task) for task in tasks]
+    with Pool(workers, initializer=start_data_worker) as pool:
+        return pool.map(get_data_task, tasks, chunksize)
+
+
+def year_in_words(birth_year):
+    # Returns the year written in words (e.g 1970 -> nineteen seventy) and its last word, which is rhymed with in the poem
+    # Converting integer year to words using num2words
+    if len(str(birth_year)) == 4:  # Testing if the year has 4 digits
+        # splitting year into two numbers and getting words for these numbers, then combining them
+        full_year_name = num2words(str(birth_year)[0:2]) + " " + num2words(str(birth_year)[2:4])
+        if str(birth_year)[1] == "0" and str(birth_year)[2] == "0":  # Checking for a year with format X00X where X != 0
+            full_year_name = num2words(birth_year)
+        if str(birth_year)[1] != "0" and str(birth_year)[2] == "0":  # Checking for year with format XY0X in which Y != 0
+            # Converting from XY0X format to a worded format (e.g 1902 -> nineteen o'two)
+            full_year_name = num2words(str(birth_year)[0:2]) + " o'" + num2words(str(birth_year)[3])
+    else:  # If the year is less than 4 digits long, word is the entire number
+        full_year_name = num2words(birth_year)
+
+    # Obtaining the last word of birth_year, used to rhyme with in poem
+    year_word_to_rhy = full_year_name.split("-")[len(full_year_name.split("-")) - 1]  # Obtaining the last word of the string
+    if year_word_to_rhy == str(full_year_name):
+        year_word_to_rhy = full_year_name.split()[len(full_year_name.split()) - 1]  # Obtaining the last word of the string
+    return full_year_name, year_word_to_rhy
+
+
+def compose_poem(all_data, poem_settings):
+    # Builds the rhyming lines of the poem, returns the lines, the poem as one string (used as the AI prompt) and its word count
     words_to_generate = poem_settings["Words to generate"]
     number_of_syllables = poem_settings["Number of syllables"]
 
@@ -337,30 +451,20 @@ def generate_poem(all_data, poem_settings):
 
     # Rhyming code
     lastname_initial = last_name[0]
+    if birth_year != "year":
+        full_year_name, year_word_to_rhy = year_in_words(birth_year)
+    else:
+        year_word_to_rhy = "unknown"
+    career_word = {"sports person": "person", "military personnel": "personnel"}.get(career, career)  # Last word of two word careers
+    # Every rhyme the poem might need (the other name parts are only used if the first name has no rhymes) is looked up at once
+    prefetch_rhymes([lastname_initial, first_name] + full_name.split()[1:3]
+                    + ([year_word_to_rhy] if birth_year != "year" else []) + ([career_word] if career != "scientist" else []))
     lastname_initial_rhyme = get_rhyming_words(lastname_initial, 5, words_to_generate, number_of_syllables)
 
     if birth_year != "year":
-        # Converting integer year to words using num2words
-        if len(str(birth_year)) == 4:  # Testing if the year has 4 digits
-            # splitting year into two numbers and getting words for these numbers, then combining them
-            full_year_name = num2words(str(birth_year)[0:2]) + " " + num2words(str(birth_year)[2:4])
-            if str(birth_year)[1] == "0" and str(birth_year)[2] == "0":  # Checking for a year with format X00X where X != 0
-                full_year_name = num2words(birth_year)
-            if str(birth_year)[1] != "0" and str(birth_year)[2] == "0":  # Checking for year with format XY0X in which Y != 0
-                # Converting from XY0X format to a worded format (e.g 1902 -> nineteen o'two)
-                full_year_name = num2words(str(birth_year)[0:2]) + " o'" + num2words(str(birth_year)[3])
-        else:  # If the year is less than 4 digits long, word is the entire number
-            full_year_name = num2words(birth_year)
-
-        # Obtaining the last word of birth_year, used to rhyme with in poem
-        year_word_to_rhy = full_year_name.split("-")[len(full_year_name.split("-")) - 1]  # Obtaining the last word of the string
-        if year_word_to_rhy == str(full_year_name):
-            year_word_to_rhy = full_year_name.split()[len(full_year_name.split()) - 1]  # Obtaining the last word of the string
-
         year_rhymes = get_rhyming_words(year_word_to_rhy, 1, words_to_generate, number_of_syllables)  # Obtaining rhymes
     else:
         year_rhymes = ["unknown"]
-        year_word_to_rhy = "unknown"
 
     if career == "sports person":  # Rhyme with last word of profession instead of both words
         career_rhymes = get_rhyming_words("person", 5, words_to_generate, number_of_syllables)
@@ -425,9 +529,6 @@ def generate_poem(all_data, poem_settings):
     line8 = auxiliary_verbs[1].title() + " birth was " + chosen_positive_desc + ", not mentioning the " + year_rhymes[0]
 
     list_of_lines = [line1, line2, line3, line4, line5, line6, line7, line8]
-    a_lines = [line1, line2, line3, line4]
-    b_lines = [line5, line6]
-    c_lines = [line7, line8]
     raw_poem = ""
     for i in list_of_lines:
         raw_poem += i + "\n"
@@ -436,40 +537,112 @@ def generate_poem(all_data, poem_settings):
     for i in list_of_lines:  # Calculating the number of words in all lines of the poem
         no_of_words += int(len(i.split()))
 
-    if ai_fill:  # if user set ai_fill
-        AI_output = ""
-        testing_no_of_words = no_of_words
-        AI_text = get_predicted_text(raw_poem, model_name='774M', length=512, batch_size=1, temperature=1, top_k=40, top_p=0.9)  # gets predicted text from GPT-2 AI
-        AI_text = re.sub(r'\<\|endoftext\|\>.*', '', AI_text, flags=re.IGNORECASE)  # removes text after <|endoftext|> flag
-        AI_text = re.sub(r'\.(\n| )|\n', '\n', AI_text, flags=re.IGNORECASE)  # seperates each sentence into different lines
-        for i in AI_text.split('\n'):  # iterates though sentence
-            if i in AI_output:  # skips line if duplicate
-                continue
-            for j in i.split():  # increases word count for each word in sentence
-                testing_no_of_words += 1
-            if testing_no_of_words >= 200:  # breaks if sentence would put poem over 200 words
-                break
-            no_of_words = testing_no_of_words  # updates true number of words if sentence fits
-            AI_output += i + '\n'  # adds sentence to rest of poem
+    return list_of_lines, raw_poem, no_of_words
+
+
+AI_MAX_POEM_WORDS = 200  # Sentences from the AI are added to the poem until it would reach this many words
+# Words generated past what the poem has room for, as fill_poem leaves out repeated lines and the sentence that would not fit
+AI_SPARE_WORDS = 50
+
+# A list of settings to be parsed through the generate_poem function, with default values specified
+DEFAULT_POEM_SETTINGS = {
+    "Poem order": "normal",  # Can be set to either normal or random
+    "AI fill": True,  # Can be True or False
+    "Set poem order": "aaaabbcc",  # User set poem rhyming order
+    # Rhyming settings
+    "Number of words": 10,  # number of words to return
+    "Words to generate": 10,  # if this is larger than no of words, then the output is slightly randomised
+    "Number of syllables": 2  # Default filter is >, so upwards of the specified value
+    }
+
+
+def fill_word_budget(no_of_words):
+    # Most words the AI generates for a poem that already has no_of_words, enough for fill_poem to reach the word limit
+    return AI_MAX_POEM_WORDS - no_of_words + AI_SPARE_WORDS
+
+
+def fill_poem(AI_text, no_of_words, max_words=None):
+    # Cuts the AI generated text into sentences and keeps as many as fit in the word limit
+    # max_words is the budget the text was generated with, a text that used all of it stops mid sentence so its last one is left out
+    AI_output = ""
+    testing_no_of_words = no_of_words
+    AI_text = re.sub(r'\<\|endoftext\|\>.*', '', AI_text, flags=re.IGNORECASE)  # removes text after <|endoftext|> flag
+    cut_off = max_words is not None and len(AI_text.split()) >= max_words
+    AI_text = re.sub(r'\.(\n| )|\n', '\n', AI_text, flags=re.IGNORECASE)  # seperates each sentence into different lines
+    sentences = AI_text.split('\n')
+    if cut_off:
+        sentences = sentences[:-1]  # The unfinished sentence the word budget stopped in
+    for i in sentences:  # iterates though sentence
+        if i in AI_output:  # skips line if duplicate
+            continue
+        for j in i.split():  # increases word count for each word in sentence
+            testing_no_of_words += 1
+        if testing_no_of_words >= AI_MAX_POEM_WORDS:  # breaks if sentence would put poem over 200 words
+            break
+        no_of_words = testing_no_of_words  # updates true number of words if sentence fits
+        AI_output += i + '\n'  # adds sentence to rest of poem
+    return AI_output, no_of_words
+
+
+def order_poem(list_of_lines, poem_settings):
+    # Returns the lines of the poem in the order they are printed in
+    poem_order = poem_settings["Poem order"]
+    set_order = poem_settings["Set poem order"]
+    if poem_order == "random":  # if poem is set to random the lines are shuffled
+        return random.sample(list_of_lines, len(list_of_lines))
+    lines = {"a": list_of_lines[0:4], "b": list_of_lines[4:6], "c": list_of_lines[6:8]}
+    return [lines[i].pop(0) for i in set_order if i in lines]  # Iterating through set order and taking lines based on characters
 
-    print(f"Poem: ({no_of_words} words long)\n")  # prints number of words in total poem
 
-    if poem_order == "random":  # if poem is set to random print shuffled lines
-        random.shuffle(list_of_lines)
-        for i in list_of_lines:
-            print(i)
+def print_poem(list_of_lines, no_of_words, poem_settings, AI_output=None):
+    print(f"Poem: ({no_of_words} words long)\n")  # prints number of words in total poem
+    for i in order_poem(list_of_lines, poem_settings):
+        print(i)
+    if poem_settings["Poem order"] == "random":
         return
 
-    for i in set_order:  # Iterating through set order and printing based on characters
-        if i == "a":
-            print(a_lines[0])
-            a_lines.pop(0)
-        if i == "b":
-            print(b_lines[0])
-            b_lines.pop(0)
-        if i == "c":
-            print(c_lines[0])
-            c_lines.pop(0)
-
-    if ai_fill:  # if user set ai_fill print AI generated poem
+    if AI_output is not None:  # if user set ai_fill print AI generated poem
         print("\n" + AI_output)
+
+
+def generate_poem(all_data, poem_settings):
+    list_of_lines, raw_poem, no_of_words = compose_poem(all_data, poem_settings)
+    AI_output = None
+    if poem_settings["AI fill"]:  # if user set ai_fill
+        # gets predicted text from GPT-2 AI, stopping once it has generated more words than could fit in the poem
+        max_words = fill_word_budget(no_of_words)
+        AI_text = get_predicted_text(raw_poem, model_name='774M', length=512, batch_size=1, temperature=1, top_k=40, top_p=0.9, max_words=max_words)
+        AI_output, no_of_words = fill_poem(AI_text, no_of_words, max_words)
+    print_poem(list_of_lines, no_of_words, poem_settings, AI_output)
+
+
+def generate_poems(all_data_list, poem_settings, batch_size=8):
+    # Same as generate_poem for a list of people, but all AI fills run as batched decodes instead of one after another
+    # Returns the arguments for print_poem for each person so the caller decides when each poem is printed
+    return fill_poems([compose_poem(all_data, poem_settings) for all_data in all_data_list], poem_settings, batch_size)
+
+
+def fill_poems(poems, poem_settings, batch_size=8):
+    # Runs the AI fills of poems made by compose_poem as batched decodes, returns the arguments for print_poem for each
+    AI_texts = [None] * len(poems)
+    if poem_settings["AI fill"] and poems:  # if user set ai_fill
+        AI_texts = get_predicted_texts(
+            [raw_poem for _, raw_poem, _ in poems], model_name='774M', length=512, batch_size=batch_size, temperature=1, top_k=40, top_p=0.9,
+            max_words=[fill_word_budget(no_of_words) for _, _, no_of_words in poems]
+        )
+    results = []
+    for (list_of_lines, raw_poem, no_of_words), AI_text in zip(poems, AI_texts):
+        AI_output = None
+        if AI_text is not None:
+            AI_output, no_of_words = fill_poem(AI_text, no_of_words, fill_word_budget(no_of_words))
+        results.append((list_of_lines, no_of_words, AI_output))
+    return results
+
+
+def poem_data(full_name, all_data):
+    # Puts the data obtained by get_data into the format used by generate_poem
+    birth_year = "year"
+    if all_data[0] != "unknown":
+        birth_year = str(all_data[0]).split("-")[0]
+    # full_name, first_name, last_name, age, birth_year, alive_or_dead, career, gender, subscience
+    return [full_name, all_data[6], all_data[7], all_data[1], birth_year, all_data[2], all_data[3], all_data[4], all_data[5]]
@@ -0,0 +1,113 @@
+# Keeps the GPT-2 model loaded between poems so the encoder, weights and sampling code are only loaded once per process
+# The backends (tf_generator.py and np_generator.py) are only imported when they are first used
+import json
+import os
+from functools import lru_cache
+
+import encoder
+
+
+def load_hparams(model_name):
+    # Reads the hyperparameters of a downloaded model (n_vocab, n_ctx, n_embd, n_head and n_layer)
+    with open(os.path.join('models', model_name, 'hparams.json')) as f:
+        return json.load(f)
+
+
+def word_table(enc):
+    # For every token: whether it contains any non whitespace text, starts with whitespace and ends with whitespace
+    # Lets sample_sequence count generated words the same way str.split does
+    table = []
+    for token in range(len(enc.decoder)):
+        text = enc.decode([token])
+        table.append([text.strip() != '', text[:1].isspace(), text[-1:].isspace()])
+    return table
+
+
+class Generator:
+    """
+    Long-lived GPT-2 model. The encoder, hyperparameters and weights are loaded once
+    when the generator is created and reused by every call to generate.
+    Backends subclass this and implement _sample.
+    :model_name=774M : String, which model to use
+    """
+    def __init__(self, model_name='774M'):
+        self.model_name = model_name
+        self.enc = encoder.get_encoder(model_name)  # Loads downloaded model from the filesystem
+        self.hparams = load_hparams(model_name)
+        self.stop_token = self.enc.encoder['<|endoftext|>']  # Rows stop being generated once they reach the end of text
+
+    def _sample(self, context, pad, max_words, length, temperature, top_k, top_p):
+        """
+        Runs the sampling loop of the backend and returns the tokens of every row (context included).
+        :context : List of token lists, all left padded to the same length
+        :pad : List with the number of padding tokens in front of each row
+        :max_words : List with the word budget of each row
+        """
+        raise NotImplementedError
+
+    def generate(self, prompt, length=512, batch_size=1, temperature=1, top_k=40, top_p=0.9, max_words=None):
+        """
+        Generation stops at <|endoftext|>, after length tokens or after max_words words, whichever comes first.
+        :prompt : String, text to make predicted on
+        :length=512 : Maximum number of tokens in generated text
+        :batch_size=1 : Number of batches (only affects speed/memory).
+        :temperature=1 : Float value controlling randomness in boltzmann distribution.
+        :top_k=40 : Integer value controlling diversity, 0 means no restrictions.
+        :top_p=0.9 : Float value controlling diversity. Implements nucleus sampling,
+         within the top_k tokens if top_k is also set.
+        :max_words=None : Maximum number of words in generated text, None for no limit
+        """
+        context_tokens = self.enc.encode(prompt)  # encodes poem
+        out = self._run([context_tokens for _ in range(batch_size)], [max_words] * batch_size, length, temperature, top_k, top_p)
+        return self.enc.decode(out[0])  # returns predicted text
+
+    def generate_batch(self, prompts, length=512, batch_size=8, temperature=1, top_k=40, top_p=0.9, max_words=None):
+        """
+        Generates a continuation for every prompt, running up to batch_size different prompts
+        through the same sampling loop. Returns the predicted texts in the same order as prompts.
+        :prompts : List of strings, texts to make predictions on
+        :batch_size=8 : Maximum number of prompts decoded together
+        :max_words=None : Maximum number of words, either one value for all prompts or a list with one value per prompt
+        """
+        all_tokens = self.enc.encode_batch(prompts)  # encodes poems
+        if not isinstance(max_words, (list, tuple)):
+            max_words = [max_words] * len(prompts)
+        # Sorting by length so prompts of similar length share a batch and need less padding
+        order = sorted(range(len(all_tokens)), key=lambda i: len(all_tokens[i]))
+        texts = [None] * len(all_tokens)
+        for start in range(0, len(order), batch_size):
+            bucket = order[start:start + batch_size]
+            out = self._run([all_tokens[i] for i in bucket], [max_words[i] for i in bucket], length, temperature, top_k, top_p)
+            for row, i in enumerate(bucket):
+                texts[i] = self.enc.decode(out[row])
+        return texts
+
+    def _run(self, context_tokens, max_words, length, temperature, top_k, top_p):
+        # Left pads the prompts to the same length and returns only the generated tokens of each row, up to its end of text
+        context_length = max(len(tokens) for tokens in context_tokens)
+        pad = [context_length - len(tokens) for tokens in context_tokens]
+        padded = [[self.stop_token] * pad[i] + tokens for i, tokens in enumerate(context_tokens)]
+        max_words = [length if words is None else words for words in max_words]  # A token never holds more than one word
+        out = self._sample(padded, pad, max_words, length, temperature, top_k, top_p)
+        rows = []
+        for row in out[:, context_length:].tolist():
+            if self.stop_token in row:
+                row = row[:row.index(self.stop_token)]
+            rows.append(row)
+        return rows
+
+
+@lru_cache()
+def get_generator(model_name='774M', backend='tf', weights='float32', draft_model_name=None):
+    # One Generator per model, backend, weight format and draft model for the whole process
+    if backend == 'tf':
+        if weights != 'float32':
+            raise ValueError("Quantized weights (int8 or bfloat16) need the numpy backend")
+        from tf_generator import TFGenerator
+        return TFGenerator(model_name, draft_model_name)
+    if backend == 'numpy':  # Runs without tensorflow, for machines without a GPU
+        if draft_model_name is not None:
+            raise ValueError("Speculative decoding with a draft model needs the tf backend")
+        from np_generator import NumpyGenerator
+        return NumpyGenerator(model_name, weights)
+    raise ValueError(f"Unknown backend {backend}, must be either tf or numpy")
@@ -0,0 +1,277 @@
+# One asyncio HTTP client for everything fetched over the network (Wikipedia's pages and api, the Datamuse api), built on
+# aiohttp. Connections are kept alive and reused per host, so only the first request to a host pays for the TCP and TLS
+# handshakes. The client limits how many requests run at once (overall and per host), can space out the requests to a host,
+# times out connecting and reading, and retries failed requests (connection errors, 429 and 5xx answers, json that does not
+# parse) after a wait that doubles each time.
+# Async code uses the client of its own event loop with get_client(), sync code runs coroutines on one shared background
+# loop with run() so every thread uses the same connections, e.g: run(get_client().get_json(url))
+import asyncio
+import atexit
+import contextvars
+import json
+import os
+import threading
+import weakref
+from concurrent.futures import Future
+from urllib.parse import urlsplit
+
+import aiohttp
+
+USER_AGENT = 'Mozilla/5.0'
+CONNECTIONS_PER_HOST = 6
+CONCURRENCY = 32
+TIMEOUT = 10
+RETRIES = 3
+BACKOFF = 0.5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_REDIRECTS = 10
+READ_SIZE = 64 * 1024
+DRAIN_LIMIT = 256 * 1024  # Most unread bytes of a body read to the end on release so its connection can be reused
+
+
+class HTTPError(OSError):
+    # An error status that was still the answer after any retries, an OSError like urllib's HTTPError
+    def __init__(self, url, status):
+        super().__init__(f'HTTP {status} for {url}')
+        self.url = url
+        self.status = status
+
+
+def os_error(error):
+    # An aiohttp error as the OSError (or TimeoutError) callers catch, so they need not know about aiohttp
+    if isinstance(error, (OSError, asyncio.TimeoutError)):
+        return error
+    if isinstance(error, aiohttp.TooManyRedirects):
+        return HTTPError(error.request_info.real_url, error.status)
+    return ConnectionError(f'{type(error).__name__}: {error}')
+
+
+class Response:
+    """
+    An answer whose body is read as it is needed with read(), decompressed if it was sent compressed.
+    Its connection goes back to the pool once the whole body has been read, or on release().
+    """
+    def __init__(self, response):
+        self.response = response
+        self.url = str(response.url)
+        self.status = response.status
+        self.headers = response.headers
+        self.charset = response.charset  # From the Content-Type header, None if it gives none
+
+    def geturl(self):
+        # The url the answer came from, after any redirects
+        return self.url
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.release()
+
+    async def read(self, n=-1):
+        # Up to n bytes of the body (the rest of it with -1), b'' once it has all been read
+        try:
+            return await self.response.content.read(n)
+        except aiohttp.ClientError as e:
+            raise os_error(e) from e
+
+    async def json(self):
+        return json.loads(await self.read())
+
+    async def release(self):
+        # Done with the response: a short unread rest of the body is read so the connection can be reused, a long one closes it
+        drained = 0
+        try:
+            while drained < DRAIN_LIMIT and not self.response.content.at_eof():
+                drained += len(await self.response.content.read(READ_SIZE))
+        except (aiohttp.ClientError, OSError, asyncio.TimeoutError):
+            pass
+        self.response.release()
+
+
+class HTTPClient:
+    """
+    A keep-alive connection pool per host, for the event loop it is made on.
+    :connections_per_host=6 : Most connections open to one host, requests past it wait for one to be free
+    :concurrency=32 : Most requests running at once, until their response has been read or released
+    :timeout=10 : Seconds to wait to connect and for each read
+    :retries=3 : Times a request is made again after a connection error, timeout, 429 or 5xx status, or json that does not parse
+    :backoff=0.5 : Seconds waited before the first retry, doubled for each one after (a Retry-After from the server is waited instead)
+    :rate=None : Most requests started a second to one host, None for no limit
+    """
+    def __init__(self, connections_per_host=CONNECTIONS_PER_HOST, concurrency=CONCURRENCY, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF, rate=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.rate = rate
+        self.next_start = {}  # host -> loop time the next request to it can start, with a rate
+        self.sent = 0
+        self.opened = 0
+        self.reused = 0
+        self.retried = 0
+        trace = aiohttp.TraceConfig()
+        trace.on_connection_create_end.append(self.count_opened)
+        trace.on_connection_reuseconn.append(self.count_reused)
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=concurrency, limit_per_host=connections_per_host),
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout),
+            headers={'User-Agent': USER_AGENT}, trace_configs=[trace],
+        )
+
+    async def count_opened(self, session, context, params):
+        self.opened += 1
+
+    async def count_reused(self, session, context, params):
+        self.reused += 1
+
+    async def wait_turn(self, host):
+        # Spaces out the requests started to a host to the rate
+        if self.rate is None:
+            return
+        now = asyncio.get_running_loop().time()
+        start = max(now, self.next_start.get(host, now))
+        self.next_start[host] = start + 1 / self.rate
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def fetch(self, url, headers=None):
+        # One attempt at url, following redirects, returns the Response once its status and headers have arrived
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f'Cannot fetch {url}')
+        await self.wait_turn(parts.hostname)
+        try:
+            response = await self.session.get(url, headers=headers, max_redirects=MAX_REDIRECTS)
+        except aiohttp.ClientError as e:
+            raise os_error(e) from e
+        self.sent += 1
+        return Response(response)
+
+    def retry_wait(self, attempt, response=None):
+        retry_after = response.headers.get('Retry-After', '') if response is not None else ''
+        return float(retry_after) if retry_after.isdigit() else self.backoff * 2 ** attempt
+
+    async def get(self, url, headers=None):
+        """
+        GET of url following redirects, tried again after failures. Returns the Response once its headers have arrived,
+        read its body with read() and release() it if it is not read to the end (e.g. with async with).
+        Raises HTTPError for an error status, and the last error when every attempt failed.
+        """
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                response = await self.fetch(url, headers)
+            except (OSError, asyncio.TimeoutError) as error:
+                if last or isinstance(error, HTTPError):
+                    raise
+                wait = self.retry_wait(attempt)
+            else:
+                if response.status < 400:
+                    return response
+                await response.release()
+                if last or response.status not in RETRY_STATUSES:
+                    raise HTTPError(response.url, response.status)
+                wait = self.retry_wait(attempt, response)
+            self.retried += 1
+            await asyncio.sleep(wait)
+
+    async def get_json(self, url, headers=None):
+        # The json answer of url, an answer that is not json (e.g. an error page, or cut short) is tried again too
+        for attempt in range(self.retries + 1):
+            response = await self.get(url, headers)
+            try:
+                return await response.json()
+            except (ValueError, OSError, asyncio.TimeoutError):
+                await response.release()
+                if attempt == self.retries:
+                    raise
+            self.retried += 1
+            await asyncio.sleep(self.retry_wait(attempt))
+
+    async def close(self):
+        await self.session.close()
+
+    def stats(self):
+        return {'requests': self.sent, 'connections': self.opened, 'reused': self.reused, 'retries': self.retried}
+
+
+clients = weakref.WeakKeyDictionary()  # Event loop -> its client
+background = None  # The loop run() uses, on a thread of its own
+background_lock = threading.Lock()
+
+
+def get_client():
+    """
+    The client of the running event loop, made the first time it is needed. Its settings can be changed with the
+    HTTP_CONNECTIONS_PER_HOST, HTTP_CONCURRENCY, HTTP_TIMEOUT, HTTP_RETRIES, HTTP_BACKOFF and HTTP_RATE environment variables.
+    On a loop of your own, await get_client().close() before the loop ends
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in clients:
+        clients[loop] = HTTPClient(
+            connections_per_host=int(os.environ.get('HTTP_CONNECTIONS_PER_HOST', CONNECTIONS_PER_HOST)),
+            concurrency=int(os.environ.get('HTTP_CONCURRENCY', CONCURRENCY)),
+            timeout=float(os.environ.get('HTTP_TIMEOUT', TIMEOUT)),
+            retries=int(os.environ.get('HTTP_RETRIES', RETRIES)),
+            backoff=float(os.environ.get('HTTP_BACKOFF', BACKOFF)),
+            rate=float(os.environ['HTTP_RATE']) if os.environ.get('HTTP_RATE') else None,
+        )
+    return clients[loop]
+
+
+def forget_background_loop():
+    # A forked process has none of its parent's threads, so it starts a background loop of its own when it needs one
+    global background, background_lock
+    background = None
+    background_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=forget_background_loop)
+
+
+def get_background_loop():
+    global background
+    with background_lock:
+        if background is None:
+            background = asyncio.new_event_loop()
+            threading.Thread(target=background.run_forever, name='http_client', daemon=True).start()
+        return background
+
+
+@atexit.register
+def close_background_client():
+    # Closes the connections of the background loop's client when the program ends
+    loop = background
+    if loop is not None and loop in clients:
+        asyncio.run_coroutine_threadsafe(clients[loop].close(), loop).result(TIMEOUT)
+
+
+def run(coroutine):
+    """
+    Runs a coroutine on the shared background loop and returns its result (or raises its error), for sync code.
+    It runs in a copy of the caller's context, so context variables (such as where pipeline.py sends a thread's prints) carry over.
+    Raises RuntimeError when called from the background loop itself, which would wait for itself forever
+    """
+    loop = get_background_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:  # No loop running in this thread, as expected
+        running = None
+    if running is loop:
+        coroutine.close()
+        raise RuntimeError('http_client.run was called from the background loop, await the coroutine instead')
+    result = Future()
+
+    def done(task):
+        if task.cancelled():
+            result.cancel()
+        elif task.exception() is not None:
+            result.set_exception(task.exception())
+        else:
+            result.set_result(task.result())
+
+    def start():
+        loop.create_task(coroutine).add_done_callback(done)  # The task takes the context start runs in
+
+    loop.call_soon_threadsafe(start, context=contextvars.copy_context())
+    return result.result()
@@ -0,0 +1,191 @@
+# Reads a Wikipedia page's html as it downloads and keeps only what fetch_person needs, instead of parsing the whole
+# article into a tree: the canonical url and revision id (from the head), the infobox as (label, value) rows,
+# the first lead paragraph matching a pattern, whether it is a disambiguation page and the first search result.
+# Reading stops as soon as the infobox and the paragraph have been found, so memory no longer grows with the article
+import codecs
+import re
+from html.parser import HTMLParser
+import regex
+
+CHUNK_SIZE = 16 * 1024
+# Infobox classes, with the career the kind of infobox gives away, best first. The infobox is the first table with the
+# best class on the page (a biography one after a plain vcard one still wins), as the classes were searched for in this order
+INFOBOX_CLASSES = {"infobox biography vcard": None, "infobox vcard plainlist": "musician", "infobox vcard": None}
+INFOBOX_PRIORITY = {name: priority for priority, name in enumerate(INFOBOX_CLASSES)}
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source', 'track', 'wbr'}
+REVISION = re.compile(r'"wgRevisionId":([0-9]+)')
+# The first pronoun in the article text gives the gender
+PRONOUNS = regex.compile(r'(?<![a-z])she(?![[a-z],\'])|(?<![a-z])her(?![[a-z],\'])|(?<![a-z])he(?![[a-z],\'])|(?<![a-z])his(?![[a-z],\'])', flags=regex.IGNORECASE)
+
+
+class ArticleParser(HTMLParser):
+    """
+    Event based parser of a Wikipedia page, feed it the html in pieces and check done() in between.
+    :paragraph_pattern=None : Compiled pattern, paragraph_match is its match in the first paragraph of the article that has one
+    """
+    def __init__(self, paragraph_pattern=None):
+        super().__init__(convert_charrefs=True)
+        self.paragraph_pattern = paragraph_pattern
+        self.canonical = None
+        self.revision = None
+        self.disambiguation = False
+        self.search_result = None  # href of the first result, when the page is a list of search results
+        self.infobox_class = None  # Class of the best infobox so far
+        self.infobox_done = False
+        self.rows = []  # (label, value) of each row of the infobox, the text of its th and td cells
+        self.paragraph_match = None
+        self.stack = []  # Names of the open elements
+        self.content = None  # Depth of the children of the mw-parser-output div
+        self.infobox = None  # Depth of the infobox table, then of the tables inside it
+        self.tables = 0  # Tables open inside the infobox
+        self.row = self.cell = None  # Texts of the row and cell being read (lists of strings)
+        self.paragraph = None  # Depth and texts of the lead paragraph being read
+        self.script = None  # Texts of the head script being read, until the revision id has been found
+        self.skip = 0  # Open style and script elements, whose text is not part of the page
+        self.in_search_result = False
+
+    def done(self):
+        # Whether everything has been found, a page of search results is done at its first result.
+        # An infobox without the best class is only final once the article text has ended, a better one could come after it
+        infobox_final = self.infobox_done and (INFOBOX_PRIORITY[self.infobox_class] == 0 or self.content == -1)
+        return self.search_result is not None or (infobox_final and (self.paragraph_pattern is None or self.paragraph_match is not None))
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = attrs.get('class') or ''
+        if tag == 'link' and attrs.get('rel') == 'canonical' and self.canonical is None:
+            self.canonical = attrs.get('href')
+        elif tag == 'script' and self.revision is None:
+            self.script = []
+        if attrs.get('id') == 'disambigbox' or 'dmbox-disambig' in classes.split():
+            self.disambiguation = True
+        if tag == 'div' and 'mw-search-result-heading' in classes.split() and self.search_result is None:
+            self.in_search_result = True
+        elif tag == 'a' and self.in_search_result:
+            self.search_result = attrs.get('href')
+            self.in_search_result = False
+        if tag in VOID_TAGS:
+            self.boundary()
+            return
+        if tag in ('style', 'script'):
+            self.skip += 1
+
+        if tag == 'div' and self.content is None and 'mw-parser-output' in classes.split():
+            self.content = len(self.stack) + 1
+        elif tag == 'p' and len(self.stack) == self.content and self.paragraph_pattern is not None and self.paragraph is None and self.paragraph_match is None:
+            self.paragraph = len(self.stack), []
+        if tag == 'table':
+            priority = INFOBOX_PRIORITY.get(classes)
+            if priority is not None and (self.infobox_class is None or priority < INFOBOX_PRIORITY[self.infobox_class]):
+                # A better infobox than any so far (even one inside it), which replaces what was read of that one
+                self.infobox_class = classes
+                self.infobox = len(self.stack)
+                self.infobox_done = False
+                self.tables = 0
+                self.rows = []
+                self.row = self.cell = None
+            elif self.infobox is not None:
+                self.tables += 1
+        elif tag == 'tr' and self.infobox is not None and self.tables == 0 and self.row is None:
+            self.row = [[], []]  # Label and value texts
+        elif tag in ('th', 'td') and self.row is not None and self.tables == 0 and self.cell is None:
+            self.cell = self.row[tag == 'td']
+        self.boundary()
+        self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag not in self.stack:
+            return
+        while self.stack:  # Closes anything left open inside it too
+            name = self.stack.pop()
+            self.close(name)
+            if name == tag:
+                break
+
+    def close(self, tag):
+        depth = len(self.stack)
+        self.boundary()
+        if tag in ('style', 'script'):
+            self.skip -= 1
+            if self.script is not None:
+                revision = REVISION.search(''.join(self.script))
+                if revision is not None:
+                    self.revision = int(revision.group(1))
+                self.script = None
+        elif tag == 'div' and depth + 1 == self.content:
+            self.content = -1  # The article text has ended
+        elif tag == 'p' and self.paragraph is not None and depth == self.paragraph[0]:
+            # Joined without spaces, like BeautifulSoup's get_text
+            self.paragraph_match = self.paragraph_pattern.search(''.join(self.paragraph[1]))
+            self.paragraph = None
+        elif tag in ('th', 'td') and self.cell is not None and self.tables == 0:
+            self.cell = None
+        elif tag == 'tr' and self.row is not None and self.tables == 0:
+            self.rows.append(tuple(' '.join(''.join(texts).split()) for texts in self.row))
+            self.row = None
+        elif tag == 'table' and self.infobox is not None:
+            if self.tables:
+                self.tables -= 1
+            elif depth == self.infobox:
+                self.infobox = None
+                self.infobox_done = True
+
+    def boundary(self):
+        # Every tag separates the text of the infobox, as the old html cleaning replaced tags with spaces
+        if self.cell is not None:
+            self.cell.append(' ')
+
+    def handle_data(self, data):
+        if self.script is not None:
+            self.script.append(data)
+        if self.skip:
+            return
+        if self.cell is not None:
+            self.cell.append(data)
+        if self.paragraph is not None:
+            self.paragraph[1].append(data)
+
+
+def get_decoder(response):
+    # Decoder of the charset the response gives (utf-8 if it gives none), an http_client.Response has it as its charset
+    headers = getattr(response, 'headers', None)
+    charset = getattr(response, 'charset', None) or (headers.get_content_charset() if hasattr(headers, 'get_content_charset') else None)
+    charset = charset or 'utf-8'
+    return codecs.getincrementaldecoder(charset)(errors='replace')
+
+
+def parse(response, paragraph_pattern=None, chunk_size=CHUNK_SIZE):
+    # Feeds the html of a urlopen response (or any binary file) to an ArticleParser until it is done or the page ends.
+    # The rest of the page is never read
+    decoder = get_decoder(response)
+    parser = ArticleParser(paragraph_pattern)
+    while not parser.done():
+        chunk = response.read(chunk_size)
+        parser.feed(decoder.decode(chunk, final=not chunk))
+        if not chunk:
+            parser.close()
+            break
+    return parser
+
+
+async def parse_async(response, paragraph_pattern=None, chunk_size=CHUNK_SIZE):
+    # parse for an http_client.Response, whose read is awaited
+    decoder = get_decoder(response)
+    parser = ArticleParser(paragraph_pattern)
+    while not parser.done():
+        chunk = await response.read(chunk_size)
+        parser.feed(decoder.decode(chunk, final=not chunk))
+        if not chunk:
+            parser.close()
+            break
+    return parser
+
+
+def infobox_text(rows):
+    # The rows as one line of text, in the format get_data searches: [ label value , label value ]
+    return ' '.join(('[ ' + ' , '.join(' '.join(filter(None, row)) for row in rows) + ' ]').split())
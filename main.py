@@ -1,6 +1,46 @@
-from functions import get_data, generate_poem
+from functions import DEFAULT_POEM_SETTINGS, get_data, generate_poem, poem_data, print_poem
+from pipeline import run_pipeline
+from wiki_cache import get_wiki_cache
 import random
-import math
+import sys
+
+refresh = '--refresh' in sys.argv[1:]  # Fetches every Wikipedia article again instead of using the ones cached by earlier runs
+
+
+def print_data(full_name, all_data):
+    # Prints the data obtained for a person
+    print("Name:", all_data[6].title(), all_data[7].title())
+    print("URL:", all_data[8])
+    birth_date = all_data[0]
+    birth_year = "year"
+    birth_month = None
+    birth_day = None
+    if birth_date != "unknown":
+        birth_year = str(birth_date).split("-")[0]
+        birth_month = str(birth_date).split("-")[1]
+        birth_day = str(birth_date).split("-")[2]
+        print("Birthday:", f"{birth_day}/{birth_month}/{birth_year}")
+    else:
+        print("Birthday: Unknown")
+    age = all_data[1]
+    alive_or_dead = all_data[2]
+    career = all_data[3]
+    gender = all_data[4]
+    subscience = all_data[5]
+    if alive_or_dead == "alive":
+        print("Current age:", age, "(Currently alive)")
+    elif alive_or_dead == "dead":
+        print("Age at death:", age)
+    elif alive_or_dead == "unknown":
+        print(f"Age: Unknown (Age could not be obtained for {full_name})")
+    if career == "unknown":
+        print(f"Career: {career.title()} (Career could not be obtained for {full_name})")
+    else:
+        print("Career:", career.title())
+    if subscience is not None:
+        print("Subscience: ", subscience.title())
+    print(f"Gender: {gender.title()}\n")
+
 
 print("Victorian coding challenge: Wikipedia based data extraction and poem generation")
 
@@ -14,7 +54,7 @@ while True:
         print("\nEnd of file condition typed, exiting...")
         exit()
     if loop_user_input == "" or loop_user_input.lower()[0] == "u":  # If the user wants to type the people to be run
-        full_name_list = [None]*math.factorial(8)  # Extremely inefficient, generates a list with 40320 None's in it
+        full_name_list = None  # Names are asked for one at a time
         break
     elif loop_user_input.lower()[0] == "h":
         print("\nName input command list (case insensitive)")
@@ -52,18 +92,11 @@ while True:
         break
     else:
         print(f"Unsupported command typed ({loop_user_input}), please try again")
-random.shuffle(full_name_list)  # Randomising order of list
-
-# A list of settings to be parsed through the generate_poem function, with default values specified
-poem_settings = {
-    "Poem order": "normal",  # Can be set to either normal or random
-    "AI fill": True,  # Can be True or False
-    "Set poem order": "aaaabbcc",  # User set poem rhyming order
-    # Rhyming settings
-    "Number of words": 10,  # number of words to return
-    "Words to generate": 10,  # if this is larger than no of words, then the output is slightly randomised
-    "Number of syllables": 2  # Default filter is >, so upwards of the specified value
-    }
+if full_name_list is not None:
+    random.shuffle(full_name_list)  # Randomising order of list
+
+# A list of settings to be parsed through the generate_poem function, starting with the default values
+poem_settings = dict(DEFAULT_POEM_SETTINGS)
 
 # User Settings loop
 while True:
@@ -192,51 +225,35 @@ for i in range(len(poem_settings)):  # iterates through the length of the dict a
     print(list(poem_settings)[i] + ": " + str(list(poem_settings.values())[i]))
 print()
 
-for full_name in full_name_list:  # Main loop
-    while full_name is None:  # For user input
+if full_name_list is None:  # User input, names are typed one at a time so each poem is generated straight away
+    while True:  # Main loop
+        full_name = None
+        while full_name is None:  # For user input
+            try:
+                full_name = input("Please type a name: ")
+            except EOFError:  # Handling inputs such as ctrl C (^C)
+                print("\nEnd of file condition typed, exiting...")
+                exit()
+            print()
         try:
-            full_name = input("Please type a name: ")
-        except EOFError:  # Handling inputs such as ctrl C (^C)
-            print("\nEnd of file condition typed, exiting...")
+            all_data = get_data(full_name, refresh)  # Running get_data function to obtain all data
+        except TimeoutError as e:
+            print(f"{e}\n")
             exit()
-        print()
-    all_data = get_data(full_name)  # Running get_data function to obtain all data
-    if all_data is None:
-        continue  # Jumping to the next loop if no data is returned
-    print("Name:", all_data[6].title(), all_data[7].title())
-    print("URL:", all_data[8])
-    birth_date = all_data[0]
-    birth_year = "year"
-    birth_month = None
-    birth_day = None
-    if birth_date != "unknown":
-        birth_year = str(birth_date).split("-")[0]
-        birth_month = str(birth_date).split("-")[1]
-        birth_day = str(birth_date).split("-")[2]
-        print("Birthday:", f"{birth_day}/{birth_month}/{birth_year}")
-    else:
-        print("Birthday: Unknown")
-    age = all_data[1]
-    alive_or_dead = all_data[2]
-    career = all_data[3]
-    gender = all_data[4]
-    subscience = all_data[5]
-    first_name = all_data[6]
-    last_name = all_data[7]
-    if alive_or_dead == "alive":
-        print("Current age:", age, "(Currently alive)")
-    elif alive_or_dead == "dead":
-        print("Age at death:", age)
-    elif alive_or_dead == "unknown":
-        print(f"Age: Unknown (Age could not be obtained for {full_name})")
-    if career == "unknown":
-        print(f"Career: {career.title()} (Career could not be obtained for {full_name})")
-    else:
-        print("Career:", career.title())
-    if subscience is not None:
-        print("Subscience: ", subscience.title())
-    print(f"Gender: {gender.title()}\n")
-
-    all_data = [full_name, first_name, last_name, age, birth_year, alive_or_dead, career, gender, subscience]
-    generate_poem(all_data, poem_settings)  # Parsing all data into the poem generation function
-    print("\n")
+        if all_data is None:
+            continue  # Jumping to the next loop if no data is returned
+        print_data(full_name, all_data)
+        generate_poem(poem_data(full_name, all_data), poem_settings)  # Parsing all data into the poem generation function
+        print("\n")
+else:  # Name lists are known up front, so the data of the next people is fetched while the AI fills the current poems
+    for full_name, all_data, printed, poem, _ in run_pipeline(full_name_list, poem_settings, refresh=refresh):
+        print(printed, end="")  # Anything get_data said about this person
+        if all_data is None:
+            continue  # Jumping to the next person if no data is returned
+        print_data(full_name, all_data)
+        list_of_lines, no_of_words, AI_output = poem
+        print_poem(list_of_lines, no_of_words, poem_settings, AI_output)
+        print("\n")
+    stats = get_wiki_cache().stats()
+    if stats['hits'] + stats['misses']:  # Not when everyone came from a Wikipedia dump index
+        print(f"Wikipedia cache: {stats['hits'] + stats['renewed']} of {stats['hits'] + stats['misses']} people found without fetching their article\n")
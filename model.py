@@ -69,11 +69,13 @@ def attention_mask(nd, ns, *, dtype):
     return tf.cast(m, dtype)
 
 
-def attn(x, scope, n_state, *, past, hparams):
+def attn(x, scope, n_state, *, past, hparams, pad=None, cache=None, cache_length=None):
     assert x.shape.ndims == 3  # Should be [batch, sequence, features]
     assert n_state % hparams['n_head'] == 0
     if past is not None:
         assert past.shape.ndims == 5  # Should be [batch, 2, heads, sequence, features], where 2 is [k, v]
+    if cache is not None:
+        assert cache.shape.ndims == 5  # Should be [sequence, 2, batch, heads, features], see cache_shape
 
     def split_heads(x):
         # From [batch, sequence, features] to [batch, heads, sequence, features]
@@ -86,8 +88,18 @@ def attn(x, scope, n_state, *, past, hparams):
     def mask_attn_weights(w):
         # w has shape [batch, heads, dst_sequence, src_sequence], where information flows from src to dst.
         _, _, nd, ns = shape_list(w)
-        b = attention_mask(nd, ns, dtype=w.dtype)
-        b = tf.reshape(b, [1, 1, nd, ns])
+        if nd == 1:
+            # A single query is the last position and may attend to every key, so only padding can need masking
+            if pad is None:
+                return w
+            b = tf.ones([1, 1, 1, ns], dtype=w.dtype)
+        else:
+            b = attention_mask(nd, ns, dtype=w.dtype)
+            b = tf.reshape(b, [1, 1, nd, ns])
+        if pad is not None:
+            # pad has shape [batch], the number of left padding tokens in front of each row's prompt
+            keep = tf.range(ns)[None, :] >= pad[:, None]
+            b = b * tf.reshape(tf.cast(keep, w.dtype), [-1, 1, 1, ns])
         w = w*b - tf.cast(1e10, w.dtype)*(1-b)
         return w
 
@@ -109,6 +121,13 @@ def attn(x, scope, n_state, *, past, hparams):
             pk, pv = tf.unstack(past, axis=1)
             k = tf.concat([pk, k], axis=-2)
             v = tf.concat([pv, v], axis=-2)
+        if cache is not None:
+            # Writes the new keys and values into the preallocated cache at their positions,
+            # then attends over the filled prefix only. The cache is returned in place of present.
+            nd = shape_list(x)[1]
+            positions = cache_length + tf.range(nd)
+            present = tf.tensor_scatter_nd_update(cache, positions[:, None], tf.transpose(present, [3, 1, 0, 2, 4]))
+            k, v = tf.unstack(tf.transpose(present[:cache_length + nd], [1, 2, 3, 0, 4]), axis=0)
         a = multihead_attn(q, k, v)
         a = merge_heads(a)
         a = conv1d(a, 'c_proj', n_state)
@@ -123,10 +142,10 @@ def mlp(x, scope, n_state, *, hparams):
         return h2
 
 
-def block(x, scope, *, past, hparams):
+def block(x, scope, *, past, hparams, pad=None, cache=None, cache_length=None):
     with tf.variable_scope(scope):
         nx = x.shape[-1]
-        a, present = attn(norm(x, 'ln_1'), 'attn', nx, past=past, hparams=hparams)
+        a, present = attn(norm(x, 'ln_1'), 'attn', nx, past=past, hparams=hparams, pad=pad, cache=cache, cache_length=cache_length)
         x = x + a
         m = mlp(norm(x, 'ln_2'), 'mlp', nx*4, hparams=hparams)
         x = x + m
@@ -135,19 +154,35 @@ def block(x, scope, *, past, hparams):
 def past_shape(*, hparams, batch_size=None, sequence=None):
     return [batch_size, hparams['n_layer'], 2, hparams['n_head'], sequence, hparams['n_embd'] // hparams['n_head']]
 
+def cache_shape(*, hparams, batch_size=None, sequence=None):
+    # Shape of one layer of the preallocated key/value cache. Sequence comes first so each position is one contiguous slice.
+    if sequence is None:
+        sequence = hparams['n_ctx']
+    return [sequence, 2, batch_size, hparams['n_head'], hparams['n_embd'] // hparams['n_head']]
+
 def expand_tile(value, size):
     """Add a new axis of given size."""
     value = tf.convert_to_tensor(value, name='value')
     ndims = value.shape.ndims
     return tf.tile(tf.expand_dims(value, axis=0), [size] + [1]*ndims)
 
-def positions_for(tokens, past_length):
+def positions_for(tokens, past_length, pad=None):
     batch_size = tf.shape(tokens)[0]
     nsteps = tf.shape(tokens)[1]
-    return expand_tile(past_length + tf.range(nsteps), batch_size)
+    positions = expand_tile(past_length + tf.range(nsteps), batch_size)
+    if pad is not None:
+        # Left padded rows start counting from their first real token
+        positions = tf.maximum(positions - pad[:, None], 0)
+    return positions
 
 
-def model(hparams, X, past=None, scope='model', reuse=tf.AUTO_REUSE):
+def model(hparams, X, past=None, scope='model', reuse=tf.AUTO_REUSE, pad=None, cache=None, cache_length=None, last_logits_only=False):
+    """
+    Either past (grown by the caller) or cache (a list with one preallocated cache_shape tensor per layer,
+    of which the first cache_length positions are filled) can be given. With cache, results['cache'] holds
+    the updated caches instead of results['present'].
+    With last_logits_only, logits are only computed for the last position (shape [batch, 1, n_vocab]).
+    """
     with tf.variable_scope(scope, reuse=reuse):
         results = {}
         batch, sequence = shape_list(X)
@@ -156,20 +191,35 @@ def model(hparams, X, past=None, scope='model', reuse=tf.AUTO_REUSE):
                              initializer=tf.random_normal_initializer(stddev=0.01))
         wte = tf.get_variable('wte', [hparams['n_vocab'], hparams['n_embd']],
                              initializer=tf.random_normal_initializer(stddev=0.02))
-        past_length = 0 if past is None else tf.shape(past)[-2]
-        h = tf.gather(wte, X) + tf.gather(wpe, positions_for(X, past_length))
+        if cache is not None:
+            past_length = cache_length
+        else:
+            past_length = 0 if past is None else tf.shape(past)[-2]
+        h = tf.gather(wte, X) + tf.gather(wpe, positions_for(X, past_length, pad))
 
         # Transformer
         presents = []
-        pasts = tf.unstack(past, axis=1) if past is not None else [None] * hparams['n_layer']
+        if cache is not None:
+            pasts = cache
+        else:
+            pasts = tf.unstack(past, axis=1) if past is not None else [None] * hparams['n_layer']
         assert len(pasts) == hparams['n_layer']
         for layer, past in enumerate(pasts):
-            h, present = block(h, 'h%d' % layer, past=past, hparams=hparams)
+            if cache is None:
+                h, present = block(h, 'h%d' % layer, past=past, hparams=hparams, pad=pad)
+            else:
+                h, present = block(h, 'h%d' % layer, past=None, hparams=hparams, pad=pad, cache=past, cache_length=cache_length)
             presents.append(present)
-        results['present'] = tf.stack(presents, axis=1)
+        if cache is None:
+            results['present'] = tf.stack(presents, axis=1)
+        else:
+            results['cache'] = presents
         h = norm(h, 'ln_f')
 
         # Language model loss.  Do tokens <n predict token n?
+        if last_logits_only:
+            h = h[:, -1:]
+            sequence = 1
         h_flat = tf.reshape(h, [batch*sequence, hparams['n_embd']])
         logits = tf.matmul(h_flat, wte, transpose_b=True)
         logits = tf.reshape(logits, [batch, sequence, hparams['n_vocab']])
@@ -0,0 +1,45 @@
+# numpy backend of the Generator, runs np_model.py and np_sample.py so tensorflow is never imported
+# numpy uses all cpu cores for its matrix multiplications, the number of threads can be set with the
+# OMP_NUM_THREADS, OPENBLAS_NUM_THREADS or MKL_NUM_THREADS environment variables
+import os
+import numpy as np
+
+import checkpoint, np_model, np_sample, quantize, weight_store
+from generator import Generator, word_table
+
+
+class NumpyGenerator(Generator):
+    """
+    Loads the weights once and runs the model with numpy. A weight store made with weight_store.py is
+    memory mapped when there is one, otherwise the weights are read from the checkpoint (or quantize.py output).
+    :model_name=774M : String, which model to use
+    :weights=float32 : String, float32 (the checkpoint), int8 or bfloat16 (made with quantize.py or weight_store.py first)
+    :seed=None : Integer seed for the random sampling
+    """
+    def __init__(self, model_name='774M', weights='float32', seed=None):
+        super().__init__(model_name)
+        if os.path.exists(weight_store.store_path(model_name, weights)):
+            self.params = weight_store.open_store(weight_store.store_path(model_name, weights))
+        elif weights == 'float32':
+            self.params = checkpoint.read_checkpoint(checkpoint.latest_checkpoint(os.path.join('models', model_name)))
+        else:  # Quantized weights stay quantized in memory and are dequantized as they are used
+            with np.load(quantize.quantized_path(model_name, weights)) as f:
+                self.params = dict(f)
+        self.word_table = np.array(word_table(self.enc), dtype=bool)
+        self.rng = np.random.default_rng(seed)
+
+    def _sample(self, context, pad, max_words, length, temperature, top_k, top_p):
+        return np_sample.sample_sequence(
+            params=self.params, hparams=self.hparams, length=length,
+            context=context,
+            temperature=temperature, top_k=top_k, top_p=top_p,
+            pad=np.array(pad) if any(pad) else None,  # Prompts of equal length are not padded, which skips the attention mask
+            stop_token=self.stop_token, max_words=np.array(max_words), word_table=self.word_table,
+            rng=self.rng
+        )
+
+    def logits(self, tokens):
+        # Logits of every position of a list of token lists, same as TFGenerator.logits
+        tokens = np.asarray(tokens, dtype=np.int32)
+        cache = np.zeros(np_model.cache_shape(hparams=self.hparams, batch_size=tokens.shape[0], sequence=tokens.shape[1]), dtype=np.float32)
+        return np_model.model(self.params, self.hparams, tokens, cache, 0)
@@ -0,0 +1,136 @@
+# numpy version of model.py, runs the GPT-2 forward pass on the cpu without tensorflow
+# params is a dict of checkpoint tensor name -> numpy array (see checkpoint.read_checkpoint),
+# the large matrices can also be int8 or bfloat16 (see quantize.py)
+import numpy as np
+
+from quantize import matmul, gather
+
+
+def softmax(x, axis=-1):
+    x = x - np.max(x, axis=axis, keepdims=True)
+    ex = np.exp(x)
+    return ex / np.sum(ex, axis=axis, keepdims=True)
+
+def gelu(x):
+    return 0.5*x*(1+np.tanh(np.sqrt(2/np.pi)*(x+0.044715*np.power(x, 3))))
+
+def norm(x, params, scope, *, axis=-1, epsilon=1e-5):
+    """Normalize to mean = 0, std = 1, then do a diagonal affine transform."""
+    u = np.mean(x, axis=axis, keepdims=True)
+    s = np.mean(np.square(x-u), axis=axis, keepdims=True)
+    x = (x - u) / np.sqrt(s + epsilon)
+    return x*params[scope + '/g'] + params[scope + '/b']
+
+def split_states(x, n):
+    """Reshape the last dimension of x into [n, x.shape[-1]/n]."""
+    *start, m = x.shape
+    return np.reshape(x, start + [n, m//n])
+
+def merge_states(x):
+    """Smash the last two dimensions of x into a single dimension."""
+    *start, a, b = x.shape
+    return np.reshape(x, start + [a*b])
+
+def conv1d(x, params, scope):
+    return matmul(x, params, scope + '/w') + params[scope + '/b']
+
+def attention_mask(nd, ns, *, dtype):
+    """1's in the lower triangle, counting from the lower right corner."""
+    i = np.arange(nd)[:,None]
+    j = np.arange(ns)
+    return (i >= j - ns + nd).astype(dtype)
+
+
+def attn(x, params, scope, n_state, *, hparams, cache, cache_length, pad=None):
+    # cache has shape [2, batch, heads, sequence, features], where 2 is [k, v], and is written in place
+    assert x.ndim == 3  # Should be [batch, sequence, features]
+    assert n_state % hparams['n_head'] == 0
+
+    def split_heads(x):
+        # From [batch, sequence, features] to [batch, heads, sequence, features]
+        return np.transpose(split_states(x, hparams['n_head']), [0, 2, 1, 3])
+
+    def merge_heads(x):
+        # Reverse of split_heads
+        return merge_states(np.transpose(x, [0, 2, 1, 3]))
+
+    def mask_attn_weights(w):
+        # w has shape [batch, heads, dst_sequence, src_sequence], where information flows from src to dst.
+        _, _, nd, ns = w.shape
+        if nd == 1:
+            # A single query is the last position and may attend to every key, so only padding can need masking
+            if pad is None:
+                return w
+            b = np.ones([1, 1, 1, ns], dtype=w.dtype)
+        else:
+            b = attention_mask(nd, ns, dtype=w.dtype)
+            b = np.reshape(b, [1, 1, nd, ns])
+        if pad is not None:
+            # pad has shape [batch], the number of left padding tokens in front of each row's prompt
+            keep = np.arange(ns)[None, :] >= pad[:, None]
+            b = b * np.reshape(keep.astype(w.dtype), [-1, 1, 1, ns])
+        return w*b - w.dtype.type(1e10)*(1-b)
+
+    def multihead_attn(q, k, v):
+        # q, k, v have shape [batch, heads, sequence, features]
+        w = np.matmul(q, np.swapaxes(k, -1, -2))
+        w = w / np.sqrt(v.shape[-1]).astype(w.dtype)
+
+        w = mask_attn_weights(w)
+        w = softmax(w)
+        return np.matmul(w, v)
+
+    c = conv1d(x, params, scope + '/c_attn')
+    q, k, v = map(split_heads, np.split(c, 3, axis=2))
+    nd = x.shape[1]
+    # Writes the new keys and values at their positions, then attends over the filled prefix only (a view, not a copy)
+    cache[0, :, :, cache_length:cache_length + nd] = k
+    cache[1, :, :, cache_length:cache_length + nd] = v
+    a = multihead_attn(q, cache[0, :, :, :cache_length + nd], cache[1, :, :, :cache_length + nd])
+    a = merge_heads(a)
+    return conv1d(a, params, scope + '/c_proj')
+
+
+def mlp(x, params, scope):
+    h = gelu(conv1d(x, params, scope + '/c_fc'))
+    return conv1d(h, params, scope + '/c_proj')
+
+
+def block(x, params, scope, *, hparams, cache, cache_length, pad=None):
+    nx = x.shape[-1]
+    a = attn(norm(x, params, scope + '/ln_1'), params, scope + '/attn', nx, hparams=hparams, cache=cache, cache_length=cache_length, pad=pad)
+    x = x + a
+    m = mlp(norm(x, params, scope + '/ln_2'), params, scope + '/mlp')
+    return x + m
+
+def cache_shape(*, hparams, batch_size, sequence=None):
+    # Shape of the preallocated key/value cache of all layers
+    if sequence is None:
+        sequence = hparams['n_ctx']
+    return [hparams['n_layer'], 2, batch_size, hparams['n_head'], sequence, hparams['n_embd'] // hparams['n_head']]
+
+def positions_for(tokens, past_length, pad=None):
+    batch_size, nsteps = tokens.shape
+    positions = np.tile(past_length + np.arange(nsteps), [batch_size, 1])
+    if pad is not None:
+        # Left padded rows start counting from their first real token
+        positions = np.maximum(positions - pad[:, None], 0)
+    return positions
+
+
+def model(params, hparams, X, cache, cache_length, scope='model', pad=None, last_logits_only=False):
+    """
+    Runs tokens X ([batch, sequence]) through the model, writing their keys and values into cache
+    (a cache_shape array of which the first cache_length positions are filled) and returning the logits.
+    With last_logits_only, logits are only computed for the last position (shape [batch, 1, n_vocab]).
+    """
+    h = gather(params, scope + '/wte', X) + gather(params, scope + '/wpe', positions_for(X, cache_length, pad))
+
+    # Transformer
+    for layer in range(hparams['n_layer']):
+        h = block(h, params, scope + '/h%d' % layer, hparams=hparams, cache=cache[layer], cache_length=cache_length, pad=pad)
+    h = norm(h, params, scope + '/ln_f')
+
+    if last_logits_only:
+        h = h[:, -1:]
+    return matmul(h, params, scope + '/wte', transpose=True)
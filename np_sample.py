@@ -0,0 +1,131 @@
+# numpy version of sample.py, same sampling settings and stopping rules as the tensorflow sampling loop
+import numpy as np
+
+import np_model
+
+
+def top_k_logits(logits, k):
+    if k == 0:
+        # no truncation
+        return logits
+    min_values = np.partition(logits, -k, axis=-1)[:, -k, np.newaxis]
+    return np.where(logits < min_values, logits.dtype.type(-1e10), logits)
+
+
+def top_p_logits(logits, p):
+    logits_sort = -np.sort(-logits, axis=-1)  # descending
+    probs_sort = np_model.softmax(logits_sort)
+    probs_sums = np.cumsum(probs_sort, axis=1) - probs_sort  # exclusive cumulative sum
+    logits_masked = np.where(probs_sums < p, logits_sort, logits.dtype.type(1000))  # [batchsize, vocab]
+    min_logits = np.min(logits_masked, axis=1, keepdims=True)  # [batchsize, 1]
+    return np.where(logits < min_logits, logits.dtype.type(-1e10), logits)
+
+
+def top_k_top_p_logits(logits, k, p):
+    # Same as sample.top_k_top_p_logits, only the k largest logits of each row are sorted
+    indices = np.argpartition(-logits, k - 1, axis=-1)[:, :k]
+    values = np.take_along_axis(logits, indices, axis=-1)
+    order = np.argsort(-values, axis=-1, kind='stable')
+    values = np.take_along_axis(values, order, axis=-1)
+    indices = np.take_along_axis(indices, order, axis=-1)
+    if p > 0.0:
+        probs = np_model.softmax(values)
+        probs_sums = np.cumsum(probs, axis=1) - probs  # exclusive cumulative sum
+        values = np.where(probs_sums < p, values, logits.dtype.type(-1e10))
+    return values, indices
+
+
+def filter_logits(logits, temperature, top_k, top_p):
+    # Same as sample.filter_logits, with both top_k and top_p set nucleus sampling is applied within the top_k tokens
+    logits = logits / np.float32(temperature)
+    if top_k > 0 and top_p > 0.0:
+        values, _ = top_k_top_p_logits(logits, k=top_k, p=top_p)
+        min_logits = np.min(np.where(values > -1e10, values, logits.dtype.type(1000)), axis=1, keepdims=True)
+        return np.where(logits < min_logits, logits.dtype.type(-1e10), logits)
+    if top_p > 0.0:
+        return top_p_logits(logits, p=top_p)
+    return top_k_logits(logits, k=top_k)
+
+
+def sample_filtered(logits, temperature, top_k, top_p, rng):
+    # Same as sample.sample_filtered, with top_k set it only draws from the top_k candidates
+    if top_k == 0:
+        return multinomial(filter_logits(logits, temperature, top_k, top_p), rng)
+    values, indices = top_k_top_p_logits(logits / np.float32(temperature), k=top_k, p=top_p)
+    return np.take_along_axis(indices, multinomial(values, rng)[:, np.newaxis], axis=-1)[:, 0].astype(np.int32)
+
+
+def multinomial(logits, rng):
+    # Draws one token per row from the softmax of logits
+    probs = np.exp(logits - np.max(logits, axis=-1, keepdims=True))
+    cdf = np.cumsum(probs, axis=-1)
+    u = rng.random(len(logits))[:, np.newaxis] * cdf[:, -1:]
+    return np.minimum(np.sum(cdf < u, axis=-1), logits.shape[-1] - 1).astype(np.int32)
+
+
+def sample_sequence(*, params, hparams, length, context, temperature=1, top_k=0, top_p=0.0, pad=None,
+                    stop_token=None, max_words=None, word_table=None, rng=None):
+    """
+    Same as sample.sample_sequence, returns an array of shape [batch, context length + generated length].
+    :context : Integer array of shape [batch, sequence]
+    :pad=None : Integer array of shape [batch], number of left padding tokens in front of each row
+    :stop_token=None : Token id that finishes a row, finished rows are dropped from the batch
+    :max_words=None : Integer array of shape [batch], a row also finishes once it has generated this many words (at the start of the next one)
+    :word_table=None : Boolean array of shape [n_vocab, 3], see generator.word_table
+    :rng=None : numpy Generator used for sampling
+    """
+    if max_words is not None:
+        assert stop_token is not None and word_table is not None, 'max_words needs both stop_token and word_table!'
+    if rng is None:
+        rng = np.random.default_rng()
+    context = np.asarray(context, dtype=np.int32)
+    batch, context_length = context.shape
+    # The key/value cache is allocated once for the whole sequence and written in place by position
+    cache_size = min(hparams['n_ctx'], context_length + length)
+    cache = np.zeros(np_model.cache_shape(hparams=hparams, batch_size=batch, sequence=cache_size), dtype=np.float32)
+
+    def choose(logits):
+        # Samples the next token of each row from its logits
+        return sample_filtered(logits[:, -1, :hparams['n_vocab']], temperature, top_k, top_p, rng)
+
+    # These only hold the rows that are still being generated, rows maps them back to their place in output
+    rows = np.arange(batch)
+    row_pad = pad
+    words = np.zeros([batch], dtype=np.int32)
+    ended_space = np.ones([batch], dtype=bool)  # The start of the generated text counts as whitespace
+    output = [context]
+
+    # Prefill: the whole context goes through the model in one pass, filling the cache and giving the first token
+    samples = choose(np_model.model(params, hparams, context, cache, 0, pad=row_pad, last_logits_only=True))
+    cache_length = context_length
+    for step in range(length):
+        if stop_token is None:
+            output.append(samples[:, np.newaxis])
+        else:
+            if max_words is not None:
+                flags = word_table[samples]
+                # A word starts at a token with text that follows whitespace, either its own or the end of the previous token
+                words = words + (flags[:, 0] & (flags[:, 1] | ended_space))
+                ended_space = flags[:, 2]
+                # The token that starts the first word past the budget is replaced by stop_token, so the last word is always whole
+                samples = np.where(words > max_words[rows], stop_token, samples)
+            # Rows that have already finished get stop_token
+            column = np.full([batch, 1], stop_token, dtype=np.int32)
+            column[rows, 0] = samples
+            output.append(column)
+            finished = samples == stop_token
+            if finished.any():  # The cache is only gathered on the steps where a row finishes
+                keep = ~finished
+                cache = cache[:, :, keep]
+                samples, rows, words, ended_space = samples[keep], rows[keep], words[keep], ended_space[keep]
+                if row_pad is not None:
+                    row_pad = row_pad[keep]
+            if len(rows) == 0:
+                break
+        if step == length - 1:
+            break
+        # Decode: one token per step for the rows that are still being generated
+        samples = choose(np_model.model(params, hparams, samples[:, np.newaxis], cache, cache_length, pad=row_pad, last_logits_only=True))
+        cache_length += 1
+
+    return np.concatenate(output, axis=1)
@@ -0,0 +1,93 @@
+# Makes the poems of a list of names as a pipeline: worker threads fetch the Wikipedia data and rhymes of the next names
+# while the AI fills the poems of the current ones, so the total time gets close to the longer of the two instead of their sum
+# The results still come out in the order of the names
+import contextvars
+import io
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from functions import TIMEOUT_MESSAGE, compose_poem, fill_poems, get_data, poem_data
+
+
+class ThreadOutput(io.TextIOBase):
+    # Stands in for sys.stdout, threads that set buffer print into it instead so their output can be shown in order
+    # (a context variable rather than thread local, so it carries over to what they run with http_client.run)
+    def __init__(self, stdout):
+        self.stdout = stdout
+        self.buffer = contextvars.ContextVar('buffer', default=None)
+
+    def write(self, text):
+        buffer = self.buffer.get()
+        return (self.stdout if buffer is None else buffer).write(text)
+
+    def flush(self):
+        self.stdout.flush()
+
+
+def prepare(full_name, poem_settings, refresh, output):
+    # Fetching stage for one name, returns its data, its composed poem, what get_data printed on the way and the seconds each step took
+    # A name that fails (e.g. a network error) is reported in what was printed, so it does not stop the names after it
+    buffer = io.StringIO()
+    output.buffer.set(buffer)
+    timings = {}
+    all_data = poem = None
+    try:
+        start = time.perf_counter()
+        all_data = get_data(full_name, refresh)
+        timings['data'] = time.perf_counter() - start
+        if all_data is not None:
+            start = time.perf_counter()
+            poem = compose_poem(poem_data(full_name, all_data), poem_settings)
+            timings['compose'] = time.perf_counter() - start
+    except TimeoutError:  # Only this name is given up on
+        print(f"{TIMEOUT_MESSAGE} (could not make a poem for {full_name})\n")
+        all_data = poem = None
+    except Exception as e:
+        print(f"Could not make a poem for {full_name} ({type(e).__name__}: {e})")
+        all_data = poem = None
+    finally:
+        printed = buffer.getvalue()
+        output.buffer.set(None)
+    return full_name, all_data, poem, printed, timings
+
+
+def run_pipeline(full_names, poem_settings, workers=4, queue_size=16, batch_size=8, refresh=False):
+    """
+    Yields (full_name, all_data, printed, poem, timings) for every name, in order. poem holds the arguments for print_poem,
+    printed what get_data printed about the name (all_data and poem are None when no data could be found) and timings the
+    seconds spent on its data, composing its poem and the AI fill (the whole batched decode it was part of).
+    full_names can be any iterable, it is only read queue_size names ahead so a long file is never held in memory
+    :workers=4 : Number of names fetched at the same time
+    :queue_size=16 : Most names fetched ahead of the poem being generated
+    :batch_size=8 : Most poems whose AI fills run together, made of the next names whose data is already there
+    :refresh=False : Fetches every Wikipedia article again instead of using the cache
+    """
+    names = iter(full_names)
+    pending = deque()  # Futures of the names being fetched, in order
+    output = ThreadOutput(sys.stdout)
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            def fill_queue():
+                for full_name in islice(names, queue_size - len(pending)):
+                    pending.append(pool.submit(prepare, full_name, poem_settings, refresh, output))
+
+            fill_queue()
+            while pending:
+                batch = [pending.popleft().result()]  # Waits for the next name, so the order never changes
+                while pending and len(batch) < batch_size and pending[0].done():
+                    batch.append(pending.popleft().result())
+                fill_queue()  # The workers keep fetching while the AI runs
+                found = [item for item in batch if item[2] is not None]
+                start = time.perf_counter()
+                filled = iter(fill_poems([item[2] for item in found], poem_settings, batch_size))
+                fill_time = time.perf_counter() - start
+                for full_name, all_data, poem, printed, timings in batch:
+                    if poem is not None:
+                        timings['fill'] = fill_time
+                    yield full_name, all_data, printed, None if poem is None else next(filled), timings
+    finally:
+        sys.stdout = output.stdout
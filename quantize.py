@@ -0,0 +1,123 @@
+# Converts the weights of a downloaded model to int8 or bfloat16 to use less memory, e.g: quantize.py 774M int8
+# Only the large matrices are converted (the conv1d weights, wte and wpe), everything else stays float32.
+# int8 weights get one float32 scale per output channel, stored next to the weight as <name>/scale.
+# numpy has no bfloat16 type, so bfloat16 weights are stored as the top 16 bits of the float32 in a uint16 array.
+import os
+import sys
+import numpy as np
+
+QUANTIZED_SUFFIXES = ('/c_attn/w', '/c_proj/w', '/c_fc/w', '/wte', '/wpe')
+TILE_SIZE = 2**16  # Most int8 weights matmul converts to float32 at a time, 256KB of them (fits in the L2 cache)
+
+
+def should_quantize(name):
+    return name.endswith(QUANTIZED_SUFFIXES)
+
+
+def quantize_int8(w, axis):
+    # Symmetric per channel quantization, axis is the axis of the output channels
+    reduce_axes = tuple(i for i in range(w.ndim) if i != axis % w.ndim)
+    scale = np.max(np.abs(w), axis=reduce_axes) / 127
+    scale[scale == 0] = 1  # Channels that are all zero
+    shape = [1] * w.ndim
+    shape[axis] = -1
+    q = np.clip(np.round(w / scale.reshape(shape)), -127, 127).astype(np.int8)
+    return q, scale.astype(np.float32)
+
+
+def to_bfloat16(w):
+    # Rounds to the nearest bfloat16 (ties to even) and returns its bits
+    bits = np.ascontiguousarray(w, dtype=np.float32).view(np.uint32)
+    bits = bits + np.uint32(0x7fff) + ((bits >> 16) & 1)
+    return (bits >> 16).astype(np.uint16)
+
+
+def from_bfloat16(bits):
+    return (bits.astype(np.uint32) << 16).view(np.float32)
+
+
+def quantize_params(params, mode):
+    """
+    Returns a copy of params with the large matrices converted.
+    :params : Dict of tensor name -> float32 numpy array, see checkpoint.read_checkpoint
+    :mode : String, int8 or bfloat16
+    """
+    quantized = {}
+    for name, w in params.items():
+        if not should_quantize(name):
+            quantized[name] = w
+        elif mode == 'int8':
+            # wte and wpe are used row by row (embedding lookups and the logits), the conv1d weights column by column
+            quantized[name], quantized[name + '/scale'] = quantize_int8(w, axis=0 if name.endswith(('/wte', '/wpe')) else -1)
+        elif mode == 'bfloat16':
+            quantized[name] = to_bfloat16(w)
+        else:
+            raise ValueError(f"Unknown quantization mode {mode}, must be either int8 or bfloat16")
+    return quantized
+
+
+def dequantize(params, name):
+    # Returns the float32 value of a weight, whatever format it is stored in
+    w = params[name]
+    if w.dtype == np.int8:
+        scale = params[name + '/scale']
+        shape = [1] * w.ndim
+        shape[0 if name.endswith(('/wte', '/wpe')) else -1] = -1
+        return w * scale.reshape(shape)
+    if w.dtype == np.uint16:
+        return from_bfloat16(w)
+    return w
+
+
+def matmul(x, params, name, transpose=False, tile_size=TILE_SIZE):
+    """
+    x times the 2d matrix stored under name (transposed if transpose), dequantizing on the fly.
+    An int8 or bfloat16 matrix is converted tile_size weights (a block of output channels) at a time, each tile used while
+    it is still in the cache, so there is never a float32 copy of the whole matrix. The per channel scales of int8 are
+    applied to the (much smaller) result instead of the matrix.
+    """
+    w = params[name]
+    w = w.reshape(w.shape[-2:])
+    if w.dtype == np.float32:
+        return np.matmul(x, w.T if transpose else w)
+    convert = from_bfloat16 if w.dtype == np.uint16 else lambda tile: tile.astype(np.float32)
+    rows = w.shape[1] if transpose else w.shape[0]  # Weights in one output channel
+    channels = w.shape[0] if transpose else w.shape[1]
+    step = max(tile_size // rows, 1)
+    out = np.empty(x.shape[:-1] + (channels,), dtype=np.float32)
+    for start in range(0, channels, step):
+        tile = convert(w[start:start + step]).T if transpose else convert(w[:, start:start + step])
+        out[..., start:start + step] = np.matmul(x, tile)
+    if w.dtype == np.int8:
+        out *= params[name + '/scale']
+    return out
+
+
+def gather(params, name, indices):
+    # Rows of the matrix stored under name, only the rows that are used get dequantized
+    w = params[name]
+    if w.dtype == np.int8:
+        return w[indices] * params[name + '/scale'][indices][..., np.newaxis]
+    if w.dtype == np.uint16:
+        return from_bfloat16(w[indices])
+    return w[indices]
+
+
+def quantized_path(model_name, mode):
+    return os.path.join('models', model_name, f'model.{mode}.npz')
+
+
+if __name__ == '__main__':
+    import checkpoint
+
+    if len(sys.argv) != 3 or sys.argv[2] not in ('int8', 'bfloat16'):
+        print('You must enter the model name and either int8 or bfloat16 as parameters, e.g.: quantize.py 774M int8')
+        sys.exit(1)
+
+    model_name, mode = sys.argv[1], sys.argv[2]
+    params = checkpoint.read_checkpoint(checkpoint.latest_checkpoint(os.path.join('models', model_name)))
+    quantized = quantize_params(params, mode)
+    np.savez(quantized_path(model_name, mode), **quantized)
+    before = sum(w.nbytes for w in params.values())
+    after = sum(w.nbytes for w in quantized.values())
+    print(f"Saved {quantized_path(model_name, mode)} ({before / 2**20:.0f}MB -> {after / 2**20:.0f}MB)")
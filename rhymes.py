@@ -0,0 +1,108 @@
+# Offline rhymes from the CMU pronouncing dictionary, answering the same rel_rhy queries as the Datamuse API
+# Download the dictionary once with: rhymes.py download, and look up rhymes with e.g: rhymes.py person
+import os
+import sys
+from functools import cached_property, lru_cache
+
+DICTIONARY_PATH = os.path.join('data', 'cmudict.dict')
+DICTIONARY_URL = 'https://raw.githubusercontent.com/cmusphinx/cmudict/master/cmudict.dict'
+
+
+def rhyme_part(phonemes):
+    # The phonemes from the last stressed vowel (primary or secondary stress, so universe rhymes with verse) to the end,
+    # two words rhyme when these are the same. Vowels end with their stress (0 none, 1 primary, 2 secondary), which is left out
+    vowels = [i for i, phoneme in enumerate(phonemes) if phoneme[-1].isdigit()]
+    stressed = [i for i in vowels if phonemes[i][-1] in '12']
+    start = (stressed or vowels or [0])[-1]
+    return tuple(phoneme.rstrip('012') for phoneme in phonemes[start:])
+
+
+class RhymeIndex:
+    """
+    Every word of a pronouncing dictionary grouped by the part of it that rhymes, with its number of syllables.
+    words(rel_rhy=word) returns the same kind of list as datamuse.Datamuse().words(rel_rhy=word), so either can be used.
+    Words that are not in the dictionary rhyme like the dictionary word with the longest matching ending.
+    :path : String, dictionary in the cmudict format (word, then its phonemes, one pronunciation per line)
+    """
+    def __init__(self, path=DICTIONARY_PATH):
+        self.pronunciations = {}  # word -> list of rhyme parts, one per pronunciation
+        self.syllables = {}
+        self.rhymes = {}  # rhyme part -> words, shortest first as a rough stand in for how common they are
+        with open(path, encoding='latin-1') as f:
+            for line in f:
+                line = line.split('#')[0].strip()  # cmudict.dict puts comments after a #, cmudict-0.7b starts them with ;;;
+                if not line or line.startswith(';;;'):
+                    continue
+                word, *phonemes = line.split()
+                word = word.lower().split('(')[0]  # Alternative pronunciations are written as word(2)
+                if not phonemes or not word.isalpha():
+                    continue
+                part = rhyme_part(phonemes)
+                if word not in self.syllables:
+                    self.syllables[word] = sum(phoneme[-1].isdigit() for phoneme in phonemes)
+                    self.pronunciations[word] = []
+                if part not in self.pronunciations[word]:
+                    self.pronunciations[word].append(part)
+                    self.rhymes.setdefault(part, []).append(word)
+        for words in self.rhymes.values():
+            words.sort(key=lambda word: (len(word), word))
+
+    @cached_property
+    def endings(self):
+        # Ending of up to 5 letters -> the shortest word with that ending, only built the first time an unknown word is looked up
+        endings = {}
+        for word in sorted(self.pronunciations, key=lambda word: (len(word), word)):
+            for length in range(2, min(len(word), 5) + 1):
+                endings.setdefault(word[-length:], word)
+        return endings
+
+    def rhyme_parts(self, word):
+        word = word.lower()
+        if word in self.pronunciations:
+            return self.pronunciations[word]
+        for length in range(min(len(word), 5), 1, -1):
+            if word[-length:] in self.endings:
+                return self.pronunciations[self.endings[word[-length:]]]
+        return []
+
+    def words(self, rel_rhy, max=100):
+        # Same results format as the Datamuse API: dicts of word, score (higher first) and numSyllables
+        rel_rhy = str(rel_rhy).lower()
+        found = {}  # Kept in insertion order
+        for part in self.rhyme_parts(rel_rhy):
+            for word in self.rhymes[part]:
+                if len(found) >= max:
+                    break
+                if word != rel_rhy:
+                    found[word] = None
+        return [{'word': word, 'score': len(found) - i, 'numSyllables': self.syllables[word]} for i, word in enumerate(found)]
+
+
+@lru_cache()
+def get_rhyme_index(path=DICTIONARY_PATH):
+    # One index per process, building it reads the whole dictionary
+    return RhymeIndex(path)
+
+
+def download_dictionary(path=DICTIONARY_PATH):
+    import requests
+
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    r = requests.get(DICTIONARY_URL)
+    r.raise_for_status()
+    with open(path + '.tmp', 'wb') as f:
+        f.write(r.content)
+    os.replace(path + '.tmp', path)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print('You must enter either download or a word to rhyme with as a parameter, e.g.: rhymes.py person')
+        sys.exit(1)
+
+    if sys.argv[1] == 'download':
+        download_dictionary()
+        print(f"Saved {DICTIONARY_PATH}")
+    else:
+        print(' '.join(result['word'] for result in get_rhyme_index().words(rel_rhy=sys.argv[1])))
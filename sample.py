@@ -12,18 +12,12 @@ def top_k_logits(logits, k):
         # no truncation
         return logits
 
-    def _top_k():
-        values, _ = tf.nn.top_k(logits, k=k)
-        min_values = values[:, -1, tf.newaxis]
-        return tf.where(
-            logits < min_values,
-            tf.ones_like(logits, dtype=logits.dtype) * -1e10,
-            logits,
-        )
-    return tf.cond(
-       tf.equal(k, 0),
-       lambda: logits,
-       lambda: _top_k(),
+    values, _ = tf.nn.top_k(logits, k=k)
+    min_values = values[:, -1, tf.newaxis]
+    return tf.where(
+        logits < min_values,
+        tf.ones_like(logits, dtype=logits.dtype) * -1e10,
+        logits,
     )
 
 
@@ -41,61 +35,312 @@ def top_p_logits(logits, p):
         )
 
 
-def sample_sequence(*, hparams, length, start_token=None, batch_size=None, context=None, temperature=1, top_k=0, top_p=0.0):
+def top_k_top_p_logits(logits, k, p):
+    """
+    Takes the k largest logits of each row, then applies nucleus sampling to those k only, so no step has to
+    sort the whole vocabulary. Returns the candidate logits (shape [batch, k], largest first, with the ones
+    outside the nucleus set to -1e10) and their token ids.
+    """
+    with tf.variable_scope('top_k_top_p_logits'):
+        values, indices = tf.nn.top_k(logits, k=k)  # sorted, largest first
+        if p > 0.0:
+            probs_sums = tf.cumsum(tf.nn.softmax(values), axis=1, exclusive=True)
+            values = tf.where(probs_sums < p, values, tf.ones_like(values) * -1e10)
+        return values, indices
+
+
+def filter_logits(logits, temperature, top_k, top_p):
+    """
+    Applies the temperature, top_k and top_p to logits of shape [batch, vocab]. With both top_k and top_p
+    set, nucleus sampling is applied within the top_k tokens.
+    """
+    logits = logits / tf.to_float(temperature)
+    if top_k > 0 and top_p > 0.0:
+        values, _ = top_k_top_p_logits(logits, k=top_k, p=top_p)
+        min_logits = tf.reduce_min(tf.where(values > -1e10, values, tf.ones_like(values) * 1000), axis=1, keepdims=True)
+        return tf.where(logits < min_logits, tf.ones_like(logits) * -1e10, logits)
+    if top_p > 0.0:
+        return top_p_logits(logits, p=top_p)
+    return top_k_logits(logits, k=top_k)
+
+
+def sample_logits(logits):
+    # Draws one token per row
+    return tf.squeeze(tf.multinomial(logits, num_samples=1, output_dtype=tf.int32), axis=[1])
+
+
+def sample_filtered(logits, temperature, top_k, top_p):
+    # Same as sample_logits(filter_logits(...)), but with top_k set it only draws from the top_k candidates
+    if top_k == 0:
+        return sample_logits(filter_logits(logits, temperature, top_k, top_p))
+    values, indices = top_k_top_p_logits(logits / tf.to_float(temperature), k=top_k, p=top_p)
+    return tf.gather(indices, sample_logits(values)[:, tf.newaxis], batch_dims=1)[:, 0]
+
+
+def step(hparams, tokens, cache, cache_length, pad, *, scope='model', last_logits_only=True):
+    # Runs tokens through the model, returning the logits and the updated cache
+    lm_output = model.model(hparams=hparams, X=tokens, scope=scope, reuse=tf.AUTO_REUSE, pad=pad, cache=cache, cache_length=cache_length, last_logits_only=last_logits_only)
+
+    logits = lm_output['logits'][:, :, :hparams['n_vocab']]
+    cache = lm_output['cache']
+    for layer_cache in cache:
+        layer_cache.set_shape(model.cache_shape(hparams=hparams, batch_size=None, sequence=None))
+    return logits, cache
+
+
+def new_cache(hparams, batch, sequence):
+    # The key/value cache is allocated once for the whole sequence and written in place by position,
+    # instead of concatenating every new step onto the cache which copies all of it each token
+    return [
+        tf.zeros(model.cache_shape(hparams=hparams, batch_size=batch, sequence=sequence))
+        for _ in range(hparams['n_layer'])
+    ]
+
+
+# The loops below only keep the rows that are still being generated, rows maps them back to their place in
+# output which always holds the full batch. words and ended_space count the words generated by each row.
+def record_tokens(chunk, output, rows, words, ended_space, *, stop_token, max_words, word_table):
+    """
+    Adds chunk (tokens of shape [rows, n] generated by the rows still running) to output.
+    Returns the new output, which rows have finished, words and ended_space.
+    Tokens after the point where a row finished, and the tokens of rows that finished before, are stop_token.
+    """
+    if stop_token is None:
+        return tf.concat([output, chunk], axis=1), tf.zeros_like(rows, dtype=tf.bool), words, ended_space
+
+    if max_words is not None:
+        flags = tf.gather(word_table, chunk)
+        # A word starts at a token with text that follows whitespace, either its own or the end of the previous token
+        prev_ended_space = tf.concat([ended_space[:, tf.newaxis], flags[:, :-1, 2]], axis=1)
+        starts_word = tf.logical_and(flags[:, :, 0], tf.logical_or(flags[:, :, 1], prev_ended_space))
+        chunk_words = words[:, tf.newaxis] + tf.cumsum(tf.cast(starts_word, tf.int32), axis=1)
+        # The token that starts the first word past the budget is replaced by stop_token, so the last word is always whole
+        over_budget = chunk_words > tf.gather(max_words, rows)[:, tf.newaxis]
+        chunk = tf.where(over_budget, tf.fill(tf.shape(chunk), stop_token), chunk)
+        words = chunk_words[:, -1]
+        ended_space = flags[:, -1, 2]
+
+    stop_here = tf.equal(chunk, stop_token)
+    stops = tf.cumsum(tf.cast(stop_here, tf.int32), axis=1)
+    finished = stops[:, -1] > 0
+    stop_tokens = tf.fill(tf.shape(chunk), stop_token)
+    chunk = tf.where(stops - tf.cast(stop_here, tf.int32) > 0, stop_tokens, chunk)
+    block = tf.tensor_scatter_nd_update(tf.fill([tf.shape(output)[0], tf.shape(chunk)[1]], stop_token), rows[:, tf.newaxis], chunk)
+    return tf.concat([output, block], axis=1), finished, words, ended_space
+
+
+def drop_rows(finished, cache, row_state):
+    """
+    Removes the finished rows from cache (a list of cache_shape tensors) and row_state (a list of tensors with
+    the rows as their first dimension). The cache is only gathered on the steps where a row finishes.
+    """
+    keep = tf.where(tf.logical_not(finished))[:, 0]
+
+    def drop_finished():
+        return [[tf.gather(layer_cache, keep, axis=2) for layer_cache in cache], [tf.gather(value, keep) for value in row_state]]
+
+    def keep_all():
+        return [cache, row_state]
+
+    return tf.cond(tf.reduce_any(finished), drop_finished, keep_all)
+
+
+def row_state_shapes(batch_size):
+    # Shape invariants of output, rows, row_pad, words and ended_space
+    return [
+        tf.TensorShape([batch_size, None]),
+        tf.TensorShape([None]),
+        tf.TensorShape([None]),
+        tf.TensorShape([None]),
+        tf.TensorShape([None]),
+    ]
+
+
+def sample_sequence(*, hparams, length, start_token=None, batch_size=None, context=None, temperature=1, top_k=0, top_p=0.0, pad=None,
+                    stop_token=None, max_words=None, word_table=None):
+    """
+    :stop_token=None : Token id (e.g. <|endoftext|>) that finishes a row. Finished rows are dropped from the
+     batch so they stop using compute, the rest of their output is filled with stop_token and the loop ends
+     early once every row has finished.
+    :max_words=None : Tensor of shape [batch], a row also finishes once it has generated this many words (at the start of the next one).
+     Needs stop_token and word_table.
+    :word_table=None : Boolean tensor of shape [n_vocab, 3] holding, for each token, whether it contains
+     any non whitespace text, starts with whitespace and ends with whitespace. Used to count words like str.split.
+    """
     if start_token is None:
         assert context is not None, 'Specify exactly one of start_token and context!'
     else:
         assert context is None, 'Specify exactly one of start_token and context!'
         context = tf.fill([batch_size, 1], start_token)
+    if max_words is not None:
+        assert stop_token is not None and word_table is not None, 'max_words needs both stop_token and word_table!'
+    stopping = dict(stop_token=stop_token, max_words=max_words, word_table=word_table)
 
-    def step(hparams, tokens, past=None):
-        lm_output = model.model(hparams=hparams, X=tokens, past=past, reuse=tf.AUTO_REUSE)
+    with tf.name_scope('sample_sequence'):
+        batch = tf.shape(context)[0]
+        cache = new_cache(hparams, batch, tf.minimum(hparams['n_ctx'], tf.shape(context)[1] + length))
+        has_pad = pad is not None  # Without padding the decode steps can skip the attention mask entirely
+        if pad is None:
+            pad = tf.zeros([batch], dtype=tf.int32)
 
-        logits = lm_output['logits'][:, :, :hparams['n_vocab']]
-        presents = lm_output['present']
-        presents.set_shape(model.past_shape(hparams=hparams, batch_size=batch_size))
-        return {
-            'logits': logits,
-            'presents': presents,
-        }
+        # Prefill: the whole context goes through the model in one pass, filling the cache and giving the first token
+        logits, cache = step(hparams, context, cache, 0, pad if has_pad else None)
+        samples = sample_filtered(logits[:, -1], temperature, top_k, top_p)
+        rows = tf.range(batch)
+        words = tf.zeros([batch], dtype=tf.int32)
+        ended_space = tf.ones([batch], dtype=tf.bool)  # The start of the generated text counts as whitespace
+        output, finished, words, ended_space = record_tokens(samples[:, tf.newaxis], context, rows, words, ended_space, **stopping)
+        if stop_token is not None:
+            cache, (samples, rows, pad, words, ended_space) = drop_rows(finished, cache, [samples, rows, pad, words, ended_space])
 
-    with tf.name_scope('sample_sequence'):
-        # Don't feed the last context token -- leave that to the loop below
-        # TODO: Would be slightly faster if we called step on the entire context,
-        # rather than leaving the last token transformer calculation to the while loop.
-        context_output = step(hparams, context[:, :-1])
-
-        def body(past, prev, output):
-            next_outputs = step(hparams, prev[:, tf.newaxis], past=past)
-            logits = next_outputs['logits'][:, -1, :]  / tf.to_float(temperature)
-            if top_p > 0.0:
-                logits = top_p_logits(logits, p=top_p)
-            else:
-                logits = top_k_logits(logits, k=top_k)
-            samples = tf.multinomial(logits, num_samples=1, output_dtype=tf.int32)
-            return [
-                tf.concat([past, next_outputs['presents']], axis=-2),
-                tf.squeeze(samples, axis=[1]),
-                tf.concat([output, samples], axis=1),
-            ]
-
-        def cond(*args):
-            return True
-
-        _, _, tokens = tf.while_loop(
+        # Decode: one token per step for the rows that are still being generated
+        def body(cache, cache_length, prev, output, rows, row_pad, words, ended_space):
+            logits, cache = step(hparams, prev[:, tf.newaxis], cache, cache_length, row_pad if has_pad else None)
+            samples = sample_filtered(logits[:, -1], temperature, top_k, top_p)
+            output, finished, words, ended_space = record_tokens(samples[:, tf.newaxis], output, rows, words, ended_space, **stopping)
+            if stop_token is not None:
+                cache, (samples, rows, row_pad, words, ended_space) = drop_rows(finished, cache, [samples, rows, row_pad, words, ended_space])
+            return [cache, cache_length + 1, samples, output, rows, row_pad, words, ended_space]
+
+        def cond(cache, cache_length, prev, output, rows, *args):
+            return tf.size(rows) > 0
+
+        _, _, _, tokens, _, _, _, _ = tf.while_loop(
             cond=cond, body=body,
-            maximum_iterations=length,
+            maximum_iterations=tf.maximum(length - 1, 0),  # The first token already came from the prefill
             loop_vars=[
-                context_output['presents'],
-                context[:, -1],
-                context,
+                cache,
+                tf.shape(context)[1],
+                samples,
+                output,
+                rows,
+                pad,
+                words,
+                ended_space,
             ],
             shape_invariants=[
-                tf.TensorShape(model.past_shape(hparams=hparams, batch_size=batch_size)),
-                tf.TensorShape([batch_size]),
-                tf.TensorShape([batch_size, None]),
-            ],
+                [tf.TensorShape(model.cache_shape(hparams=hparams, batch_size=None, sequence=None))] * hparams['n_layer'],
+                tf.TensorShape([]),
+                tf.TensorShape([None]),
+            ] + row_state_shapes(batch_size),
             back_prop=False,
         )
 
         return tokens
+
+
+def sample_sequence_speculative(*, hparams, draft_hparams, length, context, draft_length=4, batch_size=None, temperature=1, top_k=0, top_p=0.0,
+                                pad=None, stop_token=None, max_words=None, word_table=None, draft_scope='draft'):
+    """
+    Speculative sampling. Each round the draft model (a smaller model with the same vocabulary, e.g. 124M, whose
+    variables are under draft_scope) proposes draft_length tokens one at a time, then the model checks all of them
+    in a single forward pass. A proposed token is accepted with probability min(1, p/q), p and q being the model's
+    and the draft model's probability of it, and the first rejected token is replaced by a sample from max(0, p - q)
+    (or from p if every proposal was accepted). The output follows the same distribution as sample_sequence.
+    Every row of a batch moves forward by the number of proposals that all rows accepted, plus one token: the
+    replacement token for the rows that stopped there, the next accepted proposal for the others.
+    The other arguments are the same as sample_sequence.
+    """
+    assert hparams['n_vocab'] == draft_hparams['n_vocab'], 'The draft model must use the same vocabulary!'
+    if max_words is not None:
+        assert stop_token is not None and word_table is not None, 'max_words needs both stop_token and word_table!'
+    stopping = dict(stop_token=stop_token, max_words=max_words, word_table=word_table)
+    n_vocab = hparams['n_vocab']
+    n_layer = hparams['n_layer']
+
+    with tf.name_scope('sample_sequence_speculative'):
+        batch = tf.shape(context)[0]
+        context_length = tf.shape(context)[1]
+        # A round writes up to draft_length + 1 positions past the last generated token
+        cache_size = tf.minimum(hparams['n_ctx'], context_length + length + draft_length + 1)
+        cache = new_cache(hparams, batch, cache_size)
+        draft_cache = new_cache(draft_hparams, batch, cache_size)
+        has_pad = pad is not None
+        if pad is None:
+            pad = tf.zeros([batch], dtype=tf.int32)
+
+        # Prefill: both models read the whole context, the model gives the first token
+        logits, cache = step(hparams, context, cache, 0, pad if has_pad else None)
+        _, draft_cache = step(draft_hparams, context, draft_cache, 0, pad if has_pad else None, scope=draft_scope)
+        samples = sample_filtered(logits[:, -1], temperature, top_k, top_p)
+        rows = tf.range(batch)
+        words = tf.zeros([batch], dtype=tf.int32)
+        ended_space = tf.ones([batch], dtype=tf.bool)  # The start of the generated text counts as whitespace
+        output, finished, words, ended_space = record_tokens(samples[:, tf.newaxis], context, rows, words, ended_space, **stopping)
+        if stop_token is not None:
+            both_caches, (samples, rows, pad, words, ended_space) = drop_rows(finished, cache + draft_cache, [samples, rows, pad, words, ended_space])
+            cache, draft_cache = both_caches[:n_layer], both_caches[n_layer:]
+
+        def body(cache, draft_cache, cache_length, prev, output, rows, row_pad, words, ended_space):
+            step_pad = row_pad if has_pad else None
+            # Draft: propose draft_length tokens one at a time. The extra last step only writes the
+            # last proposal into the draft cache, in case every proposal is accepted.
+            tokens = prev
+            drafts = []
+            draft_probs = []
+            for i in range(draft_length + 1):
+                draft_logits, draft_cache = step(draft_hparams, tokens[:, tf.newaxis], draft_cache, cache_length + i, step_pad, scope=draft_scope)
+                if i == draft_length:
+                    break
+                draft_logits = filter_logits(draft_logits[:, -1], temperature, top_k, top_p)
+                tokens = sample_logits(draft_logits)
+                drafts.append(tokens)
+                draft_probs.append(tf.nn.softmax(draft_logits))
+            drafts = tf.stack(drafts, axis=1)  # [rows, draft_length]
+            draft_probs = tf.stack(draft_probs, axis=1)  # [rows, draft_length, vocab]
+
+            # Verify: the model reads prev and every proposal in one pass
+            logits, cache = step(hparams, tf.concat([prev[:, tf.newaxis], drafts], axis=1), cache, cache_length, step_pad, last_logits_only=False)
+            n_rows = tf.shape(prev)[0]
+            probs = tf.nn.softmax(filter_logits(tf.reshape(logits, [-1, n_vocab]), temperature, top_k, top_p))
+            probs = tf.reshape(probs, [n_rows, draft_length + 1, n_vocab])
+            p = tf.gather(probs[:, :draft_length], drafts[:, :, tf.newaxis], batch_dims=2)[:, :, 0]
+            q = tf.gather(draft_probs, drafts[:, :, tf.newaxis], batch_dims=2)[:, :, 0]
+            accept = tf.random.uniform(tf.shape(p)) * q < p  # r < p / q, q > 0 as the draft model sampled the token
+            accepted = tf.reduce_sum(tf.cumprod(tf.cast(accept, tf.int32), axis=1), axis=1)  # Proposals accepted in a row
+            m = tf.reduce_min(accepted)
+
+            # The token after the m shared proposals
+            q_padded = tf.concat([draft_probs, tf.zeros_like(draft_probs[:, :1])], axis=1)
+            residual = tf.nn.relu(probs[:, m] - q_padded[:, m])
+            residual = tf.where_v2(tf.reduce_sum(residual, axis=-1, keepdims=True) > 0, residual, probs[:, m])
+            corrected = sample_logits(tf.where_v2(residual > 0, tf.math.log(residual), -1e10))
+            drafts_padded = tf.concat([drafts, drafts[:, :1]], axis=1)
+            samples = tf.where(accepted > m, drafts_padded[:, m], corrected)
+
+            chunk = tf.concat([drafts[:, :m], samples[:, tf.newaxis]], axis=1)
+            output, finished, words, ended_space = record_tokens(chunk, output, rows, words, ended_space, **stopping)
+            if stop_token is not None:
+                both_caches, (samples, rows, row_pad, words, ended_space) = drop_rows(
+                    finished, cache + draft_cache, [samples, rows, row_pad, words, ended_space]
+                )
+                cache, draft_cache = both_caches[:n_layer], both_caches[n_layer:]
+            # Positions past cache_length + m + 1 hold rejected tokens and are simply written over next round
+            return [cache, draft_cache, cache_length + m + 1, samples, output, rows, row_pad, words, ended_space]
+
+        def cond(cache, draft_cache, cache_length, prev, output, rows, *args):
+            return tf.logical_and(tf.size(rows) > 0, tf.shape(output)[1] - context_length < length)
+
+        _, _, _, _, tokens, _, _, _, _ = tf.while_loop(
+            cond=cond, body=body,
+            loop_vars=[
+                cache,
+                draft_cache,
+                context_length,
+                samples,
+                output,
+                rows,
+                pad,
+                words,
+                ended_space,
+            ],
+            shape_invariants=[
+                [tf.TensorShape(model.cache_shape(hparams=hparams, batch_size=None, sequence=None))] * n_layer,
+                [tf.TensorShape(model.cache_shape(hparams=draft_hparams, batch_size=None, sequence=None))] * draft_hparams['n_layer'],
+                tf.TensorShape([]),
+                tf.TensorShape([None]),
+            ] + row_state_shapes(batch_size),
+            back_prop=False,
+        )
+
+        return tokens[:, :context_length + length]
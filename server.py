@@ -0,0 +1,251 @@
+# Serves poems over HTTP so other programs can ask for them without loading the AI each time, e.g: server.py --port 8000
+# then: curl 'localhost:8000/poem?name=Albert+Einstein' or curl -d '{"name": "Albert Einstein", "settings": {"AI fill": false}}' localhost:8000/poem
+# The answer is the same JSON record batch.py writes. The model stays loaded, the AI fills of requests arriving within
+# --window seconds of each other run as one batched decode, and the same name asked for again while its poem is still
+# being made waits for that poem instead of making another. Past --max-pending requests the server answers 503.
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from batch import add_settings_arguments, check_settings, load_settings, make_record
+from functions import fill_poems
+from generator import get_generator
+from pipeline import ThreadOutput, prepare
+from wiki_cache import WikiCache, get_wiki_cache
+
+
+class Busy(Exception):
+    pass
+
+
+def fail(futures, error):
+    # Resolves the futures not resolved yet with error, one the request threads can raise (not e.g. SystemExit)
+    if not isinstance(error, Exception):
+        error = RuntimeError(f"{type(error).__name__}: {error}")
+    for future in futures:
+        if not future.done():
+            future.set_exception(error)
+
+
+class Request(Future):
+    # Future of a record that calls release just before it is resolved, so a request that has its answer is already out of
+    # pending (a done callback only runs after the waiting threads are woken up)
+    def __init__(self, release):
+        super().__init__()
+        self.release = release
+
+    def set_result(self, result):
+        self.release()
+        super().set_result(result)
+
+    def set_exception(self, exception):
+        self.release()
+        super().set_exception(exception)
+
+
+class PoemService:
+    """
+    Makes poems for requests from many threads at once.
+    :poem_settings : Dict, settings used for the keys a request does not set
+    :workers=4 : Number of names fetched at the same time
+    :max_pending=64 : Most different requests being worked on, submit raises Busy past this
+    :batch_size=8 : Most AI fills decoded together
+    :window=0.05 : Seconds the first AI fill of a batch waits for others to join it
+    :refresh=False : Fetches every Wikipedia article again instead of using the cache
+    """
+    def __init__(self, poem_settings, workers=4, max_pending=64, batch_size=8, window=0.05, refresh=False):
+        self.poem_settings = poem_settings
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.window = window
+        self.refresh = refresh
+        self.output = ThreadOutput(sys.stdout)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.fills = queue.Queue(maxsize=max_pending)  # Prepared poems waiting for the AI, can never fill up as there are at most max_pending
+        self.pending = {}  # Request key -> Future of its record
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.coalesced = 0  # Requests answered by a poem another request was already waiting for
+        self.rejected = 0
+        self.batches = 0
+        self.batched = 0  # AI fills made in those batches
+        threading.Thread(target=self.fill_loop, daemon=True).start()
+
+    def settings(self, overrides):
+        check_settings(overrides, "the request")
+        poem_settings = dict(self.poem_settings, **overrides)
+        poem_settings["Set poem order"] = poem_settings["Set poem order"].lower()
+        return poem_settings
+
+    def submit(self, full_name, overrides=None):
+        # Returns a Future of the record for full_name, shared by every identical request until it is done
+        poem_settings = self.settings(overrides or {})
+        key = (WikiCache.key(full_name), json.dumps(poem_settings, sort_keys=True))
+        with self.lock:
+            self.requests += 1
+            if key in self.pending:
+                self.coalesced += 1
+                return self.pending[key]
+            if len(self.pending) >= self.max_pending:
+                self.rejected += 1
+                raise Busy()
+            future = self.pending[key] = Request(lambda: self.done(key))
+        try:
+            self.pool.submit(self.prepare, full_name, poem_settings, future)
+        except BaseException as e:
+            fail([future], e)
+            raise
+        return future
+
+    def done(self, key):
+        with self.lock:
+            self.pending.pop(key, None)
+
+    def prepare(self, full_name, poem_settings, future):
+        # Whatever happens the future gets resolved, as that is what takes the request out of pending: one left unresolved
+        # would keep its max_pending slot forever and every identical request after it would wait on it
+        try:
+            result = prepare(full_name, poem_settings, self.refresh, self.output)
+            if result[2] is not None and poem_settings["AI fill"]:
+                self.fills.put((result, poem_settings, future))
+            else:  # Nothing for the AI to do, fill_poems only puts the poem into print_poem's format
+                full_name, all_data, poem, printed, timings = result
+                poem = None if poem is None else fill_poems([poem], poem_settings)[0]
+                future.set_result(make_record(full_name, all_data, printed, poem, timings, poem_settings))
+        except BaseException as e:  # Not just Exception, e.g. SystemExit would leave the future unresolved
+            fail([future], e)
+
+    def fill_loop(self):
+        # Takes the next AI fill, gives others up to window seconds to arrive, then decodes them all together
+        while True:
+            batch = [self.fills.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.fills.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            futures = [future for _, _, future in batch]
+            try:
+                start = time.perf_counter()
+                filled = fill_poems([result[2] for result, _, _ in batch], {"AI fill": True}, self.batch_size)
+                fill_time = time.perf_counter() - start
+                with self.lock:
+                    self.batches += 1
+                    self.batched += len(batch)
+                for ((full_name, all_data, _, printed, timings), poem_settings, future), poem in zip(batch, filled):
+                    timings['fill'] = fill_time
+                    future.set_result(make_record(full_name, all_data, printed, poem, timings, poem_settings))
+            except BaseException as e:  # The loop has to keep going for the requests after these
+                fail(futures, e)
+            finally:
+                fail(futures, RuntimeError("the AI fill stopped"))
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requests': self.requests, 'coalesced': self.coalesced, 'rejected': self.rejected, 'pending': len(self.pending),
+                'batches': self.batches, 'mean_batch_size': self.batched / self.batches if self.batches else 0,
+                'wikipedia_cache': get_wiki_cache().stats(),
+            }
+
+
+class PoemHandler(BaseHTTPRequestHandler):
+    # GET /poem?name=..., POST /poem with {"name": ..., "settings": {...}} and GET /stats
+    service = None  # The PoemService, set by serve
+    timeout_seconds = 300  # Longest a request waits for its poem
+
+    def send_json(self, status, body, headers=()):
+        data = json.dumps(body, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for header in headers:
+            self.send_header(*header)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def poem(self, full_name, overrides):
+        if not isinstance(full_name, str) or not full_name.strip():
+            return self.send_json(400, {'error': "a name must be given"})
+        if not isinstance(overrides, dict):
+            return self.send_json(400, {'error': "settings must be an object"})
+        try:
+            future = self.service.submit(full_name.strip(), overrides)
+        except ValueError as e:
+            return self.send_json(400, {'error': str(e)})
+        except Busy:
+            return self.send_json(503, {'error': "too many requests are waiting, try again later"}, [('Retry-After', '1')])
+        try:
+            self.send_json(200, future.result(timeout=self.timeout_seconds))
+        except Exception as e:
+            self.send_json(500, {'error': f"{type(e).__name__}: {e}"})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/stats':
+            return self.send_json(200, self.service.stats())
+        if url.path != '/poem':
+            return self.send_json(404, {'error': f"unknown path {url.path}"})
+        query = parse_qs(url.query)
+        self.poem(query.get('name', [None])[0], {})
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/poem':
+            return self.send_json(404, {'error': f"unknown path {self.path}"})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        except ValueError:
+            return self.send_json(400, {'error': "the body must be JSON"})
+        if not isinstance(body, dict):
+            return self.send_json(400, {'error': "the body must be a JSON object"})
+        self.poem(body.get('name'), body.get('settings', {}))
+
+
+def serve(service, host='127.0.0.1', port=8000):
+    # Answers requests until interrupted, prints made while fetching go into each request's record instead of the console
+    handler = type('Handler', (PoemHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    sys.stdout = service.output
+    try:
+        print(f"Serving poems on http://{host}:{server.server_address[1]}/poem")
+        server.serve_forever()
+    finally:
+        sys.stdout = service.output.stdout
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves poems as JSON over HTTP")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on, only this machine by default")
+    parser.add_argument('--port', type=int, default=8000)
+    add_settings_arguments(parser)
+    parser.add_argument('--workers', type=int, default=4, help="Number of names fetched at the same time")
+    parser.add_argument('--max-pending', type=int, default=64, help="Most requests being worked on before the server answers 503")
+    parser.add_argument('--batch-size', type=int, default=8, help="Most poems filled by the AI together")
+    parser.add_argument('--window', type=float, default=0.05, help="Seconds an AI fill waits for others to batch with")
+    parser.add_argument('--refresh', action='store_true', help="Fetch every Wikipedia article again instead of using the cache")
+    parser.add_argument('--no-preload', action='store_true', help="Load the AI on the first request instead of at start up")
+    args = parser.parse_args()
+    try:
+        poem_settings = load_settings(args)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    if not args.no_preload:
+        get_generator('774M', 'tf', 'float32', None)  # Same model as fill_poems uses, kept loaded for every request
+    service = PoemService(poem_settings, args.workers, args.max_pending, args.batch_size, args.window, args.refresh)
+    try:
+        serve(service, args.host, args.port)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# Tests for batch.py's poem settings (the defaults, then a config file, then flags) and the records it writes
+import argparse
+import json
+import os
+
+import pytest
+
+import batch
+from functions import DEFAULT_POEM_SETTINGS
+
+ALL_DATA = ('1815-12-10', '36', 'dead', 'scientist', 'female', 'mathematics', 'Ada', 'Lovelace', 'https://en.wikipedia.org/wiki/Ada_Lovelace')
+LINES = [f"line {i}" for i in range(8)]
+
+
+def parse(*flags):
+    parser = argparse.ArgumentParser()
+    batch.add_settings_arguments(parser)
+    return parser.parse_args(flags)
+
+
+@pytest.fixture
+def config(tmp_path):
+    # Writes poem settings to a config file and returns its path
+    def write(poem_settings):
+        path = os.path.join(tmp_path, 'settings.json')
+        with open(path, 'w') as f:
+            json.dump(poem_settings, f)
+        return path
+    return write
+
+
+@pytest.mark.parametrize('poem_settings, message', [
+    ({"Poem length": 8}, "Unknown poem settings in settings.json: Poem length"),
+    ({"AI fill": "yes"}, "AI fill in settings.json must be a bool"),
+    ({"Number of words": 10.0}, "Number of words in settings.json must be a int"),
+    ({"Number of syllables": True}, "Number of syllables in settings.json must be a int"),
+    ({"Poem order": "backwards"}, "Poem order in settings.json must be normal or random"),
+    ({"Set poem order": "aaabbbcc"}, "aaabbbcc must have 8 characters, with 4 a's, 2 b's, and 2 c's (e.g aaaabbcc)"),
+])
+def test_check_settings_rejects(poem_settings, message):
+    with pytest.raises(ValueError) as error:
+        batch.check_settings(poem_settings, 'settings.json')
+    assert str(error.value) == message
+
+
+def test_check_settings_accepts_any_allowed_settings():
+    batch.check_settings({}, 'settings.json')
+    batch.check_settings(dict(DEFAULT_POEM_SETTINGS, **{"Poem order": "random", "Set poem order": "CCAABBAA"}), 'settings.json')
+
+
+def test_defaults_without_a_config_or_flags():
+    assert batch.load_settings(parse()) == DEFAULT_POEM_SETTINGS
+
+
+def test_config_then_flags(config):
+    path = config({"AI fill": False, "Set poem order": "BBAAAACC", "Number of words": 5, "Number of syllables": 3})
+
+    poem_settings = batch.load_settings(parse('--config', path, '--number-of-words', '7', '--ai-fill', '--order', 'random'))
+
+    assert poem_settings == {
+        "Poem order": "random",  # Flags win over the config
+        "AI fill": True,
+        "Set poem order": "bbaaaacc",  # From the config, in lower case
+        "Number of words": 7,
+        "Words to generate": DEFAULT_POEM_SETTINGS["Words to generate"],  # In neither, so the default
+        "Number of syllables": 3,
+    }
+
+
+def test_no_flag_turns_ai_fill_off(config):
+    assert batch.load_settings(parse('--no-ai-fill'))["AI fill"] is False
+    assert batch.load_settings(parse('--config', config({"AI fill": True}), '--no-ai-fill'))["AI fill"] is False
+
+
+def test_bad_config_is_an_error(config):
+    with pytest.raises(ValueError, match='Unknown poem settings'):
+        batch.load_settings(parse('--config', config({"Poem length": 8})))
+
+
+def test_record_of_a_poem():
+    poem_settings = dict(DEFAULT_POEM_SETTINGS, **{"Set poem order": "ccbbaaaa"})
+
+    record = batch.make_record('ada lovelace', ALL_DATA, '', (LINES, 42, 'The AI wrote this'), {'get_data': 0.123456, 'poem': 1.5}, poem_settings)
+
+    assert record == {
+        'name': 'ada lovelace', 'found': True, **dict(zip(batch.DATA_FIELDS, ALL_DATA)),
+        'poem': ['line 6', 'line 7', 'line 4', 'line 5', 'line 0', 'line 1', 'line 2', 'line 3'],
+        'ai_fill': 'The AI wrote this', 'no_of_words': 42, 'messages': [], 'timings': {'get_data': 0.1235, 'poem': 1.5},
+    }
+    assert json.loads(json.dumps(record, default=str)) == record
+
+
+def test_record_of_nobody_found():
+    record = batch.make_record('Nobody Here', None, 'Check spelling of Nobody Here and try again\n\n', None, {'get_data': 0.5}, DEFAULT_POEM_SETTINGS)
+
+    assert record == {'name': 'Nobody Here', 'found': False, 'messages': ['Check spelling of Nobody Here and try again', ''],
+                      'timings': {'get_data': 0.5}}
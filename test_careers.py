@@ -0,0 +1,36 @@
+# Tests for careers.py against the careers the ten regex searches of the old get_data found, for every infobox in
+# fixtures/infoboxes.json (the career and subscience fields) and for made up infoboxes that mix careers
+import json
+import os
+
+import pytest
+
+from careers import classify_career
+
+with open(os.path.join(os.path.dirname(__file__), 'fixtures', 'infoboxes.json'), encoding='utf-8') as f:
+    FIXTURES = json.load(f)
+
+
+@pytest.mark.parametrize('fixture', FIXTURES, ids=[fixture['title'] for fixture in FIXTURES])
+def test_career_matches_the_old_get_data(fixture):
+    assert list(classify_career(fixture['infobox'])) == [fixture['career'], fixture['subscience']]
+
+
+@pytest.mark.parametrize('text, career, subscience', [
+    ('[ Frank Smith , Born 1950 , Occupation actor , In office 1990–1994 ]', 'politician', None),  # Politician before actor
+    ('[ Jo , Sports Team Lakers , Scientific career , Fields Marine biology , oceans ]', 'scientist', 'marine'),
+    ('[ Jo , Scientific career , Institutions MIT ]', 'scientist', None),
+    ('[ Jo , Position Power forward , Teams Lakers ]', 'unknown', None),  # pro and team only as whole words
+    ('[ Jo , Professional Teamwork , Years active 1990 ]', 'unknown', None),
+    ('[ Jo , Occupation Pro wrestler , Genres Musical theatre ]', 'sports person', None),
+    ('[ Jo , Occupation Comedian , Notable work Show , Radio host ]', 'comedian', None),
+    ('[ Jo , Frank Jones , Born 1900 ]', 'military personnel', None),  # rank inside Frank
+    ('[ Jo , Occupation Poet , Allegiance United Kingdom ]', 'author', None),
+    ('[ Jo , Awards Emmy , Spouse Sam ]', 'unknown', None),
+    # Letters that only match s and i when case is ignored
+    ('[ Jo , Occupation Muſician ]', 'musician', None),
+    ('[ Jo , Scientific career , Fields Phyſics , maths , Field x ]', 'scientist', 'phyſics'),
+    ('[ JO , İN OFFICE 1990 ]', 'politician', None),
+])
+def test_mixed_careers(text, career, subscience):
+    assert classify_career(text) == (career, subscience)
@@ -0,0 +1,66 @@
+# Tests for get_data_many, with the people of fixtures/infoboxes.json in a dump index so no network is needed
+import json
+import os
+import pickle
+
+import pytest
+
+import functions
+import wiki_dump
+from functions import DataError, get_data_many
+
+with open(os.path.join(os.path.dirname(__file__), 'fixtures', 'infoboxes.json'), encoding='utf-8') as f:
+    FIXTURES = json.load(f)
+PEOPLE = [fixture for fixture in FIXTURES if fixture['born'] != 'unknown']  # person_data needs a birth date
+
+
+@pytest.fixture
+def dump_index(tmp_path, monkeypatch):
+    # A dump index of the fixtures, which get_data uses (in this process and in the pool's) through WIKI_DUMP_INDEX
+    path = os.path.join(tmp_path, 'dump.sqlite')
+    people = []
+    for revision, fixture in enumerate(FIXTURES, 1):
+        title = fixture['title']
+        entry = {"title": title, "url": 'https://en.wikipedia.org/wiki/' + title.replace(' ', '_'), "revision": revision,
+                 "gender": "unknown", "career": None, "infobox": fixture['infobox']}
+        people.append((wiki_dump.key(title), title, revision, json.dumps(entry)))
+    wiki_dump.DumpIndex(path).add(people, [])
+    monkeypatch.setenv('WIKI_DUMP_INDEX', path)
+    yield path
+    wiki_dump.get_dump_index.cache_clear()
+
+
+def test_pool_keeps_the_order_of_the_names(dump_index):
+    full_names = [fixture['title'] for fixture in PEOPLE] * 2
+
+    data = get_data_many(full_names, workers=2, chunksize=3)
+
+    assert [(all_data[0], all_data[8]) for all_data in data] == [
+        (fixture['born'], 'https://en.wikipedia.org/wiki/' + fixture['title'].replace(' ', '_')) for fixture in PEOPLE * 2]
+    assert data == get_data_many(full_names, workers=1)
+
+
+def test_errors_take_the_place_of_the_names_without_data(dump_index):
+    full_names = ['Ada Lovelace', '', 'Nobody Here', '   ', 'Anonymous Band', 'Marie Curie']
+
+    data = get_data_many(full_names, workers=2, chunksize=1)
+
+    assert [type(item) for item in data] == [tuple, DataError, DataError, DataError, DataError, tuple]
+    assert [item.name for item in data[1:5]] == full_names[1:5]
+    assert str(data[1]) == str(data[3]) == 'Name cannot be empty, please type in a name'
+    assert str(data[2]) == 'Check spelling of Nobody Here and try again'
+    assert str(data[4]).startswith('UnboundLocalError: ')  # Raised by person_data in the worker, which goes on
+    assert [data[0][0], data[5][0]] == ['1815-12-10', '1867-11-07']
+
+
+def test_data_error_pickles():
+    error = pickle.loads(pickle.dumps(DataError('Nobody Here', 'Check spelling of Nobody Here and try again')))
+
+    assert (error.name, error.message, str(error)) == ('Nobody Here', 'Check spelling of Nobody Here and try again',
+                                                        'Check spelling of Nobody Here and try again')
+
+
+def test_one_worker_runs_in_this_process(dump_index, monkeypatch):
+    monkeypatch.setattr(functions, 'Pool', None)  # Any use of a pool fails
+
+    assert get_data_many(['Ada Lovelace', ''], workers=1)[0][0] == '1815-12-10'
@@ -0,0 +1,33 @@
+# Tests for dates.py against the dates the old get_date found for every infobox in fixtures/infoboxes.json (the born and
+# died fields, died is None where get_date gave today's date)
+import datetime
+import json
+import os
+
+import pytest
+
+from dates import extract_dates
+
+with open(os.path.join(os.path.dirname(__file__), 'fixtures', 'infoboxes.json'), encoding='utf-8') as f:
+    FIXTURES = json.load(f)
+
+
+@pytest.mark.parametrize('fixture', FIXTURES, ids=[fixture['title'] for fixture in FIXTURES])
+def test_dates_match_the_old_get_date(fixture):
+    birth, death = extract_dates(fixture['infobox'])
+
+    assert (str(birth[0]) if birth else 'unknown', str(death[0]) if death else None) == (fixture['born'], fixture['died'])
+
+
+@pytest.mark.parametrize('text, birth, death', [
+    # A footnote in the middle of the birth date, and a death date in the month day, year form
+    ('[ Born 10 July [ O.S. 28 June ] 1856 Smiljan , Died January 7, 1943 (aged 86) New York ]',
+     (datetime.date(1856, 7, 10), 'day'), (datetime.date(1943, 1, 7), 'day')),
+    # The age in brackets is not read as the year of death
+    ('[ Died 1955 (aged 76) , Born March 1879 ]', (datetime.date(1879, 3, 1), 'month'), (datetime.date(1955, 1, 1), 'year')),
+    # Abbreviated months are read and day 0 is skipped for the next most exact date, where the old get_date crashed
+    ('[ Born 14 Mar 1879 Ulm , Died 0 April 1955 Princeton ]', (datetime.date(1879, 3, 14), 'day'), (datetime.date(1955, 4, 1), 'month')),
+    ('[ Alias Bob , Occupation actor ]', None, None),
+])
+def test_extract_dates(text, birth, death):
+    assert extract_dates(text) == (birth, death)
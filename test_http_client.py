@@ -0,0 +1,168 @@
+# Tests for http_client.py against a local server that answers chunked, gzip, redirected and failing requests
+import asyncio
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import http_client
+
+BODY = ('<p>' + 'All work and no play. ' * 2000 + '</p>').encode('utf-8')
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, as Wikipedia answers
+    counts = {}  # Path -> times it was asked for
+
+    def log_message(self, *args):
+        pass
+
+    def send_body(self, body, content_type='text/html; charset=utf-8', status=200, chunked=False, compress=False, headers=()):
+        if compress:
+            body = gzip.compress(body)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        for header in headers:
+            self.send_header(*header)
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for start in range(0, len(body), 1000):
+                part = body[start:start + 1000]
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(part), part))
+            self.wfile.write(b'0\r\n\r\n')
+        else:
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def do_GET(self):
+        count = self.counts[self.path] = self.counts.get(self.path, 0) + 1
+        if self.path == '/plain':
+            self.send_body(BODY)
+        elif self.path == '/chunked':
+            self.send_body(BODY, chunked=True)
+        elif self.path == '/gzip':
+            self.send_body(BODY, compress=True)
+        elif self.path == '/chunked-gzip':
+            self.send_body(BODY, chunked=True, compress=True)
+        elif self.path == '/redirect':
+            self.send_body(b'', status=302, headers=[('Location', '/gzip')])
+        elif self.path == '/loop':
+            self.send_body(b'', status=302, headers=[('Location', '/loop')])
+        elif self.path == '/flaky':  # Fails twice, then answers
+            self.send_body(b'busy', status=503) if count <= 2 else self.send_body(b'[1, 2, 3]', 'application/json')
+        elif self.path == '/not-json-once':
+            self.send_body(b'<html>error</html>') if count == 1 else self.send_body(b'{"ok": true}', 'application/json')
+        elif self.path == '/latin-1':
+            self.send_body('café'.encode('latin-1'), 'text/html; charset=iso-8859-1')
+        else:
+            self.send_body(b'', status=404)
+
+
+@pytest.fixture(scope='module')
+def base_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setenv('HTTP_BACKOFF', '0.01')
+    Handler.counts.clear()
+
+
+def run_with_client(coroutine_function):
+    # Runs coroutine_function(client) on a new loop with a client of its own, closed at the end
+    async def main():
+        client = http_client.get_client()
+        try:
+            return await coroutine_function(client)
+        finally:
+            await client.close()
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize('path', ['/plain', '/chunked', '/gzip', '/chunked-gzip', '/redirect'])
+def test_bodies_are_read_whole_and_in_pieces(base_url, path):
+    async def read(client):
+        async with await client.get(base_url + path) as response:
+            whole = await response.read()
+        async with await client.get(base_url + path) as response:
+            pieces = []
+            while piece := await response.read(777):
+                assert len(piece) <= 777
+                pieces.append(piece)
+        return response.geturl(), whole, b''.join(pieces), client.stats()
+
+    url, whole, pieces, stats = run_with_client(read)
+
+    assert whole == pieces == BODY
+    assert url == base_url + ('/gzip' if path == '/redirect' else path)
+    assert stats['connections'] == 1  # The second request reused the first one's connection
+
+
+def test_released_response_leaves_its_connection_reusable(base_url):
+    async def read(client):
+        for _ in range(3):
+            async with await client.get(base_url + '/chunked-gzip') as response:
+                assert await response.read(100) == BODY[:100]
+        return client.stats()
+
+    stats = run_with_client(read)
+
+    assert (stats['requests'], stats['connections'], stats['reused']) == (3, 1, 2)
+
+
+def test_retries_error_statuses_and_bad_json(base_url):
+    async def read(client):
+        return await client.get_json(base_url + '/flaky'), await client.get_json(base_url + '/not-json-once'), client.stats()
+
+    flaky, not_json, stats = run_with_client(read)
+
+    assert flaky == [1, 2, 3]
+    assert not_json == {'ok': True}
+    assert stats['retries'] == 3
+    assert Handler.counts == {'/flaky': 3, '/not-json-once': 2}
+
+
+def test_errors_are_os_errors(base_url):
+    async def missing(client):
+        await client.get(base_url + '/missing')
+
+    async def redirect_loop(client):
+        await client.get(base_url + '/loop')
+
+    with pytest.raises(http_client.HTTPError) as error:
+        run_with_client(missing)
+    assert error.value.status == 404
+    assert Handler.counts['/missing'] == 1  # A 404 is not tried again
+    with pytest.raises(http_client.HTTPError):
+        run_with_client(redirect_loop)
+
+
+def test_charset_of_the_answer(base_url):
+    async def read(client):
+        async with await client.get(base_url + '/latin-1') as response:
+            return response.charset, (await response.read()).decode(response.charset)
+
+    assert run_with_client(read) == ('iso-8859-1', 'café')
+
+
+def test_run_uses_the_background_loop_and_refuses_to_call_itself(base_url):
+    async def fetch():
+        return await http_client.get_client().get_json(base_url + '/flaky')
+
+    async def nested():
+        return http_client.run(fetch())
+
+    assert http_client.run(fetch()) == [1, 2, 3]
+    with pytest.raises(RuntimeError):
+        http_client.run(nested())
@@ -0,0 +1,49 @@
+# Tests for the choice of infobox in infobox.py, which must match the order BeautifulSoup used to search the classes in
+import io
+
+import pytest
+
+import infobox
+
+
+def table(classes, born):
+    return f'<table class="{classes}"><tbody><tr><th>Born</th><td>{born}</td></tr></tbody></table>'
+
+
+def parse(tables):
+    html = f'<html><body><div class="mw-parser-output">{tables}<p>She was.</p></div><p>Footer</p></body></html>'
+    return infobox.parse(io.BytesIO(html.encode('utf-8')), infobox.PRONOUNS, chunk_size=16)
+
+
+@pytest.mark.parametrize('tables, classes, born', [
+    (table('infobox vcard', 'first') + table('infobox biography vcard', 'second'), 'infobox biography vcard', 'second'),
+    (table('infobox vcard plainlist', 'first') + table('infobox biography vcard', 'second'), 'infobox biography vcard', 'second'),
+    (table('infobox vcard', 'first') + table('infobox vcard plainlist', 'second'), 'infobox vcard plainlist', 'second'),
+    (table('infobox biography vcard', 'first') + table('infobox vcard', 'second'), 'infobox biography vcard', 'first'),
+    (table('infobox vcard', 'first') + table('infobox vcard', 'second'), 'infobox vcard', 'first'),
+    (table('navbox', 'first') + table('infobox vcard', 'second'), 'infobox vcard', 'second'),
+])
+def test_best_class_wins_over_an_earlier_table(tables, classes, born):
+    page = parse(tables)
+
+    assert (page.infobox_class, page.rows) == (classes, [('Born', born)])
+
+
+def test_better_infobox_inside_another_replaces_it():
+    outer = f'<table class="infobox vcard"><tbody><tr><th>Name</th><td>X</td></tr><tr><td>{table("infobox biography vcard", "inner")}</td></tr></tbody></table>'
+
+    page = parse(outer)
+
+    assert (page.infobox_class, page.rows) == ('infobox biography vcard', [('Born', 'inner')])
+
+
+def test_reading_stops_early_only_at_the_best_class():
+    best = infobox.ArticleParser(infobox.PRONOUNS)
+    best.feed('<div class="mw-parser-output">' + table('infobox biography vcard', 'x') + '<p>He was.</p>')
+    other = infobox.ArticleParser(infobox.PRONOUNS)
+    other.feed('<div class="mw-parser-output">' + table('infobox vcard', 'x') + '<p>He was.</p>')
+
+    assert best.done()
+    assert not other.done()
+    other.feed('</div>')
+    assert other.done()
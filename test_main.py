@@ -0,0 +1,33 @@
+# Tests for main.py's list mode, run as the script it is with its questions answered and the pipeline replaced
+import runpy
+
+import pytest
+
+import pipeline
+import wiki_cache
+from wiki_cache import WikiCache
+
+LINES = [f"line {i}" for i in range(8)]
+ALL_DATA = ('1815-12-10', '36', 'dead', 'scientist', 'female', 'mathematics', 'ada', 'lovelace', 'https://en.wikipedia.org/wiki/Ada_Lovelace')
+
+
+def fake_run_pipeline(full_names, poem_settings, refresh=False):
+    for full_name in full_names:
+        yield full_name, ALL_DATA, '', (list(LINES), 42, 'The AI wrote this'), {}
+
+
+@pytest.mark.parametrize('names', ['r', 's'])
+def test_list_mode_prints_each_poem_with_its_ai_fill(monkeypatch, capsys, names):
+    answers = iter([names, 'd'])  # The list of names, then the default poem settings
+    monkeypatch.setattr('builtins.input', lambda prompt='': next(answers))
+    monkeypatch.setattr(pipeline, 'run_pipeline', fake_run_pipeline)
+    monkeypatch.setattr(wiki_cache, 'get_wiki_cache', lambda: WikiCache(path=None))
+
+    runpy.run_path('main.py', run_name='__main__')
+
+    out = capsys.readouterr().out
+    poems = out.count('Poem: (42 words long)')
+    assert poems == {'r': 6, 's': 14}[names]
+    assert out.count('The AI wrote this') == poems
+    assert out.count('line 7') == poems
+    assert 'Wikipedia cache' not in out  # Nobody was looked up in the cache
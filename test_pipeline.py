@@ -0,0 +1,39 @@
+# Tests for pipeline.py, with get_data and the poem steps replaced so no network or model is needed
+import pipeline
+
+
+def fake_get_data(full_name, refresh=False):
+    if full_name == 'Slow Person':
+        raise TimeoutError('Connection to wikipedia timed out, please check your internet connection')
+    if full_name == 'Broken Person':
+        raise ValueError('no infobox')
+    if full_name == 'Nobody':
+        print('Could not find Nobody on Wikipedia')
+        return None
+    return {'name': full_name}
+
+
+def fake_fill_poems(poems, poem_settings, batch_size=8):
+    return [f"poem for {poem}" for poem in poems]
+
+
+def test_run_pipeline_goes_on_past_failing_names(monkeypatch):
+    monkeypatch.setattr(pipeline, 'get_data', fake_get_data)
+    monkeypatch.setattr(pipeline, 'poem_data', lambda full_name, all_data: all_data)
+    monkeypatch.setattr(pipeline, 'compose_poem', lambda all_data, poem_settings: all_data['name'])
+    monkeypatch.setattr(pipeline, 'fill_poems', fake_fill_poems)
+    full_names = ['Ada Lovelace', 'Slow Person', 'Broken Person', 'Nobody', 'Alan Turing']
+
+    results = list(pipeline.run_pipeline(full_names, {}, workers=2, queue_size=3, batch_size=2))
+
+    assert [result[0] for result in results] == full_names
+    by_name = {full_name: (all_data, printed, poem) for full_name, all_data, printed, poem, timings in results}
+    assert by_name['Ada Lovelace'] == ({'name': 'Ada Lovelace'}, '', 'poem for Ada Lovelace')
+    assert by_name['Alan Turing'] == ({'name': 'Alan Turing'}, '', 'poem for Alan Turing')
+    all_data, printed, poem = by_name['Slow Person']
+    assert all_data is None and poem is None
+    assert 'timed out' in printed and 'Slow Person' in printed
+    all_data, printed, poem = by_name['Broken Person']
+    assert all_data is None and poem is None
+    assert 'ValueError: no infobox' in printed
+    assert by_name['Nobody'] == (None, 'Could not find Nobody on Wikipedia\n', None)
@@ -0,0 +1,26 @@
+# Tests for quantize.py's matmul, which converts int8 and bfloat16 matrices a tile at a time
+import numpy as np
+import pytest
+
+import quantize
+
+
+@pytest.mark.parametrize('mode', ['int8', 'bfloat16'])
+@pytest.mark.parametrize('name, shape, transpose', [('model/wte', [300, 64], True), ('h0/mlp/c_fc/w', [1, 64, 300], False)])
+@pytest.mark.parametrize('tile_size', [1, 100, 64 * 7, quantize.TILE_SIZE])
+def test_tiled_matmul_matches_the_dequantized_matrix(mode, name, shape, transpose, tile_size):
+    rng = np.random.default_rng(0)
+    params = quantize.quantize_params({name: rng.normal(size=shape).astype(np.float32)}, mode)
+    x = rng.normal(size=[3, 2, 64]).astype(np.float32)
+    w = quantize.dequantize(params, name).reshape(shape[-2:])
+
+    out = quantize.matmul(x, params, name, transpose, tile_size)
+
+    assert out.dtype == np.float32
+    np.testing.assert_allclose(out, np.matmul(x, w.T if transpose else w), rtol=1e-5, atol=1e-4)
+
+
+def test_bfloat16_rounds_to_nearest():
+    w = np.array([1.0, 1 + 2**-8, 1 + 3 * 2**-8, -2.5, 0.0], dtype=np.float32)
+
+    assert quantize.from_bfloat16(quantize.to_bfloat16(w)).tolist() == [1.0, 1.0, 1 + 2**-6, -2.5, 0.0]
@@ -0,0 +1,77 @@
+# Tests for where generation stops at the word budget, in both samplers, and for how fill_poem uses what they generate
+import numpy as np
+import pytest
+
+import functions
+import np_sample
+
+# A made up vocabulary, index 0 is the stop token
+VOCAB = ['<|endoftext|>', ' the', ' extra', 'ordinary', ' cat', '.', '\n', 'Sat']
+WORD_TABLE = np.array([[text.strip() != '', text[:1].isspace(), text[-1:].isspace()] for text in VOCAB])
+SCRIPT = [1, 2, 3, 5, 6, 7, 4, 1, 4]  # " the extraordinary.\nSat cat the cat"
+
+
+def fake_model(context_length):
+    # Stands in for np_model.model, always predicts the next token of SCRIPT
+    def model(params, hparams, X, cache, cache_length, pad=None, last_logits_only=False):
+        step = cache_length + X.shape[1] - context_length
+        logits = np.zeros([X.shape[0], 1, len(VOCAB)], dtype=np.float32)
+        logits[:, :, SCRIPT[step] if step < len(SCRIPT) else 0] = 10
+        return logits
+    return model
+
+
+@pytest.mark.parametrize('max_words, generated', [
+    (1, [1]),  # " the", stopped at " extra"
+    (2, [1, 2, 3, 5, 6]),  # "extraordinary" is finished, and its full stop and line break come with it
+    (3, [1, 2, 3, 5, 6, 7]),  # "Sat" starts a word after the line break
+    (100, SCRIPT),
+])
+def test_numpy_sampler_finishes_the_last_word(monkeypatch, max_words, generated):
+    context = np.array([[7, 7], [7, 7]], dtype=np.int32)
+    monkeypatch.setattr(np_sample.np_model, 'model', fake_model(context.shape[1]))
+    monkeypatch.setattr(np_sample.np_model, 'cache_shape', lambda hparams, batch_size, sequence: [1, 1, batch_size, 1])
+
+    out = np_sample.sample_sequence(
+        params=None, hparams={'n_ctx': 64, 'n_vocab': len(VOCAB)}, length=20, context=context, top_k=1,
+        stop_token=0, max_words=np.array([max_words, 100]), word_table=WORD_TABLE,
+    )
+
+    row = out[0, 2:].tolist()
+    assert row[:len(generated)] == generated
+    assert set(row[len(generated):]) <= {0}
+    assert out[1, 2:2 + len(SCRIPT)].tolist() == SCRIPT  # The other row carries on
+
+
+@pytest.mark.parametrize('max_words, generated', [(1, [1]), (2, [1, 2, 3, 5, 6]), (3, [1, 2, 3, 5, 6, 7])])
+def test_tf_sampler_finishes_the_last_word(max_words, generated):
+    sample = pytest.importorskip('sample')
+    tf = sample.tf
+    graph = tf.Graph()
+    with graph.as_default():
+        chunk = tf.constant([SCRIPT[:4], SCRIPT[4:8]], dtype=tf.int32)  # Two chunks, as speculative decoding gives
+        output = tf.zeros([1, 0], dtype=tf.int32)
+        rows = tf.constant([0], dtype=tf.int32)
+        words = tf.zeros([1], dtype=tf.int32)
+        ended_space = tf.ones([1], dtype=tf.bool)
+        stopping = dict(stop_token=0, max_words=tf.constant([max_words]), word_table=tf.constant(WORD_TABLE))
+        output, first_done, words, ended_space = sample.record_tokens(chunk[:1], output, rows, words, ended_space, **stopping)
+        output, second_done, _, _ = sample.record_tokens(chunk[1:], output, rows, words, ended_space, **stopping)
+    with tf.Session(graph=graph) as sess:
+        output, first_done, second_done = sess.run([output, first_done, second_done])
+
+    row = output[0].tolist()
+    assert row[:len(generated)] == generated
+    assert set(row[len(generated):]) <= {0}
+    assert bool(first_done[0] or second_done[0])
+
+
+def test_fill_poem_leaves_out_the_sentence_the_budget_cut():
+    text = 'The cat sat. The dog ran\nThe cat sat. And then the'
+
+    assert functions.fill_poem(text, 10, max_words=len(text.split())) == ('The cat sat\nThe dog ran\n', 16)
+    assert functions.fill_poem(text, 10) == ('The cat sat\nThe dog ran\nAnd then the\n', 19)  # Ended by <|endoftext|>
+
+
+def test_fill_word_budget_leaves_room_for_what_fill_poem_drops():
+    assert functions.fill_word_budget(150) == functions.AI_MAX_POEM_WORDS - 150 + functions.AI_SPARE_WORDS
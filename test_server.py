@@ -0,0 +1,99 @@
+# Tests for server.py's PoemService and handler, with get_data replaced so no network or model is needed
+import json
+import sys
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import pipeline
+import server
+from functions import DEFAULT_POEM_SETTINGS
+
+
+def make_service(**kwargs):
+    return server.PoemService(dict(DEFAULT_POEM_SETTINGS), workers=2, **kwargs)
+
+
+def test_timeout_answers_the_request_and_frees_its_slot(monkeypatch):
+    def get_data(full_name, refresh=False):
+        raise TimeoutError('Connection to wikipedia timed out, please check your internet connection')
+    monkeypatch.setattr(pipeline, 'get_data', get_data)
+    service = make_service(max_pending=1)
+    monkeypatch.setattr(sys, 'stdout', service.output)  # As serve does, so the message goes into the record
+
+    record = service.submit('Ada Lovelace').result(timeout=5)
+
+    assert record['found'] is False
+    assert any('timed out' in message for message in record['messages'])
+    assert service.stats()['pending'] == 0
+    assert service.submit('Alan Turing').result(timeout=5)['found'] is False  # The slot is free again
+
+
+@pytest.mark.parametrize('error', [SystemExit(), KeyboardInterrupt(), ValueError('bad data')])
+def test_any_error_resolves_the_future(monkeypatch, error):
+    def prepare(*args):
+        raise error
+    monkeypatch.setattr(server, 'prepare', prepare)
+    service = make_service(max_pending=1)
+
+    future = service.submit('Ada Lovelace')
+
+    with pytest.raises(Exception):
+        future.result(timeout=5)
+    assert service.stats()['pending'] == 0
+    with pytest.raises(Exception):
+        service.submit('Ada Lovelace').result(timeout=5)  # A new future, not the failed one
+
+
+def test_identical_requests_share_one_poem_and_extra_ones_are_busy(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def get_data(full_name, refresh=False):
+        calls.append(full_name)
+        release.wait(5)
+        raise TimeoutError('Connection to wikipedia timed out, please check your internet connection')
+    monkeypatch.setattr(pipeline, 'get_data', get_data)
+    service = make_service(max_pending=1)
+
+    first = service.submit('Ada Lovelace')
+    second = service.submit('ada lovelace')
+    with pytest.raises(server.Busy):
+        service.submit('Alan Turing')
+    release.set()
+
+    assert first is second
+    assert first.result(timeout=5)['name'] == 'Ada Lovelace'
+    assert calls == ['Ada Lovelace']
+    stats = service.stats()
+    assert (stats['requests'], stats['coalesced'], stats['rejected'], stats['pending']) == (3, 1, 1, 0)
+
+
+def test_handler_answers_503_when_busy(monkeypatch):
+    release = threading.Event()
+
+    def get_data(full_name, refresh=False):
+        release.wait(5)
+        return None
+    monkeypatch.setattr(pipeline, 'get_data', get_data)
+    service = make_service(max_pending=1)
+    handler = type('Handler', (server.PoemHandler,), {'service': service})
+    http_server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{http_server.server_address[1]}/poem?name="
+    try:
+        service.submit('Ada Lovelace')
+        with pytest.raises(urllib.error.HTTPError) as busy:
+            urllib.request.urlopen(url + 'Alan+Turing', timeout=5)
+        assert busy.value.code == 503
+        assert busy.value.headers['Retry-After'] == '1'
+        release.set()
+        with urllib.request.urlopen(url + 'Ada+Lovelace', timeout=5) as response:
+            assert json.load(response)['found'] is False
+    finally:
+        release.set()
+        http_server.shutdown()
+        http_server.server_close()
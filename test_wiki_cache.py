@@ -0,0 +1,134 @@
+# Tests for wiki_cache.py and how get_data_async uses it, with the network calls replaced
+import asyncio
+
+import pytest
+
+import functions
+import wiki_cache
+from wiki_cache import WikiCache
+
+ENTRY = {"title": "Ada Lovelace", "url": "https://en.wikipedia.org/wiki/Ada_Lovelace", "revision": 7, "gender": "female",
+         "career": None, "infobox": "[ Born Augusta Ada Byron 10 December 1815 London, England , Died 27 November 1852 (aged 36) ]"}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Stands in for time.time in wiki_cache, move it on with clock[0] += seconds
+    now = [1000.0]
+    monkeypatch.setattr(wiki_cache.time, 'time', lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = WikiCache(path=None, ttl=60)
+    cache.put('Ada Lovelace', ENTRY)
+
+    clock[0] += 59
+    assert cache.get('  ada  LOVELACE ') == ENTRY
+    clock[0] += 2
+    assert cache.get('Ada Lovelace') is None
+    assert cache.get('Ada Lovelace', stale=True) == ENTRY
+    assert (cache.hits, cache.misses, cache.expired) == (1, 1, 1)
+
+
+def test_renew_restarts_the_ttl(clock):
+    cache = WikiCache(path=None, ttl=60)
+    cache.put('Ada Lovelace', ENTRY)
+    clock[0] += 100
+
+    cache.renew('Ada Lovelace')
+
+    assert cache.get('Ada Lovelace') == ENTRY
+    assert cache.renewed == 1
+
+
+def test_no_ttl_never_expires(clock):
+    cache = WikiCache(path=None, ttl=None)
+    cache.put('Ada Lovelace', ENTRY)
+    clock[0] += 10 ** 9
+
+    assert cache.get('Ada Lovelace') == ENTRY
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = WikiCache(path=None, max_entries=2)
+    for name in ['A', 'B']:
+        clock[0] += 1
+        cache.put(name, dict(ENTRY, title=name))
+    clock[0] += 1
+    cache.get('A')
+    clock[0] += 1
+    cache.put('C', dict(ENTRY, title='C'))
+
+    assert [cache.get(name, stale=True) is not None for name in 'ABC'] == [True, False, True]
+    assert cache.evictions == 1
+
+
+@pytest.mark.parametrize('value, ttl', [('', None), ('none', None), (' None ', None), ('3600', 3600.0), ('0.5', 0.5)])
+def test_ttl_setting(monkeypatch, value, ttl):
+    monkeypatch.setenv('WIKI_CACHE_PATH', '')
+    monkeypatch.setenv('WIKI_CACHE_TTL', value)
+    wiki_cache.get_wiki_cache.cache_clear()
+    try:
+        assert wiki_cache.get_wiki_cache().ttl == ttl
+    finally:
+        wiki_cache.get_wiki_cache.cache_clear()
+
+
+@pytest.fixture
+def offline(monkeypatch, clock):
+    # get_data_async with an in memory cache, no dump index and fake Wikipedia requests, which are counted
+    cache = WikiCache(path=None, ttl=60)
+    requests = {'revision': 0, 'article': 0}
+    current = {'revision': 7}
+
+    async def get_revision_async(title):
+        requests['revision'] += 1
+        return current['revision']
+
+    async def fetch_person_async(full_name):
+        requests['article'] += 1
+        return dict(ENTRY, revision=current['revision'])
+    monkeypatch.setattr(functions, 'get_wiki_cache', lambda: cache)
+    monkeypatch.setattr(functions, 'get_dump_index', lambda: None)
+    monkeypatch.setattr(functions, 'get_revision_async', get_revision_async)
+    monkeypatch.setattr(functions, 'fetch_person_async', fetch_person_async)
+    return cache, requests, current
+
+
+def test_expired_entry_of_an_unchanged_article_is_renewed(offline, clock):
+    cache, requests, current = offline
+    first = asyncio.run(functions.get_data_async('Ada Lovelace'))
+    clock[0] += 30
+    assert asyncio.run(functions.get_data_async('Ada Lovelace')) == first
+    assert requests == {'revision': 0, 'article': 1}
+
+    clock[0] += 100
+    assert asyncio.run(functions.get_data_async('Ada Lovelace')) == first
+    assert requests == {'revision': 1, 'article': 1}
+    assert cache.renewed == 1
+    clock[0] += 30
+    asyncio.run(functions.get_data_async('Ada Lovelace'))
+    assert requests == {'revision': 1, 'article': 1}  # The renewed entry is fresh again
+
+
+def test_expired_entry_of_an_edited_article_is_fetched_again(offline, clock):
+    cache, requests, current = offline
+    asyncio.run(functions.get_data_async('Ada Lovelace'))
+    clock[0] += 100
+    current['revision'] = 8
+
+    asyncio.run(functions.get_data_async('Ada Lovelace'))
+
+    assert requests == {'revision': 1, 'article': 2}
+    assert cache.renewed == 0
+    assert cache.get('Ada Lovelace')['revision'] == 8
+
+
+def test_refresh_skips_the_cache(offline):
+    cache, requests, current = offline
+    asyncio.run(functions.get_data_async('Ada Lovelace'))
+
+    asyncio.run(functions.get_data_async('Ada Lovelace', refresh=True))
+
+    assert requests == {'revision': 0, 'article': 2}
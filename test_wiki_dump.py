@@ -0,0 +1,138 @@
+# Tests for wiki_dump.py: infobox wikitext rendered into the text dates.py and careers.py read, and a small multistream
+# dump split into chunks and indexed by a pool of processes
+import bz2
+import html
+import os
+
+import pytest
+
+import wiki_dump
+from careers import classify_career
+from dates import extract_dates
+
+PEOPLE = {
+    'Albert Einstein': """{{Short description|German-born physicist (1879–1955)}}
+{{Infobox scientist
+| name = Albert Einstein
+| image = Einstein 1921 by F Schmutzer - restoration.jpg
+| birth_date = {{Birth date|df=yes|1879|3|14}}
+| birth_place = [[Ulm]], [[Kingdom of Württemberg]], [[German Empire]]
+| death_date = {{Death date and age|df=yes|1955|4|18|1879|3|14}}
+| death_place = [[Princeton, New Jersey]], U.S.
+| fields = [[Physics]], [[philosophy]]<ref>{{cite web|url=https://example.org|title=Fields}}</ref>
+| awards = [[Nobel Prize in Physics]] (1921)
+}}
+'''Albert Einstein''' was a German-born [[theoretical physicist]]. He developed [[relativity]].""",
+    'Barack Obama': """{{Infobox officeholder
+| name = Barack Obama
+| office = 44th [[President of the United States]]
+| term_start = {{start date|2009|1|20}}
+| term_end = {{end date|2017|1|20}}
+| birth_date = {{birth date and age|1961|8|4}}
+| birth_place = [[Honolulu]], Hawaii, U.S.
+}}
+'''Barack Hussein Obama II''' is an American politician. His father was Kenyan.""",
+    'Erwin Rommel': """{{Infobox person
+| name = Erwin Rommel
+| birth_date = {{Birth date|1891|11|15|df=y}}<!-- 16 November in some sources -->
+| death_date = {{Death date and age|1944|10|14|1891|11|15|df=y}}
+| module = {{Infobox military person
+ | embed = yes
+ | allegiance = {{flag|German Empire}}
+ | rank = [[Generalfeldmarschall]]
+}}
+}}
+'''Johannes Erwin Eugen Rommel''' was a German [[general]]. He served in both wars.""",
+    'William Shakespeare': """{{Infobox person
+| name = William Shakespeare
+| birth_date = {{circa}} 23 April 1564 (baptised)<!-- 26 April -->
+| death_date = 23 April 1616 (aged 52)
+| occupation = {{hlist|Playwright|poet|actor}}
+}}
+'''William Shakespeare''' was an English [[playwright]]. He is widely regarded as the greatest writer.""",
+}
+REDIRECTS = {'Einstein': 'Albert Einstein', 'Obama': 'Barack Obama#Early life', 'Physics': 'Physics (science)'}
+
+
+@pytest.mark.parametrize('title, gender, birth, death, career, subscience', [
+    ('Albert Einstein', 'male', '1879-03-14', '1955-04-18', 'scientist', 'physics'),
+    ('Barack Obama', 'male', '1961-08-04', None, 'politician', None),
+    ('Erwin Rommel', 'male', '1891-11-15', '1944-10-14', 'military personnel', None),  # The rows of the embedded infobox
+    ('William Shakespeare', 'male', '1564-04-23', '1616-04-23', 'actor', None),
+])
+def test_infobox_is_read_like_the_article(title, gender, birth, death, career, subscience):
+    entry = wiki_dump.read_person(title, 7, PEOPLE[title])
+
+    born, died = extract_dates(entry['infobox'])
+    assert (entry['title'], entry['gender'], entry['revision']) == (title, gender, 7)
+    assert (str(born[0]), str(died[0]) if died else None) == (birth, death)
+    assert classify_career(entry['infobox']) == (career, subscience)
+    assert not any(markup in entry['infobox'] for markup in ['{{', '[[', '<ref', 'cite', '<!--', 'November in some', '26 April'])
+
+
+def test_pages_that_are_not_people_are_skipped():
+    assert wiki_dump.read_person('Ulm', 1, "{{Infobox German location\n| name = Ulm\n}}\n'''Ulm''' is a city.") is None
+    assert wiki_dump.read_person('Ada', 1, "{{Infobox person\n| birth_date = 1815\n}}\n'''Ada''' was a mathematician.") is None
+
+
+def page(title, text, page_id, redirect=None, namespace=0):
+    redirected = f'<redirect title="{html.escape(redirect)}" />' if redirect else ''
+    return (f'<page><title>{html.escape(title)}</title><ns>{namespace}</ns><id>{page_id}</id>{redirected}'
+            f'<revision><id>{page_id * 10}</id><text>{html.escape(text)}</text></revision></page>\n')
+
+
+@pytest.fixture
+def dump(tmp_path):
+    # A multistream dump of three copies of the people, their redirects and other pages, 5 pages to a stream,
+    # returns its path, the number of pages and the titles of the people
+    pages, people = [], []
+    for copy in range(3):
+        suffix = f' {copy}' if copy else ''
+        for title, text in PEOPLE.items():
+            pages.append(page(title + suffix, text, len(pages) + 1))
+            people.append(title + suffix)
+        for title, target in REDIRECTS.items():
+            target = target.replace('#', suffix + '#') if '#' in target else target + suffix
+            pages.append(page(title + suffix, f'#REDIRECT [[{target}]]', len(pages) + 1, redirect=target))
+        for i in range(8):
+            pages.append(page(f'Thing {copy} {i}', 'An article about a thing, which he never read. ' * 50, len(pages) + 1))
+        pages.append(page(f'Talk:Albert Einstein{suffix}', PEOPLE['Albert Einstein'], len(pages) + 1, namespace=1))
+    path = os.path.join(tmp_path, 'dump.xml.bz2')
+    with open(path, 'wb') as f:
+        f.write(bz2.compress(b'<mediawiki>\n<siteinfo><sitename>Wikipedia</sitename></siteinfo>\n'))
+        for start in range(0, len(pages), 5):
+            f.write(bz2.compress(''.join(pages[start:start + 5]).encode()))
+        f.write(bz2.compress(b'</mediawiki>\n'))
+    return path, len(pages), people
+
+
+def test_chunks_read_every_page_once(dump):
+    path, pages, people = dump
+    size = os.path.getsize(path)
+    chunk_size = size // 7 + 1
+
+    found, read = [], 0
+    for start in range(0, size, chunk_size):
+        chunk_people, _, chunk_pages = wiki_dump.read_range(path, start, min(start + chunk_size, size))
+        found += [title for _, title, _, _ in chunk_people]
+        read += chunk_pages
+
+    assert read == pages
+    assert sorted(found) == sorted(people)
+
+
+def test_build_index_with_a_pool(dump, tmp_path):
+    path, pages, people = dump
+
+    index = wiki_dump.build_index(path, os.path.join(tmp_path, 'index.sqlite'), workers=2, chunk_size=os.path.getsize(path) // 7 + 1)
+
+    assert index.stats()['people'] == len(people)
+    assert index.stats()['redirects'] == 6  # The ones to Physics (science), which is not indexed, are pruned
+    for title in people:
+        assert index.get(title)['title'] == title
+    assert index.get('albert_EINSTEIN  ')['revision'] == 10
+    assert index.get('Einstein 2')['title'] == 'Albert Einstein 2'
+    assert index.get('Obama 1')['title'] == 'Barack Obama 1'
+    assert index.get('Physics') is None
+    assert index.get('Thing 0 1') is None
+    assert index.get('Talk:Albert Einstein') is None
@@ -0,0 +1,82 @@
+# Tensorflow backend of the Generator, runs model.py and sample.py in a session that stays open between poems
+import os
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # suppresses tensorflow info and warning messages from showing to the end user
+import tensorflow.compat.v1 as tf
+tf.get_logger().setLevel('ERROR')
+tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.ERROR)
+
+import model, sample  # importing the AI functions
+from generator import Generator, load_hparams, word_table
+
+
+class TFGenerator(Generator):
+    """
+    Builds the tensorflow graph and restores the checkpoint once, every generate call reuses the same session.
+    :model_name=774M : String, which model to use
+    :draft_model_name=None : String, a smaller model with the same vocabulary (e.g. 124M) that proposes tokens
+     for model_name to check, see sample.sample_sequence_speculative. None to sample from model_name alone.
+    :draft_length=4 : Number of tokens the draft model proposes per round
+    """
+    def __init__(self, model_name='774M', draft_model_name=None, draft_length=4):
+        super().__init__(model_name)
+        self.draft_model_name = draft_model_name
+        self.draft_length = draft_length
+        self.graph = tf.Graph()
+        self.sess = tf.Session(graph=self.graph)
+        self.outputs = {}  # Sampling graphs already built, keyed by their sampling settings
+        with self.graph.as_default():
+            self.context = tf.placeholder(tf.int32, [None, None])
+            self.length = tf.placeholder(tf.int32, [])  # Fed per call so a new length does not need a new graph
+            self.pad = tf.placeholder(tf.int32, [None])  # Number of left padding tokens in front of each prompt
+            self.max_words = tf.placeholder(tf.int32, [None])  # Word budget of each prompt
+            self.word_table = tf.constant(word_table(self.enc), dtype=tf.bool)
+            self.all_logits = model.model(hparams=self.hparams, X=self.context)['logits']  # Creates the model variables so they can be restored
+            saver = tf.train.Saver(var_list=tf.global_variables('model/'))  # adds loaded model to tensorflow
+            ckpt = tf.train.latest_checkpoint(os.path.join('models', model_name))
+            saver.restore(self.sess, ckpt)
+            if draft_model_name is not None:
+                self.draft_hparams = load_hparams(draft_model_name)
+                assert self.draft_hparams['n_vocab'] == self.hparams['n_vocab'], 'The draft model must use the same vocabulary!'
+                model.model(hparams=self.draft_hparams, X=self.context, scope='draft')
+                # The draft checkpoint names its variables model/..., they are restored into draft/...
+                draft_saver = tf.train.Saver(var_list={'model' + v.op.name[len('draft'):]: v for v in tf.global_variables('draft/')})
+                draft_saver.restore(self.sess, tf.train.latest_checkpoint(os.path.join('models', draft_model_name)))
+
+    def _get_output(self, temperature, top_k, top_p, padded):
+        # Builds the sampling loop for a set of settings the first time it is asked for, reusing the loaded weights
+        # Prompts of equal length are not padded, which lets the decode steps skip the attention mask
+        key = (float(temperature), int(top_k), float(top_p), padded)
+        if key not in self.outputs:
+            with self.graph.as_default():
+                if self.draft_model_name is None:
+                    self.outputs[key] = sample.sample_sequence(
+                        hparams=self.hparams, length=self.length,
+                        context=self.context,
+                        batch_size=None,
+                        temperature=temperature, top_k=top_k, top_p=top_p,
+                        pad=self.pad if padded else None,
+                        stop_token=self.stop_token, max_words=self.max_words, word_table=self.word_table
+                    )
+                else:
+                    self.outputs[key] = sample.sample_sequence_speculative(
+                        hparams=self.hparams, draft_hparams=self.draft_hparams, length=self.length,
+                        context=self.context, draft_length=self.draft_length,
+                        batch_size=None,
+                        temperature=temperature, top_k=top_k, top_p=top_p,
+                        pad=self.pad if padded else None,
+                        stop_token=self.stop_token, max_words=self.max_words, word_table=self.word_table
+                    )
+        return self.outputs[key]
+
+    def _sample(self, context, pad, max_words, length, temperature, top_k, top_p):
+        output = self._get_output(temperature, top_k, top_p, padded=any(pad))
+        return self.sess.run(output, feed_dict={  # runs encoded poems though tensorflow model to create predictions
+            self.context: context,
+            self.pad: pad,
+            self.max_words: max_words,
+            self.length: length
+        })
+
+    def logits(self, tokens):
+        # Logits of every position of a list of token lists, used to check other backends against this one
+        return self.sess.run(self.all_logits, feed_dict={self.context: tokens})
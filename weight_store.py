@@ -0,0 +1,74 @@
+# Saves model weights as one flat file that can be memory mapped, e.g: weight_store.py 774M int8
+# Loading maps the file instead of reading it, so start up is almost instant and every process on the
+# machine that uses the same file shares one copy of the weights through the page cache.
+# File layout: magic, header length (uint64), a json header of tensor name -> offset, shape and dtype,
+# then the raw data of every tensor, each starting at a multiple of ALIGNMENT bytes.
+import json
+import os
+import struct
+import sys
+import numpy as np
+
+MAGIC = b'GPT2WTS1'
+ALIGNMENT = 64  # Cache line size, also keeps every tensor aligned for its dtype
+
+
+def store_path(model_name, weights='float32'):
+    return os.path.join('models', model_name, f'model.{weights}.weights')
+
+
+def align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_store(params, path):
+    # Writes a dict of tensor name -> numpy array to path
+    index = {}
+    offset = 0
+    for name, w in params.items():
+        index[name] = {'offset': offset, 'shape': list(w.shape), 'dtype': np.dtype(w.dtype).newbyteorder('<').str}
+        offset = align(offset + w.nbytes)
+    header = json.dumps(index).encode('utf-8')
+    data_start = align(len(MAGIC) + 8 + len(header))
+    with open(path + '.tmp', 'wb') as f:  # Written next to the final file and renamed so readers never see half a file
+        f.write(MAGIC + struct.pack('<Q', len(header)) + header)
+        for name, w in params.items():
+            f.seek(data_start + index[name]['offset'])
+            f.write(np.ascontiguousarray(w, dtype=index[name]['dtype']).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(path + '.tmp', path)
+
+
+def open_store(path):
+    # Returns a dict of tensor name -> read only numpy array backed by the memory mapped file (nothing is copied)
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a weight store")
+        header_length = struct.unpack('<Q', f.read(8))[0]
+        index = json.loads(f.read(header_length))
+    data_start = align(len(MAGIC) + 8 + header_length)
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    params = {}
+    for name, entry in index.items():
+        dtype = np.dtype(entry['dtype'])
+        count = int(np.prod(entry['shape'], dtype=np.int64))
+        start = data_start + entry['offset']
+        params[name] = data[start:start + count * dtype.itemsize].view(dtype).reshape(entry['shape'])
+    return params
+
+
+if __name__ == '__main__':
+    import checkpoint
+    import quantize
+
+    if len(sys.argv) not in (2, 3) or (len(sys.argv) == 3 and sys.argv[2] not in ('float32', 'int8', 'bfloat16')):
+        print('You must enter the model name and optionally float32, int8 or bfloat16 as parameters, e.g.: weight_store.py 774M int8')
+        sys.exit(1)
+
+    model_name = sys.argv[1]
+    weights = sys.argv[2] if len(sys.argv) == 3 else 'float32'
+    params = checkpoint.read_checkpoint(checkpoint.latest_checkpoint(os.path.join('models', model_name)))
+    if weights != 'float32':
+        params = quantize.quantize_params(params, weights)
+    write_store(params, store_path(model_name, weights))
+    print(f"Saved {store_path(model_name, weights)} ({os.path.getsize(store_path(model_name, weights)) / 2**20:.0f}MB)")
@@ -0,0 +1,121 @@
+# Keeps what get_data fetched from Wikipedia in a local SQLite file, so names that were looked up before need no network
+# An entry holds the article a name resolved to, its revision, the fields taken from the page and the cleaned infobox text,
+# the poem data itself is worked out again from these on every lookup so ages stay current
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+DEFAULT_PATH = os.path.join('cache', 'wikipedia.sqlite')
+DEFAULT_TTL = 7 * 24 * 60 * 60  # Seconds an entry is used for before the article is fetched again
+DEFAULT_MAX_ENTRIES = 10000
+
+
+class WikiCache:
+    """
+    Wikipedia lookups keyed by the name they were made with.
+    :path=cache/wikipedia.sqlite : String, file the cache is kept in, None to keep it in memory only
+    :ttl=7 days : Seconds before an entry expires, None for never
+    :max_entries=10000 : Least recently used entries are removed past this many
+    """
+    def __init__(self, path=DEFAULT_PATH, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        if path is not None and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path or ':memory:', check_same_thread=False)
+        if path is not None:
+            # Lookups from several processes (see get_data_many) read while another writes, and a commit does not wait for the disk
+            self.db.execute("PRAGMA journal_mode = WAL")
+            self.db.execute("PRAGMA synchronous = NORMAL")
+        self.lock = threading.RLock()  # get_data can run on several threads (see pipeline.py), which share this connection
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "name TEXT PRIMARY KEY, title TEXT, url TEXT, revision INTEGER, entry TEXT, fetched REAL, used REAL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS pages_used ON pages (used)")
+        self.db.commit()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.renewed = 0  # Expired entries whose article had not changed
+        self.evictions = 0
+
+    @staticmethod
+    def key(name):
+        # Lookups differing only in case or spacing find the same article
+        return ' '.join(name.lower().split())
+
+    def get(self, name, stale=False):
+        """
+        Returns the entry stored for name, or None when there is none or it has expired.
+        With stale, expired entries are returned too (without counting towards the statistics),
+        so one whose article has not been edited since can be renewed instead of fetched again.
+        """
+        with self.lock:
+            key = self.key(name)
+            row = self.db.execute("SELECT entry, fetched FROM pages WHERE name = ?", (key,)).fetchone()
+            if stale:
+                return None if row is None else json.loads(row[0])
+            if row is None:
+                self.misses += 1
+                return None
+            if self.ttl is not None and time.time() - row[1] > self.ttl:
+                self.expired += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute("UPDATE pages SET used = ? WHERE name = ?", (time.time(), key))
+            self.db.commit()
+            return json.loads(row[0])
+
+    def put(self, name, entry):
+        # Stores entry (a dict with at least title, url and revision) for name, then evicts past max_entries
+        with self.lock:
+            now = time.time()
+            self.db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.key(name), entry['title'], entry['url'], entry['revision'], json.dumps(entry), now, now)
+            )
+            excess = len(self) - self.max_entries
+            if excess > 0:
+                self.db.execute("DELETE FROM pages WHERE name IN (SELECT name FROM pages ORDER BY used LIMIT ?)", (excess,))
+                self.evictions += excess
+            self.db.commit()
+
+    def renew(self, name):
+        # Restarts the ttl of an entry, used when its article is still at the stored revision
+        with self.lock:
+            now = time.time()
+            self.db.execute("UPDATE pages SET fetched = ?, used = ? WHERE name = ?", (now, now, self.key(name)))
+            self.db.commit()
+            self.renewed += 1
+
+    def clear(self):
+        with self.lock:
+            self.db.execute("DELETE FROM pages")
+            self.db.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def stats(self):
+        return {'entries': len(self), 'hits': self.hits, 'misses': self.misses, 'expired': self.expired, 'renewed': self.renewed, 'evictions': self.evictions}
+
+
+def read_ttl(value):
+    # Seconds from WIKI_CACHE_TTL, where an empty value or none means entries never expire
+    return None if value.strip().lower() in ('', 'none') else float(value)
+
+
+@lru_cache()
+def get_wiki_cache():
+    # One cache per process, the settings can be changed with the WIKI_CACHE_PATH, WIKI_CACHE_TTL and WIKI_CACHE_MAX_ENTRIES environment variables
+    return WikiCache(
+        path=os.environ.get('WIKI_CACHE_PATH', DEFAULT_PATH),
+        ttl=read_ttl(os.environ.get('WIKI_CACHE_TTL', str(DEFAULT_TTL))),
+        max_entries=int(os.environ.get('WIKI_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+    )
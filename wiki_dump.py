@@ -0,0 +1,420 @@
+# Builds an offline index of the people on Wikipedia from a dump of its articles, which get_data then uses instead of the
+# live site (no network, and thousands of names a second). Download enwiki-latest-pages-articles-multistream.xml.bz2 from
+# https://dumps.wikimedia.org/enwiki/latest/ and index it with e.g: wiki_dump.py enwiki-latest-pages-articles-multistream.xml.bz2 --workers 8
+# then look a name up with: wiki_dump.py --lookup "Marie Curie"
+# A multistream dump is thousands of bz2 streams of 100 pages each, so the file is split into byte ranges and a pool of
+# processes each decompress the streams starting in one range, a page at a time. The biography infoboxes found are turned
+# into the same entry fetch_person makes from the article's html (the template's parameters are rendered as the infobox
+# rows, so dates.py and careers.py read them the same) and written to one SQLite file, keyed by the normalized title and
+# by every title redirecting to it
+import argparse
+import bz2
+import html
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+from functools import lru_cache
+from multiprocessing import Pool
+from urllib.parse import quote
+from xml.etree import ElementTree
+
+import infobox
+from wiki_cache import WikiCache
+
+INDEX_PATH = os.path.join('data', 'wikipedia-dump.sqlite')
+CHUNK_SIZE = 16 * 2**20  # Compressed bytes of the dump each process is given at a time
+READ_SIZE = 2**20
+STREAM_START = re.compile(rb'BZh[1-9]1AY&SY')  # Header of a bz2 stream and of its first block
+GENDERS = {'she': 'female', 'her': 'female', 'he': 'male', 'his': 'male'}
+
+INFOBOX = re.compile(r'\{\{\s*infobox[ _]*([^|}<\n]*)', re.IGNORECASE)
+BRACES = re.compile(r'\{\{|\}\}')
+SEPARATORS = re.compile(r'\{\{|\}\}|\[\[|\]\]|\|')
+COMMENT = re.compile(r'<!--.*?(?:-->|$)', re.DOTALL)
+REFERENCE = re.compile(r'<ref[^>]*/>|<ref[^>]*>.*?(?:</ref>|$)', re.DOTALL | re.IGNORECASE)
+FILE_LINK = re.compile(r'\[\[\s*(?:file|image|category)\s*:[^\[\]]*\]\]', re.IGNORECASE)
+LINK = re.compile(r'\[\[(?:[^\[\]|]*\|)?([^\[\]|]*)\]\]')
+EXTERNAL_LINK = re.compile(r'\[(?:https?:)?//[^ \]]*(?: ([^\]]*))?\]')
+TEMPLATE = re.compile(r'\{\{([^{}]*)\}\}')  # One with no template inside it
+TAG = re.compile(r'<[^<>]*>')
+LIST_ITEM = re.compile(r'^[*#:;]+', re.MULTILINE)
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December']
+
+# Date templates -> whether they are a birth or death date, which the infobox shows with the date in the iso form too
+DATE_TEMPLATES = {'birth date': 'born', 'birth date and age': 'born', 'bda': 'born', 'dob': 'born', 'birth date and age2': 'born',
+                  'death date': 'died', 'death date and age': 'died', 'dda': 'died', 'start date': None, 'end date': None}
+YEAR_TEMPLATES = {'birth year', 'birth year and age', 'death year', 'death year and age', 'birth based on age as of date'}
+TEXT_DATE_TEMPLATES = {'birth-date', 'birth-date and age', 'death-date', 'death-date and age'}
+LIST_TEMPLATES = {'hlist', 'flatlist', 'plainlist', 'ubl', 'unbulleted list', 'bulleted list', 'plain list', 'indented plainlist', 'nowrap', 'nobr', 'small', 'big', 'longitem'}
+# Footnotes and maintenance tags, which show as nothing (or only as a footnote mark) in the infobox
+HIDDEN_TEMPLATES = {'efn', 'efn-ua', 'efn-lr', 'sfn', 'sfnp', 'refn', 'r', 'rp', 'citation needed', 'cn', 'clarify', 'dubious', 'when', 'by whom',
+                    'better source needed', 'failed verification', 'use dmy dates', 'use mdy dates', 'short description'}
+# Parameters that are shown together in one row, e.g. the Born row is the birth name, date and place
+ROW_GROUPS = {'birth_name': 'Born', 'birth_date': 'Born', 'birth_place': 'Born', 'death_date': 'Died', 'death_place': 'Died'}
+LABELS = {'death_cause': 'Cause of death', 'resting_place': 'Resting place', 'alma_mater': 'Alma mater', 'known_for': 'Known for',
+          'serviceyears': 'Years of service', 'branch': 'Service / branch', 'battles': 'Battles / wars', 'years_active': 'Years active',
+          'spouse': 'Spouse(s)', 'doctoral_advisor': 'Doctoral advisor', 'notable_works': 'Notable works', 'instrument': 'Instruments',
+          'instruments': 'Instruments'}
+HIDDEN_PARAMETERS = {'image', 'image_size', 'imagesize', 'image_upright', 'upright', 'alt', 'caption', 'signature', 'signature_alt',
+                     'signature_size', 'embed', 'child', 'footnotes', 'website', 'url', 'landscape', 'honorific_prefix', 'honorific_suffix'}
+# Headers some kinds of infobox show, which careers.py looks for
+HEADERS = {'scientist': 'Scientific career', 'military person': 'Military service', 'officeholder': 'Personal details'}
+# The kind of infobox that gives away the career, like the class of its table does for fetch_person
+CAREERS = {'musical artist': 'musician'}
+
+
+def key(name):
+    # Titles and names differing only in case, spacing or underscores for spaces find the same person
+    return WikiCache.key(name.replace('_', ' '))
+
+
+def find_stream(f, position, end):
+    # Offset of the first bz2 stream that starts at or after position and before end, None if there is none
+    f.seek(position)
+    tail = b''
+    while position < end:
+        data = f.read(READ_SIZE)
+        if not data:
+            return None
+        found = STREAM_START.search(tail + data)
+        if found is not None:
+            offset = position - len(tail) + found.start()
+            return offset if offset < end else None
+        tail = data[-9:]
+        position += len(data)
+    return None
+
+
+def decompress(path, start, end):
+    # Yields the decompressed xml of every bz2 stream that starts between start and end of the file, a piece at a time.
+    # A stream starting in the range is read to its end, so each one is read by exactly one range
+    with open(path, 'rb') as f:
+        offset = find_stream(f, start, end)
+        if offset is None:
+            return
+        f.seek(offset)
+        decompressor = bz2.BZ2Decompressor()
+        while True:
+            data = f.read(READ_SIZE)
+            if not data:
+                return
+            while data:
+                yield decompressor.decompress(data)
+                if not decompressor.eof:
+                    break
+                data = decompressor.unused_data  # The start of the next stream
+                if f.tell() - len(data) >= end:
+                    return
+                decompressor = bz2.BZ2Decompressor()
+
+
+def read_pages(pieces):
+    # Yields each <page> element of the xml, parsed on its own as soon as it is complete
+    buffer = b''
+    for piece in pieces:
+        buffer += piece
+        start = 0
+        while True:
+            begin = buffer.find(b'<page>', start)
+            end = buffer.find(b'</page>', begin) if begin >= 0 else -1
+            if end < 0:
+                break
+            yield ElementTree.fromstring(buffer[begin:end + 7])
+            start = end + 7
+        buffer = buffer[start:]
+
+
+def template_end(text, start):
+    # Position just past the }} closing the template whose {{ is at start, None if it is never closed
+    depth = 0
+    for brace in BRACES.finditer(text, start):
+        depth += 1 if brace.group(0) == '{{' else -1
+        if depth == 0:
+            return brace.end()
+    return None
+
+
+def split_parameters(body):
+    # The |-separated parts of a template's text, not counting the | of templates and links inside it
+    parts = []
+    depth = 0
+    last = 0
+    for separator in SEPARATORS.finditer(body):
+        token = separator.group(0)
+        if token in ('{{', '[['):
+            depth += 1
+        elif token in ('}}', ']]'):
+            depth = max(depth - 1, 0)
+        elif depth == 0:
+            parts.append(body[last:separator.start()])
+            last = separator.end()
+    parts.append(body[last:])
+    return parts
+
+
+def render_date(kind, numbers, named):
+    # The text a date template shows, e.g. ( 1879-03-14 ) 14 March 1879 for a birth date and 18 April 1955 (1955-04-18) for a death
+    # date, with the day first when df= is set like the template does. Only the parts given are shown
+    try:
+        numbers = [int(number) for number in numbers[:3] if number.strip()]
+    except ValueError:
+        return ' '.join(numbers)
+    if not numbers:
+        return ''
+    if len(numbers) == 1 or not 1 <= numbers[1] <= 12:
+        return str(numbers[0])
+    if len(numbers) == 2:
+        return f'{MONTH_NAMES[numbers[1] - 1]} {numbers[0]}'
+    year, month, day = numbers
+    iso = f'{year:04d}-{month:02d}-{day:02d}'
+    dmy = named.get('df', '').strip().lower() in ('y', 'yes', 'true', '1')
+    shown = f'{day} {MONTH_NAMES[month - 1]} {year}' if dmy else f'{MONTH_NAMES[month - 1]} {day}, {year}'
+    if kind is None:
+        return shown
+    return f'( {iso} ) {shown}' if kind == 'born' else f'{shown} ({iso})'
+
+
+def render_template(body):
+    # The text a template with no templates inside it shows in the infobox, as far as it matters for the poem
+    name, *parts = body.split('|')
+    name = ' '.join(name.replace('_', ' ').lower().split())
+    positional = [part.strip() for part in parts if '=' not in part]
+    named = dict(part.split('=', 1) for part in parts if '=' in part)
+    named = {option.strip().lower(): value.strip() for option, value in named.items()}
+    if name in DATE_TEMPLATES:
+        return render_date(DATE_TEMPLATES[name], positional, named)
+    if name in YEAR_TEMPLATES:
+        return positional[0] if positional else ''
+    if name in TEXT_DATE_TEMPLATES:
+        return positional[0] if positional else ''
+    if name in ('circa', 'c.'):
+        return 'c. ' + ' '.join(positional)
+    if name in HIDDEN_TEMPLATES:
+        return ''
+    if name == 'lang':
+        return positional[-1] if positional else ''
+    if name in LIST_TEMPLATES:
+        return ' '.join(positional)
+    return ' '.join(positional[:1])  # e.g. the country of {{flag|France}}
+
+
+def plain_text(wikitext):
+    # The text wikitext shows, without footnotes, images, markup or html, on one line
+    text = LIST_ITEM.sub(' ', REFERENCE.sub('', COMMENT.sub('', wikitext)))
+    links = -1
+    while links:  # Innermost first, a link can be in the caption of an image
+        text, files = FILE_LINK.subn('', text)
+        text, links = LINK.subn(r'\1', text)
+        links += files
+    text = EXTERNAL_LINK.sub(lambda link: link.group(1) or '', text)
+    templates = -1
+    while templates:
+        text, templates = TEMPLATE.subn(lambda template: render_template(template.group(1)), text)
+    text = TAG.sub(' ', text)
+    text = html.unescape(text.replace("'''", '').replace("''", ''))
+    return ' '.join(text.split())
+
+
+def infobox_rows(kind, parameters):
+    # The (label, value) rows the infobox shows for its parameters (name -> wikitext, in the template's order),
+    # infoboxes embedded in a module parameter add their rows where they are
+    rows = []
+    groups = {}
+    for name, value in parameters.items():
+        if name in HIDDEN_PARAMETERS or not value.strip():
+            continue
+        embedded = INFOBOX.search(value)
+        if name.startswith('module') or embedded is not None and embedded.start() == value.find('{{'):
+            if embedded is not None:
+                end = template_end(value, embedded.start()) or len(value)
+                rows += infobox_rows(*read_infobox(value[embedded.start():end]))
+            continue
+        text = plain_text(value)
+        if not text:
+            continue
+        base = name.rstrip('0123456789')
+        if name in ROW_GROUPS:
+            label = ROW_GROUPS[name]
+            if label in groups:
+                groups[label][1].append(text)
+                continue
+            groups[label] = (len(rows), [text])
+            rows.append(None)
+        elif base in ('name', 'office'):
+            rows.append(('', text))
+        elif base in ('term_start', 'term'):
+            ended = parameters.get(name.replace('start', 'end'), '').strip()
+            rows.append(('In office' if ended else 'Assumed office', f'{text} – {plain_text(ended)}' if ended else text))
+        elif base == 'term_end':
+            continue
+        else:
+            rows.append((LABELS.get(base, base.replace('_', ' ').strip().capitalize()), text))
+    for label, (position, texts) in groups.items():
+        rows[position] = (label, ' '.join(texts))
+    if kind in HEADERS:  # Last, so the row before it still ends with a comma for careers.FIELDS
+        rows.append(('', HEADERS[kind]))
+    return rows
+
+
+def read_infobox(template):
+    # (kind, parameters) of an infobox template's wikitext, the kind in lower case (e.g. scientist, "" for a plain {{Infobox}})
+    parts = split_parameters(template[2:-2])
+    kind = ' '.join(INFOBOX.match(template).group(1).replace('_', ' ').lower().split())
+    parameters = {}
+    for part in parts[1:]:
+        if '=' in part:
+            name, value = part.split('=', 1)
+            parameters[' '.join(name.lower().split()).replace(' ', '_')] = value
+    return kind, parameters
+
+
+def read_person(title, revision, wikitext):
+    """
+    The entry fetch_person would make from the article (title, url, revision, gender, career and infobox text),
+    or None if it is not about a person: it has no infobox with a birth or death date, or its lead has no pronoun.
+    """
+    found = INFOBOX.search(wikitext)
+    if found is None:
+        return None
+    end = template_end(wikitext, found.start())
+    if end is None:
+        return None
+    kind, parameters = read_infobox(wikitext[found.start():end])
+    if not any(parameters.get(name, '').strip() for name in ('birth_date', 'death_date')):
+        return None
+    lead = wikitext[end:].split('\n==', 1)[0]
+    pronoun = infobox.PRONOUNS.search(plain_text(lead))
+    if pronoun is None:
+        return None
+    return {
+        "title": title,
+        "url": 'https://en.wikipedia.org/wiki/' + quote(title.replace(' ', '_')),
+        "revision": revision,
+        "gender": GENDERS[pronoun.group(0).lower()],
+        "career": CAREERS.get(kind),
+        "infobox": infobox.infobox_text(infobox_rows(kind, parameters)),
+    }
+
+
+def read_range(path, start, end):
+    # Reads the articles of the streams starting between start and end, returns (people, redirects, pages read):
+    # people as (key, title, revision, entry json) and redirects as (key, key of the target)
+    people, redirects, pages = [], [], 0
+    for page in read_pages(decompress(path, start, end)):
+        pages += 1
+        if page.findtext('ns') != '0':
+            continue
+        title = page.findtext('title')
+        redirect = page.find('redirect')
+        if redirect is not None:
+            redirects.append((key(title), key(redirect.get('title', '').split('#')[0])))
+            continue
+        revision = page.findtext('revision/id')
+        entry = read_person(title, int(revision) if revision else None, page.findtext('revision/text') or '')
+        if entry is not None:
+            people.append((key(title), title, entry['revision'], json.dumps(entry)))
+    return people, redirects, pages
+
+
+def read_range_task(task):
+    return read_range(*task)
+
+
+class DumpIndex:
+    """
+    People from a Wikipedia dump keyed by their normalized title and by the titles redirecting to them.
+    get(name) returns the entry fetch_person would make from the article, so get_data can use either.
+    :path=data/wikipedia-dump.sqlite : String, file the index is kept in
+    """
+    def __init__(self, path=INDEX_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.RLock()  # get_data can run on several threads (see pipeline.py), which share this connection
+        self.db.execute("CREATE TABLE IF NOT EXISTS people (key TEXT PRIMARY KEY, title TEXT, revision INTEGER, entry TEXT)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS redirects (key TEXT PRIMARY KEY, target TEXT)")
+        self.db.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name):
+        # The entry of the person whose title name is, or whose article it redirects to, None if there is none
+        with self.lock:
+            name = key(name)
+            row = self.db.execute(
+                "SELECT entry FROM people WHERE key = ? UNION ALL "
+                "SELECT entry FROM people WHERE key = (SELECT target FROM redirects WHERE key = ?)", (name, name)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return json.loads(row[0])
+
+    def add(self, people, redirects):
+        # Stores the results of read_range, an article found earlier in the dump is kept over a later one with the same key
+        with self.lock:
+            self.db.executemany("INSERT OR IGNORE INTO people VALUES (?, ?, ?, ?)", people)
+            self.db.executemany("INSERT OR IGNORE INTO redirects VALUES (?, ?)", redirects)
+            self.db.commit()
+
+    def prune(self):
+        # Removes the redirects to articles that are not about people (most of them), once the whole dump has been read
+        with self.lock:
+            self.db.execute("DELETE FROM redirects WHERE target NOT IN (SELECT key FROM people) OR key IN (SELECT key FROM people)")
+            self.db.commit()
+            self.db.execute("VACUUM")
+
+    def stats(self):
+        with self.lock:
+            people = self.db.execute("SELECT COUNT(*) FROM people").fetchone()[0]
+            redirects = self.db.execute("SELECT COUNT(*) FROM redirects").fetchone()[0]
+        return {'people': people, 'redirects': redirects, 'hits': self.hits, 'misses': self.misses}
+
+
+@lru_cache()
+def get_dump_index(path=INDEX_PATH):
+    # One index per process
+    return DumpIndex(path)
+
+
+def build_index(dump_path, index_path=INDEX_PATH, workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Reads a bz2 Wikipedia dump (pages-articles, ideally the multistream one) into the index at index_path, with a pool of processes.
+    Each process holds one range of chunk_size compressed bytes at a time, so memory does not grow with the dump.
+    A dump that is one bz2 stream can only be read by one process.
+    :workers=None : Number of processes, None for one per cpu
+    """
+    size = os.path.getsize(dump_path)
+    tasks = [(dump_path, start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)]
+    index = DumpIndex(index_path)
+    index.db.execute("PRAGMA synchronous = OFF")
+    pages = 0
+    with Pool(workers) as pool:
+        for done, (people, redirects, read) in enumerate(pool.imap(read_range_task, tasks), 1):
+            index.add(people, redirects)
+            pages += read
+            print(f"\r{done}/{len(tasks)} chunks, {pages} pages read", end='', file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    index.prune()
+    return index
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Indexes the people in a Wikipedia dump for get_data to look up offline.')
+    parser.add_argument('dump', nargs='?', help='pages-articles xml.bz2 dump to index')
+    parser.add_argument('--index', default=INDEX_PATH, help=f'index file to write or read (default {INDEX_PATH})')
+    parser.add_argument('--workers', type=int, default=None, help='processes reading the dump (default one per cpu)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE // 2**20, help='megabytes of the dump each process reads at a time')
+    parser.add_argument('--lookup', help='prints the entry of a name from the index instead')
+    args = parser.parse_args()
+
+    if args.lookup is not None:
+        print(json.dumps(DumpIndex(args.index).get(args.lookup), indent=2, ensure_ascii=False))
+    elif args.dump is not None:
+        print(json.dumps(build_index(args.dump, args.index, args.workers, args.chunk_size * 2**20).stats()))
+    else:
+        parser.error('a dump to index or --lookup is needed')